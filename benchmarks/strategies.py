@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+#   Benchmark of the provisioning strategies
+#
+# Provisions a local inventory of Docker containers with every strategy and compares the wall time.
+# Some hosts are made slow at every task, like a lagging droplet of a cloud cluster.
+# A strategy is safe for the Tank playbooks if the run succeeds; barrier violations show how many hosts
+# got ahead of the others within a play (playbooks relying on the linear order of tasks break then).
+#
+# Usage: python3 benchmarks/strategies.py [--hosts 20] [--slow-hosts 2] [--slow-delay 3] [--repeat 3]
+# Requires Docker, Ansible and (for the mitogen_* strategies) the mitogen package.
+#
+import os
+import sys
+import argparse
+import subprocess
+import tempfile
+from shutil import rmtree
+from statistics import mean
+from time import monotonic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tank.core import resource_path  # noqa: E402
+from tank.core.exc import TankConfigError  # noqa: E402
+from tank.core.provisioning import PROVISIONING_STRATEGIES, ansible_config  # noqa: E402
+from tank.core.timings import read_events  # noqa: E402
+
+
+PLAYBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'strategies.yml')
+LABEL = 'tank-strategy-bench'
+
+
+def start_containers(count: int, image: str):
+    names = ['{}-{}'.format(LABEL, i) for i in range(1, count + 1)]
+    for name in names:
+        subprocess.check_call(['docker', 'run', '-d', '--rm', '--name', name, '--label', LABEL, image,
+                               'sleep', 'infinity'], stdout=subprocess.DEVNULL)
+    return names
+
+
+def stop_containers():
+    ids = subprocess.check_output(['docker', 'ps', '-q', '--filter', 'label={}'.format(LABEL)]).split()
+    if ids:
+        subprocess.call(['docker', 'rm', '-f'] + [i.decode() for i in ids], stdout=subprocess.DEVNULL)
+
+
+def write_inventory(filename: str, hosts, slow_hosts: int, slow_delay: float, python: str):
+    with open(filename, 'w') as fh:
+        fh.write('[all]\n')
+        for index, host in enumerate(hosts):
+            delay = slow_delay if index >= len(hosts) - slow_hosts else 0
+            fh.write('{} ansible_connection=docker ansible_python_interpreter={} tank_slow_delay={}\n'.format(
+                host, python, delay))
+        fh.write('\n[boot]\n{}\n'.format(hosts[0]))
+
+
+def provision(work_dir: str, strategy: str, inventory: str, forks: int, run: int):
+    config_file = os.path.join(work_dir, 'ansible.cfg')
+    with open(config_file, 'w') as fh:
+        fh.write(ansible_config(resource_path('ansible', 'ansible.cfg'), strategy))
+
+    events_file = os.path.join(work_dir, '{}.{}.events.jsonl'.format(strategy, run))
+    env = dict(os.environ,
+               ANSIBLE_CONFIG=config_file,
+               ANSIBLE_CALLBACK_PLUGINS=resource_path('ansible', 'callback_plugins'),
+               ANSIBLE_CALLBACK_WHITELIST='tank_events',
+               TANK_ANSIBLE_EVENTS=events_file)
+
+    started = monotonic()
+    code = subprocess.call(['ansible-playbook', '-i', inventory, '-f', str(forks), PLAYBOOK], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    wall_time = monotonic() - started
+
+    violations = sum(1 for event in read_events([events_file])
+                     if event.get('event') == 'task_result' and event['status'] == 'ignored')
+    return wall_time, code == 0, violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares provisioning wall time of the Ansible strategies')
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--slow-hosts', type=int, default=2)
+    parser.add_argument('--slow-delay', type=float, default=3, help='seconds every task takes on a slow host')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--strategies', default=','.join(PROVISIONING_STRATEGIES))
+    parser.add_argument('--image', default='python:3.7-slim-buster')
+    parser.add_argument('--python', default='/usr/local/bin/python3', help='interpreter in the containers')
+    args = parser.parse_args()
+
+    from tabulate import tabulate
+
+    work_dir = tempfile.mkdtemp(prefix='tank-strategies-')
+    inventory = os.path.join(work_dir, 'inventory')
+    rows = []
+    try:
+        hosts = start_containers(args.hosts, args.image)
+        write_inventory(inventory, hosts, args.slow_hosts, args.slow_delay, args.python)
+
+        for strategy in args.strategies.split(','):
+            try:
+                runs = [provision(work_dir, strategy, inventory, args.hosts, run) for run in range(args.repeat)]
+            except TankConfigError as e:
+                print('Skipping {}: {}'.format(strategy, e), file=sys.stderr)
+                continue
+
+            times = [wall_time for wall_time, _, _ in runs]
+            rows.append([strategy, mean(times), min(times), max(times),
+                         sum(1 for _, ok, _ in runs if ok), max(violations for _, _, violations in runs)])
+            print('{}: {:.1f} s'.format(strategy, mean(times)), file=sys.stderr)
+    finally:
+        stop_containers()
+        rmtree(work_dir, ignore_errors=True)
+
+    print(tabulate(sorted(rows, key=lambda row: row[1]), floatfmt='.1f',
+                   headers=['STRATEGY', 'MEAN, S', 'MIN, S', 'MAX, S', 'SUCCEEDED RUNS', 'BARRIER VIOLATIONS']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+
+from cement import Controller, ex
+
+from tank.core.exc import TankError
+
+
+_WORKERS_ARGUMENT = (['--workers'], {'help': 'number of runs processed at the same time, see tank.batch.workers',
+                                     'type': int})
+
+
+class NestedBatch(Controller):
+
+    class Meta:
+        label = 'batch'
+        stacked_type = 'nested'
+        stacked_on = 'base'
+
+        # text displayed at the top of --help output
+        description = 'Deploying, benching and destroying many runs at once'
+
+        # text displayed at the bottom of --help output
+        title = 'Batch commands'
+        help = 'Batch commands'
+
+    @ex(help='Deploy a run for every testcase',
+        arguments=[
+            (['testcases'],
+             {'type': str, 'nargs': '+'}),
+            _WORKERS_ARGUMENT,
+        ])
+    def deploy(self):
+        from tank.core.batch import Batch
+
+        self._show_results(Batch(self.app, self.app.pargs.workers).deploy(self.app.pargs.testcases))
+
+    @ex(help='Runs bench on many runs, a testcase means all the runs created from it',
+        arguments=[
+            (['load_profile'],
+             {'type': str}),
+            (['targets'],
+             {'help': 'run ids or testcases',
+              'type': str, 'nargs': '+'}),
+            (['--tps'],
+             {'help': 'set global transactions per second generation rate of every run',
+              'type': int}),
+            (['--total-tx'],
+             {'help': 'how many transactions to send to every run',
+              'type': int}),
+            (['--weighted'],
+             {'help': 'divide the load between nodes proportionally to their instance types',
+              'action': 'store_true'}),
+            _WORKERS_ARGUMENT,
+        ])
+    def bench(self):
+        from tank.core.batch import Batch
+
+        pargs = self.app.pargs
+        self._show_results(Batch(self.app, pargs.workers).bench(
+            pargs.targets, pargs.load_profile, pargs.tps, pargs.total_tx, weighted=pargs.weighted))
+
+    @ex(help='Destroy many runs, a testcase means all the runs created from it',
+        arguments=[
+            (['targets'],
+             {'help': 'run ids or testcases',
+              'type': str, 'nargs': '+'}),
+            _WORKERS_ARGUMENT,
+        ])
+    def destroy(self):
+        from tank.core.batch import Batch
+
+        self._show_results(Batch(self.app, self.app.pargs.workers).destroy(self.app.pargs.targets))
+
+    @staticmethod
+    def _show_results(results):
+        from tabulate import tabulate
+        from tank.core.batch import failed_results
+
+        def make_row(result):
+            bench = result.details.get('bench', dict())
+            return [
+                result.name,
+                result.details.get('run_id'),
+                result.status,
+                None if result.duration is None else '{:.0f}s'.format(result.duration),
+                bench.get('tps_mean'),
+                '{:.2%}'.format(bench['error_rate']) if bench else None,
+                result.error,
+            ]
+
+        print()
+        print(tabulate([make_row(result) for result in results], missingval='-',
+                       headers=['JOB', 'RUN ID', 'STATUS', 'DURATION', 'TPS MEAN', 'ERROR RATE', 'ERROR']))
+
+        error = failed_results(results)
+        if error is not None:
+            raise TankError(error)
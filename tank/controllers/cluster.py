@@ -1,9 +1,9 @@
 
 import sys
 import json
+from datetime import datetime
 
 from cement import Controller, ex
-from tabulate import tabulate
 
 from tank.core.exc import TankError
 from tank.core.run import Run
@@ -19,18 +19,35 @@ class BaseClusterController(Controller):
         run = Run.new_run(self.app, testcase)
         print('Created tank run: {}'.format(run.run_id))
 
-        run.init()
-        run.create()
-        run.dependency()
-        run.provision()
+        run.deploy()
 
         self._show_hosts(run.inspect())
         print('\nTank run id: {}'.format(run.run_id))
 
+    def _show_bench_summary(self, summary):
+        from tabulate import tabulate
+
+        rows = [
+            ['Bench id', summary['bench_id']],
+            ['Nodes', summary['nodes']],
+            ['Sent', summary['sent']],
+            ['Processed', summary['processed']],
+            ['Errors', summary['errors']],
+            ['Error rate', '{:.2%}'.format(summary['error_rate'])],
+            ['TPS mean', summary['tps_mean']],
+            ['TPS peak', summary['tps_peak']],
+            ['Latency p50, ms', summary['latency_p50']],
+            ['Latency p95, ms', summary['latency_p95']],
+            ['Latency p99, ms', summary['latency_p99']],
+        ]
+        print(tabulate(rows, missingval='-'))
+
     def _show_hosts(self, run_inspect_data):
         if 'cluster' not in run_inspect_data:
             raise TankError('There are no information about hosts. Have you performed provision/deploy?')
 
+        from tabulate import tabulate
+
         rows = sorted([[ip, i['hostname']] for ip, i in run_inspect_data['cluster'].items()], key=second)
         print(tabulate(list(rows), headers=['IP', 'HOSTNAME']))
 
@@ -73,17 +90,28 @@ class NestedCluster(BaseClusterController):
 
     @ex(help='Show clusters')
     def list(self):
-        runs = Run.list_runs(self.app)
+        from tabulate import tabulate
+
+        records = Run.catalog(self.app).list()
+
+        def make_row(record):
+            stage = record['stage']
+            if stage is not None:
+                stage = '{} ({})'.format(stage, record['stages'][stage]['status'])
 
-        def make_row(run):
             return [
-                run.run_id,
-                run.created_at.strftime('%c'),
-                run.testcase_copy.total_instances + 1,
-                run.meta['testcase_filename']
+                record['run_id'],
+                datetime.fromtimestamp(record['created']).strftime('%c'),
+                record['total_instances'] + 1,
+                stage,
+                record['testcase_filename']
             ]
 
-        print(tabulate(list(map(make_row, runs)), headers=['RUN ID', 'CREATED', 'INSTANCES', 'TESTCASE']))
+        print(tabulate(list(map(make_row, records)), headers=['RUN ID', 'CREATED', 'INSTANCES', 'STAGE', 'TESTCASE']))
+
+    @ex(help='Rebuild the catalog of runs from the run directories', hide=True)
+    def reindex(self):
+        print('Indexed {} runs'.format(len(Run.rebuild_catalog(self.app).list())))
 
     @ex(help='Init a Tank run, download plugins and modules for Terraform', hide=True,
         arguments=[(['testcase'], {'type': str, 'nargs': 1})])
@@ -110,9 +138,37 @@ class NestedCluster(BaseClusterController):
         Run(self.app, first(self.app.pargs.run_id)).dependency()
 
     @ex(help='Setup instances: configs, packages, services, etc', hide=True,
-        arguments=[(['run_id'], {'type': str, 'nargs': 1})])
+        arguments=[
+            (['run_id'],
+             {'type': str, 'nargs': 1}),
+            (['--force'],
+             {'help': 'provision all the hosts, including the ones which have converged already',
+              'action': 'store_true'}),
+        ])
     def provision(self):
-        Run(self.app, first(self.app.pargs.run_id)).provision()
+        if not Run(self.app, first(self.app.pargs.run_id)).provision(force=self.app.pargs.force):
+            print('All the hosts have been provisioned already')
+
+    @ex(help='Change instance counts of a deployed cluster, e.g. `tank cluster scale <run id> producer=40`',
+        arguments=[
+            (['run_id'],
+             {'type': str, 'nargs': 1}),
+            (['counts'],
+             {'help': 'new total count of a role: role=N',
+              'type': str, 'nargs': '+'}),
+        ])
+    def scale(self):
+        counts = dict()
+        for item in self.app.pargs.counts:
+            role, _, count = item.partition('=')
+            if not role or not count.isdigit():
+                raise TankError('Invalid count {}, role=N is expected'.format(item))
+            counts[role] = int(count)
+
+        run = Run(self.app, first(self.app.pargs.run_id))
+        if not run.scale(counts):
+            print('Instance counts are not changed')
+        self._show_hosts(run.inspect())
 
     @ex(help='Runs bench on prepared cluster',
         arguments=[
@@ -126,10 +182,118 @@ class NestedCluster(BaseClusterController):
             (['--total-tx'],
              {'help': 'how many transactions to send',
               'type': int}),
+            (['--weighted'],
+             {'help': 'divide the load between nodes proportionally to their instance types',
+              'action': 'store_true'}),
         ])
     def bench(self):
-        Run(self.app, first(self.app.pargs.run_id)).bench(
-            first(self.app.pargs.load_profile), self.app.pargs.tps, self.app.pargs.total_tx)
+        results = Run(self.app, first(self.app.pargs.run_id)).bench(
+            first(self.app.pargs.load_profile), self.app.pargs.tps, self.app.pargs.total_tx,
+            weighted=self.app.pargs.weighted)
+
+        print()
+        self._show_bench_summary(results.summary())
+
+    @ex(help='Runs benches with growing load to find the saturation point of the cluster',
+        arguments=[
+            (['run_id'],
+             {'type': str, 'nargs': 1}),
+            (['load_profile'],
+             {'type': str, 'nargs': 1}),
+            (['--from'],
+             {'help': 'global transactions per second of the first level',
+              'dest': 'tps_from', 'type': int, 'required': True}),
+            (['--to'],
+             {'help': 'global transactions per second of the last level',
+              'dest': 'tps_to', 'type': int, 'required': True}),
+            (['--step'],
+             {'help': 'load increment between the levels, tps',
+              'type': int, 'required': True}),
+            (['--hold'],
+             {'help': 'duration of every level, seconds',
+              'type': int, 'default': 60}),
+            (['--min-efficiency'],
+             {'help': 'the cluster is saturated when achieved tps falls below this share of offered tps',
+              'type': float, 'default': 0.9}),
+            (['--max-latency-growth'],
+             {'help': 'the cluster is saturated when p95 latency grows more than this times since the first level',
+              'type': float, 'default': 3.0}),
+            (['--max-error-rate'],
+             {'help': 'the cluster is saturated when the error rate exceeds this value',
+              'type': float, 'default': 0.05}),
+            (['--weighted'],
+             {'help': 'divide the load between nodes proportionally to their instance types',
+              'action': 'store_true'}),
+            (['--export'],
+             {'help': 'export the sweep to a file: .csv - the curve, otherwise - json',
+              'type': str}),
+        ])
+    def bench_sweep(self):
+        from tabulate import tabulate
+        from tank.core.sweep import BenchSweep
+
+        pargs = self.app.pargs
+        sweep = BenchSweep(pargs.tps_from, pargs.tps_to, pargs.step, pargs.hold,
+                           min_efficiency=pargs.min_efficiency, max_latency_growth=pargs.max_latency_growth,
+                           max_error_rate=pargs.max_error_rate)
+        data = Run(self.app, first(pargs.run_id)).bench_sweep(
+            first(pargs.load_profile), sweep, weighted=pargs.weighted,
+            on_level=lambda tps: print('Sweep level: {} tps for {}s'.format(tps, sweep.hold)))
+
+        columns = ['offered_tps', 'achieved_tps', 'latency_p50', 'latency_p95', 'error_rate', 'saturated']
+        print()
+        print(tabulate([[point[c] for c in columns] for point in data['curve']], missingval='-',
+                       headers=['OFFERED TPS', 'ACHIEVED TPS', 'LATENCY P50, MS', 'LATENCY P95, MS', 'ERROR RATE',
+                                'SATURATED']))
+        print()
+        if data['knee_tps'] is None:
+            print('The cluster is not saturated up to {} tps'.format(pargs.tps_to))
+        elif data['saturation_tps'] is None:
+            print('The cluster is saturated ({}) at the first level'.format(data['knee_reason']))
+        else:
+            print('Saturation point: {} tps (achieved {:.1f} tps), the knee ({}) is at {} tps'.format(
+                data['saturation_tps'], data['saturation_achieved_tps'], data['knee_reason'], data['knee_tps']))
+        print('Sweep id: {}'.format(data['sweep_id']))
+
+        export_file = pargs.export
+        if export_file is not None:
+            with open(export_file, 'w') as fh:
+                if export_file.endswith('.csv'):
+                    fh.write(','.join(columns) + '\n')
+                    fh.writelines(','.join('' if point[c] is None else str(point[c]) for c in columns) + '\n'
+                                  for point in data['curve'])
+                else:
+                    json.dump(data, fh, indent=4, sort_keys=True)
+
+            print('\nExported to {}'.format(export_file))
+
+    @ex(help='Show and export aggregated bench results',
+        arguments=[
+            (['run_id'],
+             {'type': str, 'nargs': 1}),
+            (['bench_id'],
+             {'help': 'bench id, the latest bench by default',
+              'type': str, 'nargs': '?'}),
+            (['--export'],
+             {'help': 'export results to a file: .csv - TPS timeline, otherwise - json summary',
+              'type': str}),
+        ])
+    def results(self):
+        results = Run(self.app, first(self.app.pargs.run_id)).bench_results(self.app.pargs.bench_id)
+        summary = results.summary()
+
+        self._show_bench_summary(summary)
+
+        export_file = self.app.pargs.export
+        if export_file is not None:
+            with open(export_file, 'w') as fh:
+                if export_file.endswith('.csv'):
+                    fh.write('time,tps\n')
+                    fh.writelines('{},{}\n'.format(t, tps) for t, tps in summary['tps_timeline'])
+                else:
+                    json.dump(summary, fh, indent=4, sort_keys=True)
+
+            print('\nExported to {}'.format(export_file))
 
     @ex(help='Destroy all instances of the cluster',
         arguments=[(['run_id'], {'type': str, 'nargs': 1})])
@@ -142,15 +306,76 @@ class NestedCluster(BaseClusterController):
         data = Run(self.app, first(self.app.pargs.run_id)).inspect()
         json.dump(data, sys.stdout, indent=4, sort_keys=True)
 
+    @ex(help='Show Terraform log records of the failed resources',
+        arguments=[
+            (['run_id'],
+             {'type': str, 'nargs': 1}),
+            (['--stage'],
+             {'help': 'stage to look into, all the stages by default',
+              'choices': ['init', 'create', 'destroy', 'plan']}),
+        ])
+    def logs(self):
+        traces = Run(self.app, first(self.app.pargs.run_id)).failed_resources_traces(self.app.pargs.stage)
+        if not traces:
+            raise TankError('There are no failed resources in the Terraform logs')
+
+        for address, lines in traces.items():
+            print('==> {} <=='.format(address))
+            print('\n'.join(lines))
+            print()
+
+    @ex(help='Show where the time of a run went: stages, the slowest Ansible tasks and hosts',
+        arguments=[
+            (['run_id'],
+             {'type': str, 'nargs': 1}),
+            (['--top'],
+             {'help': 'number of the slowest tasks and hosts to show',
+              'type': int, 'default': 10}),
+            (['--json'],
+             {'help': 'print the profile as json',
+              'action': 'store_true'}),
+        ])
+    def profile(self):
+        from tabulate import tabulate
+
+        data = Run(self.app, first(self.app.pargs.run_id)).profile(self.app.pargs.top)
+        if self.app.pargs.json:
+            json.dump(data, sys.stdout, indent=4, sort_keys=True)
+            return
+
+        if not data['stages']:
+            raise TankError('There are no stage timings in the run')
+
+        print(tabulate([[s['stage'], s['status'], s['wall_time'], s['children_cpu_user'], s['children_cpu_system'],
+                         s.get('children_peak_rss_mb'), s.get('hosts')] for s in data['stages']],
+                       missingval='-',
+                       headers=['STAGE', 'STATUS', 'WALL, S', 'CPU USER, S', 'CPU SYS, S', 'PEAK RSS TO DATE, MB',
+                                'HOSTS']))
+
+        if data['slowest_tasks']:
+            print()
+            print(tabulate([[t['play'], t['task'], t['hosts'], t['total'], t['max'], t['slowest_host']]
+                            for t in data['slowest_tasks']], floatfmt='.1f',
+                           headers=['PLAY', 'TASK', 'HOSTS', 'TOTAL, S', 'MAX, S', 'SLOWEST HOST']))
+
+        if data['slowest_hosts']:
+            print()
+            print(tabulate([[h['host'], h['tasks'], h['failed'], h['total']] for h in data['slowest_hosts']],
+                           floatfmt='.1f', headers=['HOST', 'TASKS', 'FAILED', 'TOTAL, S']))
+
     @ex(help='Info about a run',
         arguments=[(['info_type'], {'choices': ['hosts'], 'nargs': 1}),
                    (['run_id'], {'type': str, 'nargs': 1})])
     def info(self):
         info_type = first(self.app.pargs.info_type)
-        data = Run(self.app, first(self.app.pargs.run_id)).inspect()
+        run_id = first(self.app.pargs.run_id)
+
+        record = Run.catalog(self.app).get(run_id)
+        if record is None:
+            raise TankError('Run {} is not found'.format(run_id))
 
         if info_type == 'hosts':
-            self._show_hosts(data)
+            self._show_hosts({'cluster': record['hosts']} if 'hosts' in record else dict())
 
     @ex(
         help='Create and setup a cluster (init, create, dependency, provision)',
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from cement import Controller, ex
+
+
+class NestedImage(Controller):
+
+    class Meta:
+        label = 'image'
+        stacked_type = 'nested'
+        stacked_on = 'base'
+
+        # text displayed at the top of --help output
+        description = 'Golden images with the base layer of provisioning done'
+
+        # text displayed at the bottom of --help output
+        title = 'Image commands'
+        help = 'Image commands'
+
+    @ex(help='Build an image of the current cloud provider for the binding, runs of the binding boot from it',
+        arguments=[(['binding'], {'type': str})])
+    def bake(self):
+        from tank.core.image import ImageBaker
+
+        image = ImageBaker(self.app, self.app.pargs.binding).bake()
+
+        print('Image {} ({}) is ready'.format(image['name'], image['id']))
+        if image['previous'] is not None and image['previous']['id'] != image['id']:
+            print('The previous image {} ({}) is kept for the runs using it, delete it when it is not needed'.format(
+                image['previous']['name'], image['previous']['id']))
+
+    @ex(help='Show images of the current cloud provider')
+    def list(self):
+        from tabulate import tabulate
+        from tank.core.image import ImageCatalog, image_content_hash
+
+        catalog = ImageCatalog.of_user(self.app)
+        rows = []
+        for binding, record in sorted(catalog.images(self.app.provider).items()):
+            rows.append([
+                binding,
+                record['id'],
+                record['name'],
+                datetime.fromtimestamp(record['created']).strftime('%c'),
+                catalog.current(self.app.provider, binding, image_content_hash(self.app, binding)) is not None,
+            ])
+
+        print(tabulate(rows, headers=['BINDING', 'ID', 'NAME', 'CREATED', 'UP TO DATE']))
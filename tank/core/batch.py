@@ -0,0 +1,198 @@
+#
+#   module tank.core.batch
+#
+# Running an action for many testcases or runs at once.
+#
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Callable, Dict, List, Optional
+
+from cement.utils import fs
+
+from tank.core.exc import TankError
+from tank.core.parallelism import ParallelismBudget
+from tank.core.run import Run
+from tank.core.stages import StageCancelled, stage_context
+from tank.core.testcase import TestCase
+
+
+class BatchResult:
+    """
+    Outcome of a single job of a batch.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = 'skipped'
+        self.error = None
+        self.duration = None
+        # e.g. run id, bench summary
+        self.details = dict()
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'done'
+
+
+class BatchPool:
+    """
+    Runs jobs by a pool of workers, a failure of a job doesn't affect the others.
+
+    Every job works as a stage named after the job, so the output of the commands run by the job is prefixed.
+    On an interrupt the running jobs are cancelled and the jobs not started yet are skipped.
+    """
+
+    def __init__(self, workers: int):
+        self._workers = max(1, workers)
+
+    def run(self, jobs: 'OrderedDict[str, Callable[[BatchResult], None]]') -> List[BatchResult]:
+        """
+        :param jobs: job name -> function, which may put details of the outcome into the result
+        """
+        results = OrderedDict((name, BatchResult(name)) for name in jobs)
+        cancelled = threading.Event()
+        contexts = dict()
+        contexts_lock = threading.Lock()
+
+        def worker(name: str):
+            result = results[name]
+            if cancelled.is_set():
+                return
+
+            started = time()
+            result.status = 'running'
+            try:
+                with stage_context(name, cancelled) as context:
+                    with contexts_lock:
+                        contexts[name] = context
+                    try:
+                        jobs[name](result)
+                    finally:
+                        with contexts_lock:
+                            contexts.pop(name)
+                result.status = 'done'
+            except StageCancelled:
+                result.status = 'cancelled'
+            except Exception as e:
+                result.status = 'cancelled' if cancelled.is_set() else 'failed'
+                # e.g. errors of commands contain their whole output
+                lines = [line.strip() for line in str(e).splitlines() if line.strip()]
+                result.error = lines[0] if lines else e.__class__.__name__
+            finally:
+                result.duration = time() - started
+
+        pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='batch')
+        futures = [pool.submit(worker, name) for name in jobs]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            # e.g. KeyboardInterrupt or cement's CaughtSignal in the main thread
+            cancelled.set()
+            with contexts_lock:
+                for context in contexts.values():
+                    context.terminate()
+            pool.shutdown(wait=True)
+            raise
+        pool.shutdown(wait=True)
+
+        return list(results.values())
+
+
+class Batch:
+    """
+    Deploys, benches or destroys many runs at once within a shared parallelism budget.
+    """
+
+    def __init__(self, app, workers: int = None):
+        config = app.batch_config
+        self._app = app
+        self._workers = int(workers or config['workers'])
+        self.budget = ParallelismBudget({
+            'api': config['api_calls'],
+            'forks': config['forks'],
+            'cpu': config['processes'] or os.cpu_count(),
+        }, consumers=self._workers)
+
+    def deploy(self, testcase_files: List[str]) -> List[BatchResult]:
+        jobs = OrderedDict()
+        for filename in testcase_files:
+            def deploy(result: BatchResult, filename=filename):
+                run = Run.new_run(self._app, TestCase(filename, self._app), self.budget)
+                result.details['run_id'] = run.run_id
+                run.deploy()
+
+            jobs[self._job_name(filename, jobs)] = deploy
+
+        return BatchPool(self._workers).run(jobs)
+
+    def bench(self, targets: List[str], load_profile: str, tps: int = None, total_tx: int = None,
+              weighted: bool = False) -> List[BatchResult]:
+        jobs = OrderedDict()
+        for run_id in self.resolve_runs(targets):
+            def bench(result: BatchResult, run_id=run_id):
+                result.details['run_id'] = run_id
+                results = Run(self._app, run_id, self.budget).bench(load_profile, tps, total_tx, weighted=weighted)
+                result.details['bench'] = results.summary()
+
+            jobs[run_id] = bench
+
+        return BatchPool(self._workers).run(jobs)
+
+    def destroy(self, targets: List[str]) -> List[BatchResult]:
+        jobs = OrderedDict()
+        for run_id in self.resolve_runs(targets):
+            def destroy(result: BatchResult, run_id=run_id):
+                result.details['run_id'] = run_id
+                Run(self._app, run_id, self.budget).destroy()
+
+            jobs[run_id] = destroy
+
+        return BatchPool(self._workers).run(jobs)
+
+    def resolve_runs(self, targets: List[str]) -> List[str]:
+        """
+        Run ids of the targets: a target is a run id or a testcase file, which means all the runs created from it.
+        """
+        records = Run.catalog(self._app).list()
+        known = set(record['run_id'] for record in records)
+
+        run_ids = []
+        for target in targets:
+            if target in known:
+                matched = [target]
+            elif os.path.isfile(target):
+                matched = [record['run_id'] for record in records
+                           if record['testcase_filename'] == fs.abspath(target)]
+            else:
+                matched = []
+
+            if not matched:
+                raise TankError('{} is neither a run id nor a testcase of existing runs'.format(target))
+            run_ids.extend(run_id for run_id in matched if run_id not in run_ids)
+
+        return run_ids
+
+    @staticmethod
+    def _job_name(filename: str, jobs: Dict) -> str:
+        name = os.path.splitext(os.path.basename(filename))[0]
+        unique_name, index = name, 1
+        while unique_name in jobs:
+            index += 1
+            unique_name = '{}-{}'.format(name, index)
+
+        return unique_name
+
+
+def failed_results(results: List[BatchResult]) -> Optional[str]:
+    """
+    Error message describing the jobs which didn't succeed, None if all the jobs succeeded.
+    """
+    failed = [result.name for result in results if not result.ok]
+    if not failed:
+        return None
+
+    return '{} of {} jobs did not succeed: {}'.format(len(failed), len(results), ', '.join(failed))
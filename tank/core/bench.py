@@ -0,0 +1,350 @@
+#
+#   module tank.core.bench
+#
+# Harvesting and aggregation of bench results.
+#
+import os
+import re
+import json
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from cement.utils import fs
+
+from tank.core.exc import TankError
+from tank.core.utils import json_load, json_dump_atomic, grep_dir
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram.
+
+    Buckets are fixed for all histograms (bucket i covers [base^i, base^(i+1)) milliseconds),
+    so histograms of different nodes are merged exactly by adding bucket counts.
+    Percentiles are accurate within the relative bucket width (1% by default).
+    """
+
+    BASE = 1.01
+
+    def __init__(self, buckets: Dict[int, int] = None, total: float = 0.0):
+        self._buckets = dict() if buckets is None else dict(buckets)
+        self._total = total
+
+    @classmethod
+    def bucket(cls, value: float) -> int:
+        # values below 1 ms fall into the first bucket
+        return 0 if value < 1 else int(math.floor(math.log(value) / math.log(cls.BASE)))
+
+    def record(self, value: float, count: int = 1):
+        index = self.bucket(value)
+        self._buckets[index] = self._buckets.get(index, 0) + count
+        self._total += value * count
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+        self._total += other._total
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self._buckets.values())
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._total / self.count if self.count else None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Upper bound of the bucket containing the requested percentile, ms.
+        """
+        if not self.count:
+            return None
+
+        rank = max(1, int(math.ceil(self.count * percent / 100)))
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return round(self.BASE ** (index + 1), 3)
+
+    def to_dict(self) -> Dict:
+        return {'buckets': dict((str(k), v) for k, v in sorted(self._buckets.items())), 'total': self._total}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencyHistogram':
+        return cls(dict((int(k), v) for k, v in data['buckets'].items()), data['total'])
+
+
+class NodeStats:
+    """
+    Bench statistics of a single node parsed from the bench output.
+
+    Stats lines are json objects, one per line, with optional fields:
+        time - unix timestamp of the sample, s
+        sent, processed, errors - counters since the bench start
+        tps - processed transactions per second at the moment
+        latencies - list of transaction latencies, ms
+    Lines like `sent: 100 processed: 98` are understood as well, any other output is ignored.
+    """
+
+    _COUNTER_RE = re.compile(r'\b(sent|processed|errors?)\b\W+(\d+)', re.IGNORECASE)
+
+    def __init__(self, host: str):
+        self.host = host
+        self.sent = 0
+        self.processed = 0
+        self.errors = 0
+        self.tps = dict()  # timestamp (s) -> tps
+        self.latency = LatencyHistogram()
+
+    @classmethod
+    def parse(cls, host: str, output: str) -> 'NodeStats':
+        stats = cls(host)
+        for line in output.splitlines():
+            line = line.strip()
+            if line.startswith('{'):
+                try:
+                    sample = json.loads(line)
+                except ValueError:
+                    continue
+                stats._add_sample(sample)
+            else:
+                for name, value in cls._COUNTER_RE.findall(line):
+                    stats._set_counter(name.lower(), int(value))
+
+        return stats
+
+    def _add_sample(self, sample: Dict):
+        for name in ('sent', 'processed', 'errors'):
+            if name in sample:
+                self._set_counter(name, int(sample[name]))
+
+        if 'tps' in sample and 'time' in sample:
+            self.tps[int(sample['time'])] = float(sample['tps'])
+
+        for latency in sample.get('latencies', ()):
+            self.latency.record(float(latency))
+
+    def _set_counter(self, name: str, value: int):
+        name = 'errors' if name == 'error' else name
+        # counters are cumulative
+        setattr(self, name, max(getattr(self, name), value))
+
+    def to_dict(self) -> Dict:
+        return {
+            'host': self.host,
+            'sent': self.sent,
+            'processed': self.processed,
+            'errors': self.errors,
+            'tps': dict((str(k), v) for k, v in sorted(self.tps.items())),
+            'latency': self.latency.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NodeStats':
+        stats = cls(data['host'])
+        stats.sent, stats.processed, stats.errors = data['sent'], data['processed'], data['errors']
+        stats.tps = dict((int(k), v) for k, v in data['tps'].items())
+        stats.latency = LatencyHistogram.from_dict(data['latency'])
+        return stats
+
+
+def aggregate(nodes: Iterable[NodeStats]) -> Dict:
+    """
+    Merges statistics of nodes into cluster-wide statistics.
+    """
+    nodes = list(nodes)
+    latency = LatencyHistogram()
+    timeline = dict()
+
+    for node in nodes:
+        latency.merge(node.latency)
+        for timestamp, tps in node.tps.items():
+            timeline[timestamp] = timeline.get(timestamp, 0.0) + tps
+
+    sent = sum(node.sent for node in nodes)
+    errors = sum(node.errors for node in nodes)
+    tps_values = [timeline[t] for t in sorted(timeline)]
+
+    return {
+        'nodes': len(nodes),
+        'sent': sent,
+        'processed': sum(node.processed for node in nodes),
+        'errors': errors,
+        'error_rate': errors / sent if sent else 0.0,
+        'tps_mean': sum(tps_values) / len(tps_values) if tps_values else None,
+        'tps_peak': max(tps_values) if tps_values else None,
+        'tps_timeline': [[t, timeline[t]] for t in sorted(timeline)],
+        'latency_mean': latency.mean,
+        'latency_p50': latency.percentile(50),
+        'latency_p95': latency.percentile(95),
+        'latency_p99': latency.percentile(99),
+        'latency_histogram': latency.to_dict(),
+    }
+
+
+# relative capacity of instance types (proportional to memory of the provider sizes)
+TYPE_WEIGHTS = {
+    'micro': 0.5,
+    'small': 1,
+    'standard': 2,
+    'large': 4,
+    'xlarge': 8,
+    'xxlarge': 16,
+    'huge': 32,
+}
+
+
+def allocate_load(total: int, weights: Dict[str, float]) -> Dict[str, int]:
+    """
+    Divides total exactly between hosts proportionally to their weights.
+
+    Every host gets at least 1, the rest is divided by the largest remainder method
+    (ties are resolved in favor of hosts going first, like split_evenly does).
+    """
+    hosts = list(weights)
+    if total < len(hosts):
+        raise TankError('Can\'t divide {} between {} hosts'.format(total, len(hosts)))
+
+    rest = total - len(hosts)
+    weight_sum = sum(weights.values())
+    quotas = dict((host, rest * weights[host] / weight_sum) for host in hosts)
+
+    shares = dict((host, 1 + int(math.floor(quotas[host]))) for host in hosts)
+    remainder = total - sum(shares.values())
+    by_fraction = sorted(hosts, key=lambda host: (-(quotas[host] - math.floor(quotas[host])), hosts.index(host)))
+    for host in by_fraction[:remainder]:
+        shares[host] += 1
+
+    return shares
+
+
+def instance_type_weights(hosts: Dict[str, str], instances) -> Dict[str, float]:
+    """
+    Weights of hosts based on the instance type from the testcase.
+    :param hosts: ip -> hostname, hostnames look like tank-<blockchain>-<setup id>-<role>-<index>-<count index>
+    :param instances: converted testcase instances
+    """
+    weights = dict()
+    for ip, hostname in hosts.items():
+        parts = hostname.rsplit('-', 3)
+        try:
+            instance_type = instances[parts[1]][int(parts[2]) - 1]['type']
+        except (IndexError, KeyError, ValueError):
+            raise TankError('Failed to find instance type of {} ({})'.format(ip, hostname))
+        weights[ip] = TYPE_WEIGHTS[instance_type]
+
+    return weights
+
+
+class BenchPlan:
+    """
+    Per-host bench parameters, the requested global load is divided exactly between the bench hosts.
+    """
+
+    def __init__(self, weights: Dict[str, float], tps: int = None, total_tx: int = None):
+        """
+        Ctor.
+        :param weights: host -> relative capacity of all the bench-capable hosts
+        :param tps: global transactions per second generation rate
+        :param total_tx: global number of transactions to send
+        """
+        if not weights:
+            raise TankError('There are no nodes capable of running the bench util')
+
+        # the most capable hosts are used if there is not enough load for all of them
+        active = sorted(weights, key=lambda host: (-weights[host], host))
+        limits = [v for v in (tps, total_tx) if v is not None]
+        if limits:
+            active = active[:min(limits)]
+        active = dict((host, weights[host]) for host in sorted(active))
+
+        self.tps = None if tps is None else allocate_load(tps, active)
+        self.total_tx = None if total_tx is None else allocate_load(total_tx, active)
+        self.hosts = list(active)
+
+    def host_args(self, host: str) -> str:
+        args = []
+        if self.tps is not None:
+            args.append('--common.tps {}'.format(self.tps[host]))
+        if self.total_tx is not None:
+            args.append('--common.stopOn.processedTransactions {}'.format(self.total_tx[host]))
+        return ' '.join(args)
+
+    def to_dict(self) -> Dict:
+        return dict((host, {
+            'tps': None if self.tps is None else self.tps[host],
+            'total_tx': None if self.total_tx is None else self.total_tx[host],
+            'args': self.host_args(host),
+        }) for host in self.hosts)
+
+
+class BenchResults:
+    """
+    Results of a single bench of a run stored under <run dir>/bench/<bench id>.
+    """
+
+    def __init__(self, run_dir: str, bench_id: str):
+        self.bench_id = bench_id
+        self.path = fs.join(run_dir, 'bench', bench_id)
+
+    @staticmethod
+    def new_id() -> str:
+        return datetime.now().strftime('%Y%m%d-%H%M%S')
+
+    @classmethod
+    def list_ids(cls, run_dir: str) -> List[str]:
+        bench_dir = fs.join(run_dir, 'bench')
+        if not os.path.isdir(bench_dir):
+            return []
+        return sorted(grep_dir(bench_dir, isdir=True))
+
+    @classmethod
+    def latest(cls, run_dir: str) -> 'BenchResults':
+        ids = cls.list_ids(run_dir)
+        if not ids:
+            raise TankError('There are no bench results, have you performed bench?')
+        return cls(run_dir, ids[-1])
+
+    @property
+    def nodes_dir(self) -> str:
+        return fs.join(self.path, 'nodes')
+
+    @property
+    def plan_file(self) -> str:
+        return fs.join(self.path, 'plan.json')
+
+    @property
+    def summary_file(self) -> str:
+        return fs.join(self.path, 'summary.json')
+
+    def save_node_output(self, host: str, output: str) -> NodeStats:
+        fs.ensure_dir_exists(self.nodes_dir)
+        with open(fs.join(self.nodes_dir, '{}.log'.format(host)), 'w') as fh:
+            fh.write(output)
+
+        stats = NodeStats.parse(host, output)
+        json_dump_atomic(fs.join(self.nodes_dir, '{}.json'.format(host)), stats.to_dict())
+        return stats
+
+    def nodes(self) -> List[NodeStats]:
+        if not os.path.isdir(self.nodes_dir):
+            return []
+        return [NodeStats.from_dict(json_load(fs.join(self.nodes_dir, filename)))
+                for filename in sorted(os.listdir(self.nodes_dir)) if filename.endswith('.json')]
+
+    def aggregate(self, **extra) -> Dict:
+        summary = aggregate(self.nodes())
+        summary['bench_id'] = self.bench_id
+        summary.update(extra)
+
+        fs.ensure_dir_exists(self.path)
+        json_dump_atomic(self.summary_file, summary)
+        return summary
+
+    def summary(self) -> Dict:
+        if not os.path.exists(self.summary_file):
+            raise TankError('Bench {} has no results'.format(self.bench_id))
+        return json_load(self.summary_file)
@@ -7,6 +7,7 @@
 import os.path
 import copy
 from shutil import copy2
+from typing import List
 
 from cement.utils import fs
 
@@ -35,12 +36,7 @@ class AnsibleBinding:
         Provides ansible dependencies in the form of requirements.yml records.
         :returns: dependency record list
         """
-        bindings_conf = _BindingsConfig(self._app)
-        conf = bindings_conf.config.get(self.binding_name)
-        if conf is None:
-            raise TankConfigError('Configuration for binding named {} is not found under {}'.format(
-                self.binding_name, bindings_conf.config_file
-            ))
+        conf = self._config()
 
         result = {
             'src': conf['ansible']['src'],
@@ -51,6 +47,21 @@ class AnsibleBinding:
 
         return [result]
 
+    def docker_images(self) -> List[str]:
+        """
+        Docker images of the blockchain, they are pulled into the golden images of the binding.
+        """
+        return list(self._config().get('images', ()))
+
+    def _config(self) -> dict:
+        bindings_conf = _BindingsConfig(self._app)
+        conf = bindings_conf.config.get(self.binding_name)
+        if conf is None:
+            raise TankConfigError('Configuration for binding named {} is not found under {}'.format(
+                self.binding_name, bindings_conf.config_file
+            ))
+        return conf
+
 
 class _BindingsConfig:
 
@@ -0,0 +1,105 @@
+#
+#   module tank.core.catalog
+#
+# Index of runs, which allows to list runs without loading each of them.
+#
+import os
+from time import time
+from typing import Dict, List, Optional
+
+from cement.utils import fs
+
+from tank.core.utils import json_load, json_dump_atomic
+
+
+class RunCatalog:
+    """
+    Persistent catalog of runs stored next to the run directories.
+
+    Each record is a plain dict with the fields:
+        run_id, created, testcase_filename, binding, total_instances, setup_id,
+        stage, stages (name -> {status, started, finished}), hosts (as in the cluster report, optional).
+
+    Every modification is a read-modify-write of the whole catalog performed under a file lock,
+    the new version is atomically moved over the old one.
+    """
+
+    FILE_NAME = 'catalog.json'
+
+    def __init__(self, runs_dir: str):
+        self._runs_dir = runs_dir
+        fs.ensure_dir_exists(runs_dir)
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self._file)
+
+    def list(self) -> List[Dict]:
+        return sorted(self._load().values(), key=lambda record: (record['created'], record['run_id']))
+
+    def get(self, run_id: str) -> Optional[Dict]:
+        return self._load().get(run_id)
+
+    def add(self, record: Dict):
+        with self._lock:
+            records = self._load()
+            records[record['run_id']] = record
+            self._save(records)
+
+    def update(self, run_id: str, **fields):
+        with self._lock:
+            records = self._load()
+            if run_id not in records:
+                return
+
+            records[run_id].update(fields)
+            self._save(records)
+
+    def stage_transition(self, run_id: str, stage: str, status: str):
+        """
+        Records status of a stage: running, done or failed.
+        """
+        with self._lock:
+            records = self._load()
+            if run_id not in records:
+                return
+
+            record = records[run_id]
+            stages = record.setdefault('stages', dict())
+            if status == 'running':
+                stages[stage] = {'status': status, 'started': int(time()), 'finished': None}
+                record['stage'] = stage
+            else:
+                stages.setdefault(stage, {'started': None})
+                stages[stage].update({'status': status, 'finished': int(time())})
+
+            self._save(records)
+
+    def remove(self, run_id: str):
+        with self._lock:
+            records = self._load()
+            if records.pop(run_id, None) is not None:
+                self._save(records)
+
+    def replace_all(self, records: List[Dict]):
+        with self._lock:
+            self._save(dict((record['run_id'], record) for record in records))
+
+    @property
+    def _file(self) -> str:
+        return fs.join(self._runs_dir, self.FILE_NAME)
+
+    @property
+    def _lock(self):
+        from filelock import FileLock
+
+        return FileLock(fs.join(self._runs_dir, '.catalog.lock'))
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.exists:
+            return dict()
+
+        return json_load(self._file)
+
+    def _save(self, records: Dict[str, Dict]):
+        json_dump_atomic(self._file, records)
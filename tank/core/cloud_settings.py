@@ -2,11 +2,9 @@
 #   module tank.core.cloud_settings
 #
 
+import functools
 from enum import Enum
 
-import yaml
-import jsonschema
-
 from tank.core.exc import TankConfigError
 
 
@@ -43,13 +41,15 @@ class CloudUserSettings:
     """
 
     def __init__(self, app_config):
+        import jsonschema
+
         self.provider = CloudProvider.from_string(app_config.get('tank', 'provider'))
         if self.provider is None:
             raise TankConfigError('Cloud provider is not specified or not known')
 
         self.monitoring_vars = app_config.get_dict()['tank'].get('monitoring')
         try:
-            jsonschema.validate(self.monitoring_vars, self.__class__._MONITORING_SCHEMA)
+            jsonschema.validate(self.monitoring_vars, self._schema(self._MONITORING_SCHEMA))
         except jsonschema.ValidationError as e:
             raise TankConfigError('Failed to validate admin_user/password monitoring settings', e)
 
@@ -60,14 +60,14 @@ class CloudUserSettings:
         self.ansible_vars = self.provider_vars.pop('ansible', dict())
 
         try:
-            jsonschema.validate(self.provider_vars, self.__class__._SCHEMAS[self.provider])
+            jsonschema.validate(self.provider_vars, self._schema(self._SCHEMAS[self.provider]))
         except jsonschema.ValidationError as e:
             raise TankConfigError('Failed to validate config for cloud provider {}'.format(self.provider), e)
 
         assert 'pvt_key' in self.provider_vars, 'pvt_key is required for ansible'
 
         try:
-            jsonschema.validate(self.ansible_vars, self.__class__._ANSIBLE_SCHEMA)
+            jsonschema.validate(self.ansible_vars, self._schema(self._ANSIBLE_SCHEMA))
         except jsonschema.ValidationError as e:
             raise TankConfigError('Failed to validate ansible config for cloud provider {}'.format(self.provider), e)
 
@@ -77,9 +77,18 @@ class CloudUserSettings:
                 CloudProvider.GOOGLE_CLOUD_ENGINE: 'ens4',
             }[self.provider]
 
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _schema(source: str) -> dict:
+        """
+        Schemas are parsed on first use.
+        """
+        import yaml
+
+        return yaml.safe_load(source)
 
     _SCHEMAS = {
-        CloudProvider.DIGITAL_OCEAN: yaml.safe_load(r'''
+        CloudProvider.DIGITAL_OCEAN: r'''
 type: object
 additionalProperties: False
 required:
@@ -93,9 +102,9 @@ properties:
         type: string
     ssh_fingerprint:
         type: string
-'''),
+''',
 
-        CloudProvider.GOOGLE_CLOUD_ENGINE: yaml.safe_load(r'''
+        CloudProvider.GOOGLE_CLOUD_ENGINE: r'''
 type: object
 additionalProperties: False
 required:
@@ -112,18 +121,18 @@ properties:
         type: string
     project:
         type: string
-'''),
+''',
     }
 
-    _ANSIBLE_SCHEMA = yaml.safe_load(r'''
+    _ANSIBLE_SCHEMA = r'''
 type: object
 additionalProperties: False
 properties:
     private_interface:
         type: string
-''')
+'''
 
-    _MONITORING_SCHEMA = yaml.safe_load(r'''
+    _MONITORING_SCHEMA = r'''
 type: object
 additionalProperties: False
 required:
@@ -134,5 +143,5 @@ properties:
         type: string
     admin_password:
         type: string
-''')
+'''
 
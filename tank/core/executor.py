@@ -0,0 +1,256 @@
+#
+#   module tank.core.executor
+#
+# Concurrent execution of commands on cluster hosts.
+#
+import os
+import queue
+import signal
+import subprocess
+import tempfile
+from shutil import rmtree
+from threading import Thread
+from time import time
+from typing import Callable, Dict, List, Optional
+
+from tank.core.exc import TankError
+from tank.core.stages import check_cancelled
+
+
+class HostResult:
+    """
+    Outcome of a command on a single host.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.exit_code: Optional[int] = None
+        self.output_lines: List[str] = []
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def output(self) -> str:
+        return '\n'.join(self.output_lines)
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+class BaseExecutor:
+    """
+    Runs a command per host concurrently, without any limit on the number of hosts.
+
+    Output of every host is streamed line by line to the on_line callback as soon as it's produced,
+    completion of a host is noticed immediately. All the commands are spawned at once after
+    the executor is prepared (e.g. connections are established), which keeps the start skew low.
+    If the execution is interrupted (e.g. by Ctrl-C) or the current stage is cancelled (e.g. a batch job),
+    the running commands are terminated.
+    """
+
+    # max length of an output line
+    LINE_LIMIT = 1024 * 1024
+
+    # how often cancellation of the current stage is checked while waiting for the output, s
+    _CANCEL_CHECK_INTERVAL = 0.5
+
+    def __init__(self, on_line: Callable[[str, str], None] = None):
+        """
+        Ctor.
+        :param on_line: callback receiving a host and a line of its output (without the line break)
+        """
+        self._on_line = on_line
+
+    def run(self, commands: Dict[str, str], timeout: float = None) -> Dict[str, HostResult]:
+        """
+        Runs the commands and waits for all of them to finish.
+        :param commands: host -> shell command to run on the host
+        :param timeout: seconds after which the commands still running are terminated, no limit by default
+        """
+        hosts = list(commands)
+        results = dict((host, HostResult(host)) for host in hosts)
+        deadline = None if timeout is None else time() + timeout
+        # the output is read by a thread per host, the lines are handled in the calling thread
+        lines = queue.Queue()
+        processes = dict()
+        readers = []
+
+        self._prepare(hosts)
+        try:
+            for host in hosts:
+                results[host].started = time()
+                processes[host] = subprocess.Popen(
+                    self._command_args(host, commands[host]),
+                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    env=self._env(host), start_new_session=True)
+
+            for host, process in processes.items():
+                reader = Thread(target=self._read, args=(host, process.stdout, lines), daemon=True)
+                reader.start()
+                readers.append(reader)
+
+            running = len(processes)
+            while running:
+                check_cancelled()
+                wait = self._CANCEL_CHECK_INTERVAL if deadline is None \
+                    else min(self._CANCEL_CHECK_INTERVAL, max(deadline - time(), 0))
+                try:
+                    host, line = lines.get(timeout=wait)
+                except queue.Empty:
+                    if deadline is not None and time() >= deadline:
+                        raise TankError('Commands have not finished in {} seconds'.format(timeout))
+                    continue
+
+                result = results[host]
+                if line is None:
+                    result.exit_code = processes[host].wait()
+                    result.finished = time()
+                    running -= 1
+                    continue
+
+                result.output_lines.append(line)
+                if self._on_line is not None:
+                    self._on_line(host, line)
+        finally:
+            # e.g. KeyboardInterrupt, cement's CaughtSignal or the timeout: terminating the running commands
+            for process in processes.values():
+                if process.poll() is None:
+                    self._terminate(process)
+            for process in processes.values():
+                process.wait()
+            for reader in readers:
+                reader.join()
+            for process in processes.values():
+                process.stdout.close()
+            self._close(hosts)
+
+        return results
+
+    def _read(self, host: str, stream, lines: queue.Queue):
+        for line in iter(lambda: stream.readline(self.LINE_LIMIT), b''):
+            lines.put((host, line.decode(errors='replace').rstrip('\r\n')))
+        lines.put((host, None))
+
+    def _command_args(self, host: str, command: str) -> List[str]:
+        raise NotImplementedError()
+
+    def _env(self, host: str) -> Optional[Dict[str, str]]:
+        return None
+
+    def _prepare(self, hosts: List[str]):
+        pass
+
+    def _close(self, hosts: List[str]):
+        pass
+
+    @staticmethod
+    def _terminate(process):
+        try:
+            # the command may have spawned children
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+
+class LocalExecutor(BaseExecutor):
+    """
+    Runs the commands as local subprocesses, the host is available as $TANK_HOST.
+    """
+
+    def _command_args(self, host: str, command: str) -> List[str]:
+        return ['/bin/sh', '-c', command]
+
+    def _env(self, host: str) -> Dict[str, str]:
+        return dict(os.environ, TANK_HOST=host)
+
+
+class SSHExecutor(BaseExecutor):
+    """
+    Runs the commands over ssh.
+
+    A master connection is opened to every host concurrently before any command is started,
+    the commands are multiplexed over these connections.
+    """
+
+    def __init__(self, private_key: str, user: str = 'root', connect_timeout: int = 30,
+                 on_line: Callable[[str, str], None] = None):
+        super().__init__(on_line)
+        self._private_key = private_key
+        self._user = user
+        self._connect_timeout = connect_timeout
+        self._control_dir = None
+
+    def _ssh_args(self, *args: str) -> List[str]:
+        return [
+            'ssh', '-i', self._private_key, '-l', self._user,
+            '-o', 'BatchMode=yes',
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', 'UserKnownHostsFile=/dev/null',
+            '-o', 'LogLevel=ERROR',
+            '-o', 'ConnectTimeout={}'.format(self._connect_timeout),
+            '-o', 'ServerAliveInterval=30',
+            # unix socket paths are short, hence a hash of the connection parameters
+            '-o', 'ControlPath={}'.format(os.path.join(self._control_dir, '%C')),
+        ] + list(args)
+
+    def _command_args(self, host: str, command: str) -> List[str]:
+        # a pseudo-terminal: the remote command gets SIGHUP when the channel is closed, e.g. ssh is terminated
+        return self._ssh_args('-tt', '-o', 'ControlMaster=no', host, '--', command)
+
+    def _prepare(self, hosts: List[str]):
+        self._control_dir = tempfile.mkdtemp(prefix='tank-ssh-')
+
+        # the first connection becomes a persistent master in background,
+        # stderr goes to a file as the master inherits it
+        connections = dict()
+        try:
+            for host in hosts:
+                stderr = tempfile.TemporaryFile()
+                connections[host] = stderr, subprocess.Popen(
+                    self._ssh_args('-o', 'ControlMaster=auto', '-o', 'ControlPersist=yes', host, 'true'),
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr)
+
+            errors = []
+            for host, (stderr, process) in connections.items():
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    errors.append('{}: {}'.format(host, stderr.read().decode(errors='replace').strip()))
+        finally:
+            for stderr, _ in connections.values():
+                stderr.close()
+
+        if errors:
+            self._close(hosts)
+            raise TankError('Failed to connect to hosts:\n{}'.format('\n'.join(errors)))
+
+    def _close(self, hosts: List[str]):
+        if self._control_dir is None:
+            return
+
+        processes = [subprocess.Popen(self._ssh_args('-O', 'exit', host), stdin=subprocess.DEVNULL,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) for host in hosts]
+        for process in processes:
+            process.wait()
+        rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+
+
+def make_executor(name: str, private_key: str, on_line: Callable[[str, str], None] = None) -> BaseExecutor:
+    """
+    Creates an executor by its name from the config: ssh (default) or local (for testing without cloud hosts).
+    """
+    if name == 'ssh':
+        return SSHExecutor(private_key, on_line=on_line)
+    if name == 'local':
+        return LocalExecutor(on_line=on_line)
+
+    raise TankError('Unknown executor: {}'.format(name))
+
+
+def start_skew(results: Dict[str, HostResult]) -> Optional[float]:
+    """
+    Spread of the start times of the commands, s.
+    """
+    started = [result.started for result in results.values() if result.started is not None]
+    return max(started) - min(started) if started else None
@@ -0,0 +1,252 @@
+#
+#   module tank.core.image
+#
+# Golden images: provider snapshots of an instance with the base layer of provisioning done.
+#
+import os
+import json
+import shutil
+from time import time
+from typing import Dict, Optional
+
+from cement import fs
+
+from tank.core import resource_path
+from tank.core.binding import AnsibleBinding
+from tank.core.cloud_settings import CloudProvider
+from tank.core.exc import TankError, TankConfigError
+from tank.core.roles import RoleCache
+from tank.core.stages import run_command, sleep
+from tank.core.tf import PlanGenerator, PluginCache, TerraformState
+from tank.core.utils import yaml_load, yaml_dump, sha256
+
+
+# playbooks of the base layer, hosts booted from a golden image skip the plays of base.yml
+BASE_PLAYBOOKS = ('base.yml', 'image.yml')
+
+
+def image_content_hash(app, binding: str) -> str:
+    """
+    Hash of everything an image of the binding is built from: the playbooks, the roles,
+    the docker images of the binding and the provider template of the builder instance.
+    """
+    parts = [app.cloud_settings.provider.value]
+    for filename in [resource_path('ansible', name) for name in BASE_PLAYBOOKS + ('ansible-requirements.yml',)] \
+            + [fs.join(PlanGenerator.templates_dir(app), 'image', 'main.tf')]:
+        with open(filename, 'rb') as fh:
+            parts.append(sha256(fh.read()))
+    parts.append(json.dumps(AnsibleBinding(app, binding).docker_images(), sort_keys=True))
+
+    return sha256('\n'.join(parts).encode())
+
+
+class ImageCatalog:
+    """
+    Golden images built by the user: provider -> binding -> image record, kept in ~/.tank/images.yml.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    @classmethod
+    def of_user(cls, app):
+        return cls(fs.join(app.user_dir, 'images.yml'))
+
+    def images(self, provider: str) -> Dict[str, Dict]:
+        return self._load().get(provider, dict())
+
+    def get(self, provider: str, binding: str) -> Optional[Dict]:
+        return self.images(provider).get(binding)
+
+    def current(self, provider: str, binding: str, content_hash: str) -> Optional[str]:
+        """
+        Id of the image of the binding, None if there is no image or it was built from other contents.
+        """
+        record = self.get(provider, binding)
+        if record is None or record['content_hash'] != content_hash:
+            return None
+        return record['id']
+
+    def record(self, provider: str, binding: str, image_id: str, name: str, content_hash: str):
+        images = self._load()
+        images.setdefault(provider, dict())[binding] = {
+            'id': image_id,
+            'name': name,
+            'content_hash': content_hash,
+            'created': int(time()),
+        }
+        yaml_dump(self.filename, images)
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.filename):
+            return dict()
+        return yaml_load(self.filename) or dict()
+
+
+class DigitalOceanImages:
+    """
+    Snapshots of droplets via the DigitalOcean API.
+    """
+
+    API_URL = 'https://api.digitalocean.com/v2'
+    _POLL_INTERVAL = 10
+
+    def __init__(self, provider_vars: Dict):
+        self._token = provider_vars['token']
+
+    def snapshot(self, outputs: Dict, name: str) -> str:
+        droplet = outputs['builder_id']
+        # a consistent file system
+        self._wait(self._request('POST', '/droplets/{}/actions'.format(droplet), {'type': 'shutdown'}))
+        self._wait(self._request('POST', '/droplets/{}/actions'.format(droplet), {'type': 'snapshot', 'name': name}))
+
+        snapshots = self._request('GET', '/droplets/{}/snapshots'.format(droplet))['snapshots']
+        for snapshot in snapshots:
+            if snapshot['name'] == name:
+                return str(snapshot['id'])
+        raise TankError('Snapshot {} of droplet {} is not found'.format(name, droplet))
+
+    def _wait(self, response: Dict):
+        action = response['action']
+        while action['status'] == 'in-progress':
+            sleep(self._POLL_INTERVAL)
+            action = self._request('GET', '/actions/{}'.format(action['id']))['action']
+
+        if action['status'] != 'completed':
+            raise TankError('DigitalOcean action {} {}'.format(action['type'], action['status']))
+
+    def _request(self, method: str, path: str, data: Dict = None) -> Dict:
+        from urllib.request import Request, urlopen
+
+        request = Request(self.API_URL + path, method=method,
+                          data=None if data is None else json.dumps(data).encode(),
+                          headers={'Authorization': 'Bearer {}'.format(self._token),
+                                   'Content-Type': 'application/json'})
+        with urlopen(request, timeout=60) as response:
+            return json.loads(response.read().decode())
+
+
+class GceImages:
+    """
+    Images of instance disks via the gcloud tool.
+    """
+
+    def __init__(self, provider_vars: Dict):
+        self._project = provider_vars['project']
+        self._cred_path = provider_vars['cred_path']
+
+    def snapshot(self, outputs: Dict, name: str) -> str:
+        if shutil.which('gcloud') is None:
+            raise TankConfigError('Images of GCE instances are created by gcloud, please install Google Cloud SDK')
+
+        env = os.environ.copy()
+        env['CLOUDSDK_AUTH_CREDENTIAL_FILE_OVERRIDE'] = self._cred_path
+        run_command('gcloud', 'compute', 'images', 'create', name,
+                    '--project', self._project,
+                    '--source-disk', outputs['builder_id'], '--source-disk-zone', outputs['builder_zone'],
+                    '--force', _env=env)
+        return name
+
+
+IMAGE_PROVIDERS = {
+    CloudProvider.DIGITAL_OCEAN: DigitalOceanImages,
+    CloudProvider.GOOGLE_CLOUD_ENGINE: GceImages,
+}
+
+
+class ImageBaker:
+    """
+    Builds a golden image of a binding: creates a builder instance, runs the base playbooks on it,
+    pulls the docker images of the binding, snapshots the instance and destroys it.
+
+    Builder state, plan and roles are kept in ~/.tank/images/<provider>-<binding>.
+    """
+
+    def __init__(self, app, binding: str, images=None):
+        """
+        Ctor.
+        :param images: provider-specific snapshot maker, chosen by the configured provider by default
+        """
+        self._app = app
+        self.binding = binding
+        self._provider = app.cloud_settings.provider
+        if images is None:
+            if self._provider not in IMAGE_PROVIDERS:
+                raise TankConfigError('Images are not supported for provider {}'.format(self._provider))
+            images = IMAGE_PROVIDERS[self._provider](app.cloud_settings.provider_vars)
+        self._images = images
+
+    def bake(self) -> Dict:
+        content_hash = image_content_hash(self._app, self.binding)
+        # names of GCE images are unique, lowercase letters, digits and hyphens
+        name = 'tank-{}-{}-{}'.format(self.binding.replace('_', '-').lower(), content_hash[:8], int(time()))
+        catalog = ImageCatalog.of_user(self._app)
+
+        fs.ensure_dir_exists(self._plan_dir)
+        self._render_plan()
+        self._install_roles()
+        run_command(self._app.terraform_run_command, 'init', '-input=false', *PluginCache(self._app).init_args(),
+                    self._plan_dir, _env=self._env(), _cwd=self._dir)
+        try:
+            run_command(self._app.terraform_run_command, 'apply', '-auto-approve', self._plan_dir,
+                        _env=self._env(), _cwd=self._dir)
+            outputs = TerraformState(self._state_file).outputs()
+
+            run_command('ansible-playbook',
+                        '-u', 'root',
+                        '-i', '{},'.format(outputs['builder_ip']),
+                        '--private-key={}'.format(self._app.cloud_settings.provider_vars['pvt_key']),
+                        '--extra-vars', json.dumps({'tank_docker_images': AnsibleBinding(
+                            self._app, self.binding).docker_images()}),
+                        resource_path('ansible', 'image.yml'),
+                        _env=self._env(), _cwd=self._dir)
+
+            image_id = self._images.snapshot(outputs, name)
+        finally:
+            run_command(self._app.terraform_run_command, 'destroy', '-auto-approve', self._plan_dir,
+                        _env=self._env(), _cwd=self._dir)
+
+        previous = catalog.get(self._provider.value, self.binding)
+        catalog.record(self._provider.value, self.binding, image_id, name, content_hash)
+        return {'id': image_id, 'name': name, 'content_hash': content_hash, 'previous': previous}
+
+    def _render_plan(self):
+        import jinja2
+
+        templates = fs.join(PlanGenerator.templates_dir(self._app), 'image')
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(templates), keep_trailing_newline=True)
+        with open(fs.join(self._plan_dir, 'main.tf'), 'w') as fh:
+            fh.write(env.get_template('main.tf').render(binding=self.binding))
+
+    def _install_roles(self):
+        RoleCache(self._app, ttl=self._app.ansible_config.get('role_cache_ttl', 0)).install(
+            yaml_load(resource_path('ansible', 'ansible-requirements.yml')), self._roles_path, self._env())
+
+    def _env(self) -> Dict:
+        env = self._app.app_env
+        env.pop('TF_LOG', None)
+        env['TF_DATA_DIR'] = fs.join(self._dir, 'tf_data')
+        env['TF_VAR_setup_id'] = 'image'
+        env['TF_VAR_blockchain_name'] = self.binding.replace('_', '-')[:10]
+        for k, v in self._app.cloud_settings.provider_vars.items():
+            env['TF_VAR_{}'.format(k)] = v
+
+        env['ANSIBLE_ROLES_PATH'] = self._roles_path
+        env['ANSIBLE_CONFIG'] = resource_path('ansible', 'ansible.cfg')
+        return env
+
+    @property
+    def _dir(self) -> str:
+        return fs.join(self._app.user_dir, 'images', '{}-{}'.format(self._provider.value, self.binding))
+
+    @property
+    def _plan_dir(self) -> str:
+        return fs.join(self._dir, 'tf_plan')
+
+    @property
+    def _state_file(self) -> str:
+        return fs.join(self._dir, 'terraform.tfstate')
+
+    @property
+    def _roles_path(self) -> str:
+        return fs.join(self._dir, 'ansible_roles')
@@ -0,0 +1,206 @@
+#
+#   module tank.core.inventory
+#
+# Ansible inventory of a run generated from the testcase and the Terraform state.
+#
+import os
+import re
+import json
+from typing import Dict, List
+
+from tank.core.exc import TankError
+from tank.core.tf import TerraformState
+from tank.core.utils import sha256, json_load, json_dump_atomic
+
+
+# group -> substrings of the names of the member roles
+ROLE_GROUPS = {
+    'bcboot': ('boot',),
+    'bcpeers': ('boot', 'prod'),
+    'allnodes': ('boot', 'prod', 'full'),
+}
+MONITORING_GROUP = 'monitoring_peer'
+MONITORING_ROLE = 'monitoring'
+# hosts booted from an up-to-date golden image, they skip the base layer of provisioning
+BAKED_GROUP = 'baked'
+
+# resources are named tank-<role>-<index of the role config>, see the provider templates
+_RESOURCE_NAME_RE = re.compile(r'^tank-(?P<role>.+)-(?P<index>\d+)$')
+_MONITORING_RESOURCES = ('tank-monitoring', 'monitoring')
+
+
+def host_vars(resource: str, testcase_instances) -> Dict:
+    """
+    Variables of a host describing its place in the testcase.
+    :param resource: Terraform resource of the host, e.g. digitalocean_droplet.tank-boot-1
+    :param testcase_instances: converted testcase instances
+    """
+    name = resource.split('.', 1)[-1]
+    if name in _MONITORING_RESOURCES:
+        return {'tank_role': MONITORING_ROLE}
+
+    match = _RESOURCE_NAME_RE.match(name)
+    try:
+        role = match.group('role')
+        config = testcase_instances[role][int(match.group('index')) - 1]
+    except (AttributeError, KeyError, IndexError):
+        raise TankError('Resource {} is not described by the testcase'.format(resource))
+
+    return {'tank_role': role, 'tank_region': config['region'], 'tank_type': config['type']}
+
+
+def _booted_from(attributes: Dict[str, str], image: str) -> bool:
+    for key in ('image', 'boot_disk.0.initialize_params.0.image'):
+        value = attributes.get(key)
+        # GCE keeps self links of the images
+        if value is not None and (value == image or value.endswith('/' + image)):
+            return True
+    return False
+
+
+def build_inventory(instances: Dict[str, dict], testcase_instances, outputs: Dict = None,
+                    image: str = None) -> Dict:
+    """
+    Inventory (in the Ansible yaml/json format) with the host groups used by the playbooks.
+
+    Hosts are named by their public IP addresses. Like terraform-inventory did, every resource is a group
+    (e.g. tank-boot-1), attributes of the resources are host variables. Hosts with the same tank_private_network
+    reach each other by tank_private_ip.
+    The outputs are available to all the hosts as the terraform_outputs variable.
+    :param instances: machines of the Terraform state, see TerraformState.instances
+    :param testcase_instances: converted testcase instances
+    :param outputs: Terraform outputs
+    :param image: id of the golden image of the binding, if any
+    """
+    hosts = dict()
+    groups = dict((group, dict()) for group in list(ROLE_GROUPS) + [MONITORING_GROUP, BAKED_GROUP])
+
+    for address, instance in sorted(instances.items()):
+        ip = instance['public_ip']
+        if not ip:
+            continue
+
+        hosts[ip] = dict(instance.get('attributes', dict()))
+        hosts[ip].update(host_vars(instance['resource'], testcase_instances))
+        if instance.get('private_ip'):
+            hosts[ip].update(tank_private_ip=instance['private_ip'], tank_private_network=instance['private_network'])
+        role = hosts[ip]['tank_role']
+
+        groups.setdefault(instance['resource'].split('.', 1)[-1], dict())[ip] = None
+        if image is not None and _booted_from(instance.get('attributes', dict()), image):
+            groups[BAKED_GROUP][ip] = None
+
+        if role == MONITORING_ROLE:
+            groups[MONITORING_GROUP][ip] = None
+            continue
+
+        for group, role_patterns in ROLE_GROUPS.items():
+            if any(pattern in role for pattern in role_patterns):
+                groups[group][ip] = None
+
+    return {'all': {
+        'hosts': hosts,
+        'vars': {'terraform_outputs': dict(outputs or dict())},
+        'children': dict((group, {'hosts': members}) for group, members in groups.items()),
+    }}
+
+
+def new_hosts(instances_before: Dict[str, dict], instances_after: Dict[str, dict]) -> List[str]:
+    """
+    Hosts (public IPs) of the instances which weren't there before: created, recreated,
+    or got the address of a destroyed instance.
+    :param instances_before: machines of the Terraform state, see TerraformState.instances
+    """
+    def identity(instance):
+        return instance['public_ip'], instance.get('attributes', dict()).get('id')
+
+    known = set(identity(instance) for instance in instances_before.values())
+    return sorted(instance['public_ip'] for instance in instances_after.values()
+                  if instance['public_ip'] and identity(instance) not in known)
+
+
+class StateInventory:
+    """
+    Inventory of a run read from the local Terraform state, it's shared by Ansible and Tank itself.
+
+    The inventory is saved into a json file, which is regenerated only when the state changes:
+    size and mtime of the state are checked first, the state is hashed only if they differ.
+    """
+
+    # variable of the inventory describing the state it was generated from
+    STATE_VAR = 'tank_state'
+
+    def __init__(self, state_file: str, inventory_file: str, testcase_instances, image: str = None):
+        """
+        Ctor.
+        :param image: id of the golden image of the binding, if any
+        """
+        self._state_file = state_file
+        self.inventory_file = inventory_file
+        self._testcase_instances = testcase_instances
+        self._image = image
+        self._data = None
+
+    @property
+    def path(self) -> str:
+        """
+        Up-to-date inventory file.
+        """
+        self.data()
+        return self.inventory_file
+
+    def data(self) -> Dict:
+        stamp = self._stamp()
+        if self._data is None and os.path.exists(self.inventory_file):
+            self._data = json_load(self.inventory_file)
+
+        if self._data is not None:
+            cached = self._data['all']['vars'].get(self.STATE_VAR, dict())
+            if all(cached.get(key) == stamp[key] for key in ('size', 'mtime', 'testcase', 'image')):
+                return self._data
+
+            stamp['sha256'] = self._state_sha256()
+            if all(cached.get(key) == stamp[key] for key in ('sha256', 'testcase', 'image')):
+                # touched, but not changed
+                self._save(stamp)
+                return self._data
+
+        stamp['sha256'] = self._state_sha256()
+        state = TerraformState(self._state_file)
+        self._data = build_inventory(state.instances(), self._testcase_instances, state.outputs(), self._image)
+        self._save(stamp)
+
+        return self._data
+
+    def hosts(self, group: str = 'all') -> List[str]:
+        all_hosts = self.data()['all']
+        if group == 'all':
+            return sorted(all_hosts['hosts'])
+
+        return sorted(all_hosts['children'].get(group, dict()).get('hosts', dict()))
+
+    def _save(self, stamp: Dict):
+        self._data['all']['vars'][self.STATE_VAR] = stamp
+        json_dump_atomic(self.inventory_file, self._data)
+
+    def _stamp(self) -> Dict:
+        stamp = {
+            'size': None,
+            'mtime': None,
+            # the roles of the hosts depend on the testcase
+            'testcase': sha256(json.dumps(self._testcase_instances, sort_keys=True, default=dict).encode()),
+            # the baked group depends on the image
+            'image': self._image,
+        }
+        if os.path.exists(self._state_file):
+            state_stat = os.stat(self._state_file)
+            stamp.update(size=state_stat.st_size, mtime=state_stat.st_mtime_ns)
+
+        return stamp
+
+    def _state_sha256(self) -> str:
+        if not os.path.exists(self._state_file):
+            return None
+
+        with open(self._state_file, 'rb') as fh:
+            return sha256(fh.read())
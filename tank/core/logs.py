@@ -0,0 +1,192 @@
+#
+#   module tank.core.logs
+#
+# Capture of Terraform and Ansible logs into compressed, size-capped files.
+#
+import os
+import re
+import gzip
+import tempfile
+import threading
+from shutil import rmtree
+from typing import Dict, Iterator, List
+
+from tank.core.exc import TankError
+
+
+class LogCapture:
+    """
+    Streams a log written by an external tool through a named pipe into gzip files.
+
+    The tool writes into the pipe (e.g. TF_LOG_PATH points to it), so it never waits for the disk,
+    compression and writing happen in a background thread. The uncompressed size of a file is capped by max_bytes,
+    when the cap is reached the file is rotated: <name>.gz -> <name>.1.gz -> ... -> <name>.<backups>.gz,
+    the oldest file is removed. A file left by a previous capture is rotated as well.
+    If the capture fails (e.g. the disk is full), the rest of the log is discarded, so the tool never blocks
+    on the pipe, and the error is raised on exit.
+    """
+
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        """
+        Ctor.
+        :param path: log file without the .gz extension
+        :param max_bytes: max uncompressed size of a single file
+        :param backups: how many rotated files to keep
+        """
+        self.path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._fifo_dir = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._error = None
+
+    @property
+    def fifo(self) -> str:
+        return os.path.join(self._fifo_dir, 'log')
+
+    def __enter__(self) -> str:
+        self._fifo_dir = tempfile.mkdtemp(prefix='tank-log-')
+        os.mkfifo(self.fifo)
+
+        self._thread = threading.Thread(target=self._read, name='log-{}'.format(os.path.basename(self.path)),
+                                        daemon=True)
+        self._thread.start()
+        return self.fifo
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopping.set()
+        while self._thread.is_alive():
+            # unblocks the reader waiting for a writer
+            try:
+                os.close(os.open(self.fifo, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                # the reader isn't waiting at the moment
+                pass
+            self._thread.join(0.1)
+
+        rmtree(self._fifo_dir, ignore_errors=True)
+        if self._error is not None and exc_type is None:
+            raise TankError('Failed to capture log {}: {}'.format(self.path, self._error))
+
+    def _read(self):
+        try:
+            self._capture()
+        except Exception as e:
+            self._error = e
+            # writers would block on the pipe without a reader
+            self._drain()
+
+    def _capture(self):
+        output = None
+        written = 0
+        try:
+            # several writers may open the pipe one after another
+            while not self._stopping.is_set():
+                with open(self.fifo, 'rb') as fifo:
+                    for chunk in iter(lambda: fifo.read1(self._CHUNK_SIZE), b''):
+                        if output is None or written >= self._max_bytes:
+                            if output is not None:
+                                output.close()
+                            self._rotate()
+                            output = gzip.open(self.path + '.gz', 'wb', compresslevel=1)
+                            written = 0
+
+                        output.write(chunk)
+                        written += len(chunk)
+        finally:
+            if output is not None:
+                try:
+                    output.close()
+                except Exception:
+                    # the original error is reported
+                    pass
+
+    def _drain(self):
+        while not self._stopping.is_set():
+            with open(self.fifo, 'rb') as fifo:
+                while fifo.read1(self._CHUNK_SIZE):
+                    pass
+
+    def _rotate(self):
+        for index in range(self._backups, 0, -1):
+            source = self.path + ('.{}.gz'.format(index - 1) if index > 1 else '.gz')
+            if os.path.exists(source):
+                os.replace(source, '{}.{}.gz'.format(self.path, index))
+
+        if os.path.exists(self.path + '.gz'):
+            # no backups are kept
+            os.remove(self.path + '.gz')
+
+
+def log_files(path: str) -> List[str]:
+    """
+    Existing files of a captured log, the oldest first.
+    """
+    files = [path + '.gz'] + ['{}.{}.gz'.format(path, index) for index in range(1, 1000)]
+    existing = []
+    for filename in files:
+        if not os.path.exists(filename):
+            break
+        existing.append(filename)
+
+    return list(reversed(existing))
+
+
+def read_log(path: str) -> Iterator[str]:
+    """
+    Lines of a captured log across the rotated files.
+    """
+    for filename in log_files(path):
+        with gzip.open(filename, 'rt', errors='replace') as fh:
+            for line in fh:
+                yield line.rstrip('\n')
+
+
+class TerraformTrace:
+    """
+    Extracts traces of failed resources from a Terraform log.
+
+    A failed resource is mentioned in an error line as `* <type>.<name>[<index>]: <error>`,
+    its trace is all the lines mentioning the resource and continuation lines of the matched records.
+    """
+
+    _RECORD_RE = re.compile(r'^\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2} \[')
+    _FAILED_RE = re.compile(r'\* ([a-z0-9_]+\.[A-Za-z0-9_.-]+?)(?:\[\d+\])?: ')
+
+    def __init__(self, lines: Iterator[str]):
+        self._records = []
+        for line in lines:
+            if self._RECORD_RE.match(line) or not self._records:
+                self._records.append([line])
+            else:
+                self._records[-1].append(line)
+
+    def failed_resources(self) -> List[str]:
+        failed = []
+        for record in self._records:
+            if '[ERROR]' not in record[0]:
+                continue
+            for line in record:
+                for address in self._FAILED_RE.findall(line):
+                    if address not in failed:
+                        failed.append(address)
+
+        return failed
+
+    def trace(self, address: str) -> List[str]:
+        """
+        Log records mentioning the resource.
+        """
+        mention_re = re.compile(r'(?<![\w.-]){}(?![\w-])'.format(re.escape(address)))
+        lines = []
+        for record in self._records:
+            if any(mention_re.search(line) for line in record):
+                lines.extend(record)
+
+        return lines
+
+    def failed_traces(self) -> Dict[str, List[str]]:
+        return dict((address, self.trace(address)) for address in self.failed_resources())
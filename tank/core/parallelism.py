@@ -0,0 +1,158 @@
+#
+#   module tank.core.parallelism
+#
+# Parallelism of Terraform and Ansible: tuning to a cluster and limits shared by runs working at the same time.
+#
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+from tank.core.stages import check_cancelled
+from tank.core.utils import json_load, json_dump_atomic
+
+
+class ParallelismBudget:
+    """
+    Global limits of concurrency shared by the runs of a batch.
+
+    Resources are e.g. `api` - cloud API calls in flight (sum of Terraform parallelism),
+    `forks` - Ansible forks, `cpu` - Terraform and Ansible processes running locally.
+    A resource without a limit is not restricted.
+
+    Every consumer is guaranteed its fair share of a limit (limit / consumers),
+    a request is granted as soon as the fair share (or the requested amount, if it's less) is free,
+    but a consumer gets as much of the free amount as it requested.
+    """
+
+    _POLL_INTERVAL = 0.5
+
+    def __init__(self, limits: Dict[str, int] = None, consumers: int = 1):
+        """
+        Ctor.
+        :param limits: resource -> limit, resources without a (positive) limit are not restricted
+        :param consumers: number of runs sharing the budget
+        """
+        self.limits = dict((resource, int(limit)) for resource, limit in (limits or dict()).items() if limit)
+        self._consumers = max(1, consumers)
+        self._free = dict(self.limits)
+        self._changed = threading.Condition()
+
+    @contextmanager
+    def take(self, **wanted: int):
+        """
+        Takes some amount of the resources for the duration of the context, waits for the resources if needed.
+
+        The resources are taken at once, so consumers can't block each other holding a part of the resources.
+        :param wanted: resource -> wanted amount
+        :returns: resource -> granted amount, which is between 1 and the wanted amount
+        """
+        limited = [resource for resource in wanted if resource in self.limits]
+
+        with self._changed:
+            while not all(self._free[resource] >= self._minimum(resource, wanted[resource]) for resource in limited):
+                check_cancelled()
+                self._changed.wait(self._POLL_INTERVAL)
+
+            granted = dict(wanted)
+            for resource in limited:
+                granted[resource] = min(wanted[resource], self._free[resource])
+                self._free[resource] -= granted[resource]
+
+        try:
+            yield granted
+        finally:
+            with self._changed:
+                for resource in limited:
+                    self._free[resource] += granted[resource]
+                self._changed.notify_all()
+
+    def _minimum(self, resource: str, wanted: int) -> int:
+        fair_share = max(1, self.limits[resource] // self._consumers)
+        return max(1, min(wanted, fair_share))
+
+
+class ParallelismTuner:
+    """
+    Parallelism of Terraform and Ansible suited to the size of a cluster and the local machine.
+    """
+
+    # upper limits of Terraform parallelism: the Terraform default for plan, the limits safe for the provider APIs
+    # for apply and destroy
+    TERRAFORM_LIMITS = {'plan': 10, 'apply': 51, 'destroy': 100}
+    # resources besides the instances, e.g. the monitoring instance and the ssh key or the firewall
+    EXTRA_RESOURCES = 2
+    # Ansible forks mostly wait for the network, but every fork is a local process
+    FORKS_PER_CPU = 16
+    # seconds to wait before resuming after the provider throttled requests, it grows with every attempt
+    BACKOFF_DELAY = 30
+
+    def __init__(self, instances: int, max_forks: int, cpus: int = None):
+        """
+        Ctor.
+        :param instances: number of the instances of a cluster, including the monitoring
+        :param max_forks: upper limit of Ansible forks
+        :param cpus: number of local CPUs, detected by default
+        """
+        self.instances = instances
+        self.max_forks = max_forks
+        self.cpus = cpus or os.cpu_count() or 1
+
+    def terraform(self, action: str) -> int:
+        return max(1, min(self.TERRAFORM_LIMITS[action], self.instances + self.EXTRA_RESOURCES))
+
+    def forks(self) -> int:
+        return max(1, min(self.max_forks, self.instances, self.cpus * self.FORKS_PER_CPU))
+
+    @staticmethod
+    def backoff(parallelism: int) -> int:
+        """
+        Lower parallelism to resume with after the provider throttled requests.
+        """
+        return max(1, parallelism // 2)
+
+    @classmethod
+    def backoff_delay(cls, attempt: int) -> int:
+        return cls.BACKOFF_DELAY * 2 ** (attempt - 1)
+
+
+class RateLimitWatch:
+    """
+    Output consumer which detects rate limit errors of the cloud providers.
+    """
+
+    _RATE_LIMIT_RE = re.compile(r'429 Too Many Requests|rate ?limit|rateLimitExceeded|Quota exceeded'
+                                r'|too many requests', re.IGNORECASE)
+
+    def __init__(self):
+        self.detected = False
+
+    def __call__(self, line):
+        if isinstance(line, bytes):
+            line = line.decode(errors='replace')
+        if self._RATE_LIMIT_RE.search(line):
+            self.detected = True
+
+
+class ParallelismLog:
+    """
+    Record of the parallelism used by the commands of a run and the outcomes, a json list.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def record(self, **entry):
+        with self.__class__._lock:
+            records = self.records()
+            records.append(entry)
+            json_dump_atomic(self.filename, records)
+
+    def records(self) -> List[Dict]:
+        if not os.path.exists(self.filename):
+            return []
+
+        return json_load(self.filename)
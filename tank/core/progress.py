@@ -0,0 +1,188 @@
+#
+#   module tank.core.progress
+#
+# Live progress of Ansible playbooks built on the events of the tank_events callback plugin.
+#
+import os
+import json
+import threading
+from time import time
+from typing import Callable, Dict, List, Optional
+
+
+class PlaybookProgress:
+    """
+    Hosts done per play and the estimated time left of the running play.
+
+    A host is done with a play when it has got results of all the tasks of the play, has failed or the play is over.
+    Tasks of dynamic includes, handlers and run_once tasks make the estimation rough, so a play is complete
+    only when the next one starts or the playbook ends.
+    """
+
+    def __init__(self):
+        self._plays: List[Dict] = []
+
+    def feed(self, event: Dict):
+        kind = event.get('event')
+        if kind in ('playbook_start', 'playbook_end', 'play_start'):
+            self._finish(event['time'])
+
+        if kind == 'play_start':
+            self._plays.append({
+                'play': event['play'],
+                'hosts': set(event['hosts']) if event.get('hosts') is not None else None,
+                'tasks': event.get('tasks'),
+                'started': event['time'],
+                'finished': None,
+                'seen': set(),
+                'results': dict(),
+                'failed': set(),
+            })
+            return
+
+        play = self._current
+        if play is None or event.get('play') != play['play']:
+            return
+
+        if kind in ('host_start', 'task_result'):
+            play['seen'].add(event['host'])
+        if kind == 'task_result':
+            play['results'].setdefault(event['host'], set()).add(event['task_uuid'])
+            if event['failed']:
+                play['failed'].add(event['host'])
+
+    def plays(self, now: float = None) -> List[Dict]:
+        """
+        :returns: play, hosts_total, hosts_done, hosts_failed, finished, elapsed and eta (None if unknown), seconds
+        """
+        now = time() if now is None else now
+        return [self._status(play, now) for play in self._plays]
+
+    @property
+    def _current(self) -> Optional[Dict]:
+        if self._plays and self._plays[-1]['finished'] is None:
+            return self._plays[-1]
+        return None
+
+    def _finish(self, when: float):
+        if self._current is not None:
+            self._current['finished'] = when
+
+    @staticmethod
+    def _status(play: Dict, now: float) -> Dict:
+        hosts = play['hosts'] if play['hosts'] is not None else play['seen']
+        tasks = play['tasks']
+        finished = play['finished'] is not None
+
+        def host_tasks(host: str) -> int:
+            return min(tasks, len(play['results'].get(host, ())))
+
+        if finished:
+            done = len(hosts)
+        elif tasks:
+            done = sum(1 for host in hosts if host in play['failed'] or host_tasks(host) >= tasks)
+        else:
+            done = len(play['failed'] & hosts)
+
+        elapsed = (play['finished'] if finished else now) - play['started']
+        eta = None
+        if not finished and tasks and hosts:
+            work_done = sum(tasks if host in play['failed'] else host_tasks(host) for host in hosts)
+            fraction = work_done / (tasks * len(hosts))
+            if fraction > 0:
+                eta = elapsed * (1 - fraction) / fraction
+
+        return {
+            'play': play['play'],
+            'hosts_total': len(hosts),
+            'hosts_done': done,
+            'hosts_failed': len(play['failed']),
+            'finished': finished,
+            'elapsed': elapsed,
+            'eta': eta,
+        }
+
+
+def format_play_status(status: Dict) -> str:
+    line = 'play "{}": {}/{} hosts done'.format(status['play'], status['hosts_done'], status['hosts_total'])
+    if status['hosts_failed']:
+        line += ', {} failed'.format(status['hosts_failed'])
+
+    if status['finished']:
+        return line + ' in {}'.format(_format_duration(status['elapsed']))
+    if status['eta'] is not None:
+        return line + ', ETA {}'.format(_format_duration(status['eta']))
+    return line
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return '{}m{:02d}s'.format(minutes, seconds) if minutes else '{}s'.format(seconds)
+
+
+class ProgressMonitor:
+    """
+    Follows the events file while Ansible is running and reports the progress every interval seconds.
+
+    Only the events appended after the monitor has started are taken into account.
+    Finished plays are reported once, the running play - on every report.
+    """
+
+    _POLL_INTERVAL = 1
+
+    def __init__(self, events_file: str, write: Callable[[str], None], interval: float):
+        self.events_file = events_file
+        self._write = write
+        self._interval = interval
+        self._progress = PlaybookProgress()
+        self._offset = 0
+        self._partial = ''
+        self._reported = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._offset = os.path.getsize(self.events_file) if os.path.exists(self.events_file) else 0
+        self._thread = threading.Thread(target=self._follow, name='progress', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopping.set()
+        self._thread.join()
+
+    def _follow(self):
+        last_report = time()
+        while not self._stopping.wait(self._POLL_INTERVAL):
+            self._read()
+            if time() - last_report >= self._interval:
+                self.report()
+                last_report = time()
+
+    def _read(self):
+        if not os.path.exists(self.events_file):
+            return
+
+        with open(self.events_file) as fh:
+            fh.seek(self._offset)
+            data = fh.read()
+            self._offset = fh.tell()
+
+        lines = (self._partial + data).split('\n')
+        # the last line is empty or being written at the moment
+        self._partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # e.g. a line of an interrupted playbook, reporting goes on
+                    continue
+                self._progress.feed(event)
+
+    def report(self):
+        plays = self._progress.plays()
+        for status in plays[self._reported:]:
+            if status['finished']:
+                self._reported += 1
+            self._write(format_play_status(status))
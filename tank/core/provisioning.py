@@ -0,0 +1,118 @@
+#
+#   module tank.core.provisioning
+#
+# Tracking of hosts provisioned by Ansible, Ansible config of a run.
+#
+import io
+import os
+import configparser
+import importlib.util
+from shutil import rmtree
+from time import time
+from typing import Dict, Iterable, List
+
+from tank.core.exc import TankConfigError
+from tank.core.utils import json_load, json_dump_atomic, write_atomic
+
+
+# strategies of the plays: linear - every task is done on all the hosts before the next task starts,
+# free - every host goes through the tasks at its own pace (plays are still run one after another),
+# mitogen_* - the same, but Ansible modules are run by the Mitogen library, without per-task ssh round-trips
+PROVISIONING_STRATEGIES = ('linear', 'free', 'mitogen_linear', 'mitogen_free')
+
+
+class ProvisionState:
+    """
+    Per-host provisioning state of a run.
+
+    A host is converged if the last provisioning of the host succeeded with the same inputs
+    (playbooks, roles, variables), such hosts are skipped by subsequent provisioning.
+    Hosts which have got through all the plays are marked by the last play of the playbook
+    with a file in converged_dir.
+    """
+
+    def __init__(self, state_file: str, converged_dir: str):
+        self._state_file = state_file
+        self.converged_dir = converged_dir
+
+    def pending(self, hosts: Iterable[str], inputs_hash: str) -> List[str]:
+        """
+        Hosts which need provisioning.
+        """
+        state = self._load()
+        return [host for host in hosts if state.get(host, dict()).get('inputs') != inputs_hash]
+
+    def prepare(self):
+        rmtree(self.converged_dir, ignore_errors=True)
+        os.makedirs(self.converged_dir)
+
+    def converged_hosts(self) -> List[str]:
+        """
+        Hosts which have got through all the plays during the last provisioning.
+        """
+        if not os.path.isdir(self.converged_dir):
+            return []
+        return sorted(os.listdir(self.converged_dir))
+
+    def record(self, hosts: Iterable[str], inputs_hash: str, converged: Iterable[str] = None):
+        """
+        :param hosts: provisioned hosts
+        :param converged: the hosts which have converged, all the provisioned hosts by default
+        """
+        state = self._load()
+        converged = None if converged is None else set(converged)
+
+        for host in hosts:
+            if converged is None or host in converged:
+                state[host] = {'inputs': inputs_hash, 'converged': int(time())}
+            else:
+                state.pop(host, None)
+
+        json_dump_atomic(self._state_file, state)
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self._state_file):
+            return dict()
+
+        return json_load(self._state_file)
+
+
+def ansible_config(template: str, strategy: str) -> str:
+    """
+    Ansible config of a run: the bundled config with the strategy of the plays set.
+    :param template: file of the bundled config
+    """
+    if strategy not in PROVISIONING_STRATEGIES:
+        raise TankConfigError('Unknown provisioning strategy {}, choose one of: {}'.format(
+            strategy, ', '.join(PROVISIONING_STRATEGIES)))
+
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(template)
+    config.set('defaults', 'strategy', strategy)
+    if strategy.startswith('mitogen_'):
+        config.set('defaults', 'strategy_plugins', _mitogen_strategy_plugins())
+
+    output = io.StringIO()
+    config.write(output)
+    return output.getvalue()
+
+
+def write_ansible_config(filename: str, template: str, strategy: str):
+    """
+    Generates the Ansible config of a run, the file is replaced only if the config has changed.
+    """
+    content = ansible_config(template, strategy)
+    if os.path.exists(filename):
+        with open(filename) as fh:
+            if fh.read() == content:
+                return
+
+    write_atomic(filename, content)
+
+
+def _mitogen_strategy_plugins() -> str:
+    spec = importlib.util.find_spec('ansible_mitogen')
+    if spec is None or not spec.submodule_search_locations:
+        raise TankConfigError('Mitogen strategies require the mitogen package: pip3 install mitogen')
+
+    return os.path.join(list(spec.submodule_search_locations)[0], 'plugins', 'strategy')
@@ -16,12 +16,18 @@ class RegionsConfig(object):
 
     def __init__(self, app):
         """Load or copy config file."""
-        self._config_file = fs.join(app.user_dir, self.FILE_NAME)
+        self._config_file = self.config_file(app)
+        self._config = yaml_load(self._config_file)
 
-        if not os.path.exists(self._config_file):
-            copy2(resource_path('regions.yml'), self._config_file)
+    @classmethod
+    def config_file(cls, app) -> str:
+        """Return path to the user config, copy the default one if missing."""
+        config_file = fs.join(app.user_dir, cls.FILE_NAME)
 
-        self._config = yaml_load(self._config_file)
+        if not os.path.exists(config_file):
+            copy2(resource_path('regions.yml'), config_file)
+
+        return config_file
 
     @property
     def config(self):
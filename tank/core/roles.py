@@ -0,0 +1,172 @@
+#
+#   module tank.core.roles
+#
+# Local cache of Ansible roles shared by all runs.
+#
+import os
+import re
+import tempfile
+from shutil import rmtree
+from time import time
+from typing import Dict, List, Optional
+
+from cement.utils import fs
+
+from tank.core.exc import TankError
+from tank.core.stages import run_command
+from tank.core.utils import yaml_dump, json_load, json_dump_atomic, sha256
+
+
+class RoleCache:
+    """
+    Ansible roles installed once per (src, version, resolved commit) and linked into runs.
+
+    Validity policy: versions which look like a commit hash or a release tag are immutable and never
+    checked again. Moving refs (branches like master, or no version at all) are resolved to a commit via
+    `git ls-remote`, the resolution is trusted for `ttl` seconds. If the remote is unreachable,
+    the most recent cached commit of the ref is used.
+    """
+
+    _IMMUTABLE_VERSION_RE = re.compile(r'^(?:[0-9a-f]{40}|v?\d+(?:\.\d+)*(?:[-+][0-9A-Za-z.-]+)?)$')
+
+    _INDEX_FILE = 'index.json'
+
+    def __init__(self, app, ttl: int = 0):
+        """
+        Ctor.
+        :param app: Tank app
+        :param ttl: how long (in seconds) a resolution of a moving ref is valid
+        """
+        self._app = app
+        self._ttl = ttl
+        self.path = fs.join(app.user_dir, 'ansible_roles')
+
+        fs.ensure_dir_exists(self.path)
+
+    def install(self, requirements: List[Dict], roles_path: str, env: Dict):
+        """
+        Makes roles from requirements.yml-like records available under roles_path.
+        """
+        from filelock import FileLock
+
+        fs.ensure_dir_exists(roles_path)
+
+        with FileLock(fs.join(self.path, '.lock')):
+            index = self._load_index()
+
+            for requirement in requirements:
+                entry = self._resolve(index, requirement)
+                entry_dir = fs.join(self.path, entry['key'])
+
+                if not os.path.isdir(entry_dir):
+                    self._fetch(requirement, entry, entry_dir, env)
+
+                entry['used'] = int(time())
+                index[entry['key']] = entry
+                self._save_index(index)
+
+                self._link(entry_dir, fs.join(roles_path, requirement['name']))
+
+    @classmethod
+    def is_immutable(cls, version: Optional[str]) -> bool:
+        return version is not None and cls._IMMUTABLE_VERSION_RE.match(str(version)) is not None
+
+    def _resolve(self, index: Dict, requirement: Dict) -> Dict:
+        """
+        Finds out the commit the requirement points to.
+        """
+        src = requirement['src']
+        version = requirement.get('version')
+        version = None if version is None else str(version)
+
+        resolved = int(time())
+        if self.is_immutable(version):
+            commit = version
+        else:
+            import sh
+
+            # only a resolution by the remote restarts the ttl, a cached one keeps its time
+            cached = self._cached_entry(index, src, version, fresh_only=True)
+            if cached is None:
+                try:
+                    commit = self._ls_remote(src, version)
+                except (sh.ErrorReturnCode, TankError) as e:
+                    cached = self._cached_entry(index, src, version, fresh_only=False)
+                    if cached is None:
+                        raise TankError('Failed to resolve version {} of {}: {}'.format(version, src, e))
+            if cached is not None:
+                commit, resolved = cached['commit'], cached['resolved']
+
+        return {
+            'key': sha256('\n'.join([src, version or '', commit]).encode())[:16],
+            'src': src,
+            'version': version,
+            'commit': commit,
+            'resolved': resolved,
+        }
+
+    def _cached_entry(self, index: Dict, src: str, version: Optional[str], fresh_only: bool) -> Optional[Dict]:
+        candidates = [e for e in index.values()
+                      if e['src'] == src and e['version'] == version and os.path.isdir(fs.join(self.path, e['key']))]
+        if fresh_only:
+            candidates = [e for e in candidates if time() - e['resolved'] < self._ttl]
+
+        if not candidates:
+            return None
+
+        return max(candidates, key=lambda e: e['resolved'])
+
+    @staticmethod
+    def _ls_remote(src: str, version: Optional[str]) -> str:
+        import sh
+
+        ref = 'HEAD' if version is None else version
+        refs = dict()
+        for line in str(sh.Command('git')('ls-remote', src, ref)).splitlines():
+            commit, _, name = line.partition('\t')
+            refs[name.strip()] = commit.strip()
+
+        # peeled annotated tags first
+        for name in ('refs/tags/{}^{{}}'.format(ref), 'refs/tags/{}'.format(ref), 'refs/heads/{}'.format(ref), ref):
+            if name in refs:
+                return refs[name]
+
+        if re.match(r'^[0-9a-f]{7,40}$', ref):
+            # abbreviated commit hash, can't be checked without cloning
+            return ref
+
+        raise TankError('Ref {} is not found in {}'.format(ref, src))
+
+    def _fetch(self, requirement: Dict, entry: Dict, entry_dir: str, env: Dict):
+        temp_dir = tempfile.mkdtemp(prefix='_{}'.format(entry['key']), dir=self.path)
+        try:
+            pinned = dict(requirement, version=entry['commit'])
+            requirements_file = fs.join(temp_dir, 'requirements.yml')
+            yaml_dump(requirements_file, [pinned])
+
+            run_command("ansible-galaxy",
+                        "install", "-f", "-r", requirements_file, "-p", temp_dir,
+                        _env=env)
+
+            os.rename(fs.join(temp_dir, requirement['name']), entry_dir)
+        finally:
+            rmtree(temp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _link(entry_dir: str, link_path: str):
+        if os.path.islink(link_path) or os.path.isfile(link_path):
+            os.remove(link_path)
+        elif os.path.isdir(link_path):
+            rmtree(link_path)
+
+        os.symlink(entry_dir, link_path)
+
+    def _load_index(self) -> Dict:
+        index_file = fs.join(self.path, self._INDEX_FILE)
+        if not os.path.exists(index_file):
+            return dict()
+
+        return json_load(index_file)
+
+    def _save_index(self, index: Dict):
+        json_dump_atomic(fs.join(self.path, self._INDEX_FILE), index)
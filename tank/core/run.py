@@ -5,26 +5,56 @@ import os
 import sys
 import stat
 import tempfile
+import functools
+import threading
+from contextlib import contextmanager
 from shutil import rmtree
 from shutil import copytree
 from time import time
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 from uuid import uuid4
 import json
+import logging
 from datetime import datetime
 
-import sh
 from cement import fs
-from filelock import FileLock
-import namesgenerator
 
 from tank.core import resource_path
+from tank.core.bench import BenchResults, BenchPlan, instance_type_weights
 from tank.core.binding import AnsibleBinding
+from tank.core.catalog import RunCatalog
 from tank.core.exc import TankError, TankConfigError
+from tank.core.executor import make_executor, start_skew
+from tank.core.image import ImageCatalog, image_content_hash
+from tank.core.inventory import StateInventory, MONITORING_GROUP, new_hosts
+from tank.core.logs import LogCapture, TerraformTrace, read_log
+from tank.core.parallelism import ParallelismBudget, ParallelismTuner, ParallelismLog, RateLimitWatch
+from tank.core.progress import ProgressMonitor
+from tank.core.provisioning import ProvisionState, write_ansible_config
+from tank.core.roles import RoleCache
+from tank.core.stages import StageScheduler, StageCancelled, PrefixedWriter, current_prefix, run_command, sleep, \
+    stage_streams
+from tank.core.sweep import BenchSweep
+from tank.core.timings import StageTimings, read_events, slowest_tasks, slowest_hosts
 from tank.core.testcase import TestCase
-from tank.core.tf import PlanGenerator
-from tank.core.utils import yaml_load, yaml_dump, grep_dir, json_load, sha256
-from tank.terraform_installer import TerraformInstaller, TerraformInventoryInstaller
+from tank.core.tf import PlanGenerator, PluginCache, TerraformState, plan_resources
+from tank.core.utils import yaml_load, yaml_dump, grep_dir, json_load, json_dump_atomic, sha256, thaw
+
+
+logger = logging.getLogger(__name__)
+
+
+def _stage(name: str):
+    """
+    Marks a method as a Run stage, stage transitions are reflected in the catalog of runs.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._stage_transition(name), self._capture_logs(name), self._measure(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class Run:
@@ -35,13 +65,15 @@ class Run:
     """
 
     @classmethod
-    def new_run(cls, app, testcase: TestCase):
+    def new_run(cls, app, testcase: TestCase, budget: ParallelismBudget = None):
+        import namesgenerator
+
         run_id = namesgenerator.get_random_name()
 
         fs.ensure_dir_exists(cls._runs_dir(app))
 
         temp_dir = tempfile.mkdtemp(prefix='_{}'.format(run_id), dir=cls._runs_dir(app))
-        cls._save_meta(temp_dir, testcase)
+        cls._save_meta(temp_dir, testcase, ImageCatalog.of_user(app).get(app.provider, testcase.binding))
 
         # make a copy to make sure any alterations of the source won't affect us
         testcase.save(fs.join(temp_dir, 'testcase.yml'))
@@ -51,44 +83,79 @@ class Run:
         # TODO prevent collisions
         os.rename(temp_dir, fs.join(cls._runs_dir(app), run_id))
 
-        return cls(app, run_id)
+        cls.catalog(app).add(cls._catalog_record(app, run_id))
+
+        return cls(app, run_id, budget)
 
     @classmethod
     def list_runs(cls, app):
-        fs.ensure_dir_exists(cls._runs_dir(app))
-        return [cls(app, run_id) for run_id in grep_dir(cls._runs_dir(app), '^[a-zA-Z0-9][a-zA-Z_0-9]*$', isdir=True)]
+        return [cls(app, run_id) for run_id in cls._run_ids(app)]
+
+    @classmethod
+    def catalog(cls, app) -> RunCatalog:
+        """
+        Catalog of runs, which is built from the run directories if missing.
+        """
+        catalog = RunCatalog(cls._runs_dir(app))
+        if not catalog.exists:
+            cls.rebuild_catalog(app)
+
+        return catalog
+
+    @classmethod
+    def rebuild_catalog(cls, app) -> RunCatalog:
+        """
+        Recovers the catalog of runs from the run directories.
+        """
+        catalog = RunCatalog(cls._runs_dir(app))
+        catalog.replace_all([cls._catalog_record(app, run_id) for run_id in cls._run_ids(app)])
+        return catalog
 
 
-    def __init__(self, app, run_id: str):
+    def __init__(self, app, run_id: str, budget: ParallelismBudget = None):
+        """
+        Ctor.
+        :param budget: concurrency limits shared with other runs, unlimited by default
+        """
         self._app = app
         self.run_id = run_id
+        self._budget = budget if budget is not None else ParallelismBudget()
 
-        # install terraform and terraform-inventory
-        TerraformInstaller(storage_path=app.installation_dir).install()
-        TerraformInventoryInstaller(storage_path=app.installation_dir).install()
-
-        self._testcase = TestCase(fs.join(self._dir, 'testcase.yml'), app)
+        self._testcase = TestCase(fs.join(self._dir, 'testcase.yml'), app,
+                                  compiled_cache=fs.join(self._dir, 'testcase.compiled.json'))
         self._meta = yaml_load(fs.join(self._dir, 'meta.yml'))
+        self._log_env = threading.local()
+
+    def deploy(self):
+        """
+        Init, create, dependency and provision, independent stages are run concurrently.
+        """
+        self._check_private_key_permissions()
+
+        with self._lock:
+            StageScheduler() \
+                .add('init', self._init) \
+                .add('create', self._create, requires=['init']) \
+                .add('dependency', self._dependency) \
+                .add('provision', self._provision, requires=['create', 'dependency']) \
+                .run()
 
     def init(self):
         """
         Download plugins and modules for Terraform.
         """
         with self._lock:
-            self._generate_tf_plan()
-
-            sh.Command(self._app.terraform_run_command)(
-                "init", "-backend-config", "path={}".format(self._tf_state_file), self._tf_plan_dir,
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr)
+            self._init()
 
     def plan(self):
         """
         Generate and show an execution plan by Terraform.
         """
-        with self._lock:
-            sh.Command(self._app.terraform_run_command)(
-                "plan", "-input=false", self._tf_plan_dir,
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr)
+        with self._lock, self._capture_logs('plan'), \
+                self._parallelism('plan', 'api', self._tuner.terraform('plan')) as record:
+            run_command(self._app.terraform_run_command,
+                        "plan", "-input=false", "-parallelism={}".format(record['parallelism']), self._tf_plan_dir,
+                        _env=self._make_env())
 
     def create(self):
         """
@@ -97,55 +164,30 @@ class Run:
         self._check_private_key_permissions()
 
         with self._lock:
-            sh.Command(self._app.terraform_run_command)(
-                "apply", "-auto-approve", "-parallelism=51", self._tf_plan_dir,
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr)
+            self._create()
 
     def dependency(self):
         """
         Install Ansible roles from Galaxy or SCM.
         """
         with self._lock:
-            ansible_deps = yaml_load(resource_path('ansible', 'ansible-requirements.yml'))
-
-            ansible_deps.extend(AnsibleBinding(self._app, self._testcase.binding).get_dependencies())
+            self._dependency()
 
-            requirements_file = fs.join(self._dir, 'ansible-requirements.yml')
-            yaml_dump(requirements_file, ansible_deps)
-
-            sh.Command("ansible-galaxy")(
-                "install", "-f", "-r", requirements_file,
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr)
-
-    def provision(self):
+    def provision(self, force: bool = False) -> List[str]:
+        """
+        Provision the hosts which haven't converged yet, all the hosts if forced.
+        :returns: the provisioned hosts, empty if all the hosts have converged already
+        """
         self._check_private_key_permissions()
 
-        extra_vars = {
-            # including blockchain-specific part of the playbook
-            'blockchain_ansible_playbook':
-                fs.join(self._roles_path, AnsibleBinding.BLOCKCHAIN_ROLE_NAME, 'tank', 'playbook.yml'),
-            # saving a report of the important cluster facts
-            '_cluster_ansible_report': self._cluster_report_file,
-            # grafana monitoring login/password
-            'monitoring_user_login': self._app.cloud_settings.monitoring_vars['admin_user'],
-            'monitoring_user_password': self._app.cloud_settings.monitoring_vars['admin_password'],
-        }
-
         with self._lock:
-            sh.Command("ansible-playbook")(
-                "-f", self._app.ansible_config['forks'],
-                "-u", "root",
-                "-i", self._app.terraform_inventory_run_command,
-                "--extra-vars", self._ansible_extra_vars(extra_vars),
-                "--private-key={}".format(self._app.cloud_settings.provider_vars['pvt_key']),
-                resource_path('ansible', 'core.yml'),
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr, _cwd=self._tf_plan_dir)
+            return self._provision(force=force)
 
     def inspect(self):
         with self._lock:
             result = {
                 'meta': self.meta,
-                'testcase': self._testcase.content,
+                'testcase': thaw(self._testcase.content),
             }
 
             if os.path.exists(self._cluster_report_file):
@@ -153,60 +195,202 @@ class Run:
 
         return result
 
-    def bench(self, load_profile: str, tps: int, total_tx: int):
+    def scale(self, counts: Dict[str, int]) -> bool:
+        """
+        Changes instance counts of roles in place.
+
+        Only the changed resources are applied, only the new hosts (and the monitoring) are provisioned,
+        other nodes are left untouched.
+        :param counts: role -> new total count
+        :returns: whether the counts have changed
+        """
+        self._check_private_key_permissions()
+
+        with self._lock:
+            old_instances = self._testcase.instances
+            self._testcase = self._scaled_testcase(counts)
+            new_instances = self._testcase.instances
+
+            # resources of the changed configs
+            changed = []
+            for role, configs in new_instances.items():
+                for index, config in enumerate(configs, 1):
+                    if index > len(old_instances[role]) or old_instances[role][index - 1]['count'] != config['count']:
+                        changed.append('tank-{}-{}'.format(role, index))
+
+            if not changed:
+                return False
+
+            self._init()
+            resources = plan_resources(self._tf_plan_dir)
+            targets = ['{}.{}'.format(resources[name], name) for name in changed]
+
+            state = TerraformState(self._tf_state_file)
+            hosts_before = state.instances()
+            self._create(targets)
+            hosts_after = state.instances()
+
+            self.catalog(self._app).update(self.run_id, total_instances=self._testcase.total_instances)
+
+            added = [host['public_ip'] for address, host in sorted(hosts_after.items()) if address not in hosts_before]
+            monitoring = self._inventory.hosts(MONITORING_GROUP)
+            self._provision(limit=added + monitoring + ['localhost'])
+
+        return True
+
+    def _scaled_testcase(self, counts: Dict[str, int]) -> TestCase:
+        """
+        Saves the run copy of the testcase with the new counts.
+        """
+        testcase_file = fs.join(self._dir, 'testcase.yml')
+        scaled_file = fs.join(self._dir, 'testcase.scaled.yml')
+        try:
+            yaml_dump(scaled_file, self._testcase.scaled_content(counts))
+            scaled = TestCase(scaled_file, self._app)
+
+            # resources are addressed by role and position of a config, so configs may only be appended
+            for role, configs in self._testcase.instances.items():
+                layout = [(c['region'], c['type'], c['packetloss']) for c in configs]
+                scaled_layout = [(c['region'], c['type'], c['packetloss']) for c in scaled.instances[role]]
+                if scaled_layout[:len(layout)] != layout:
+                    raise TankError('Instances of role {} can\'t be scaled in place, the run has to be redeployed'
+                                    .format(role))
+
+            os.replace(scaled_file, testcase_file)
+        finally:
+            if os.path.exists(scaled_file):
+                os.remove(scaled_file)
+
+        return TestCase(testcase_file, self._app, compiled_cache=fs.join(self._dir, 'testcase.compiled.json'))
+
+    @_stage('bench')
+    def bench(self, load_profile: str, tps: int, total_tx: int, weighted: bool = False) -> BenchResults:
+        """
+        Runs the bench, outputs of the nodes are collected and aggregated under a new bench id.
+        :param weighted: divide the load proportionally to the instance types instead of evenly
+        """
         self._check_private_key_permissions()
 
         bench_command = 'bench --common-config=/tool/bench.config.json ' \
                         '--module-config=/tool/blockchain.bench.config.json'
-        if tps is not None:
-            # It's assumed, that every node is capable of running the bench.
-            per_node_tps = max(int(tps / self._testcase.total_instances), 1)
-            bench_command += ' --common.tps {}'.format(per_node_tps)
-
-        if total_tx is not None:
-            # It's assumed, that every node is capable of running the bench.
-            per_node_tx = max(int(total_tx / self._testcase.total_instances), 1)
-            bench_command += ' --common.stopOn.processedTransactions {}'.format(per_node_tx)
 
         # FIXME extract hostnames from inventory, but ignore monitoring
-        ips = [ip for ip, i in self._cluster_report().items() if i['bench_present']]
-        if not ips:
-            raise TankError('There are no nodes capable of running the bench util')
-        host_patterns = ','.join(ips)
+        hosts = dict((ip, i['hostname']) for ip, i in self._cluster_report().items() if i['bench_present'])
+        if weighted:
+            weights = instance_type_weights(hosts, self._testcase.instances)
+        else:
+            weights = dict((ip, 1) for ip in hosts)
+
+        plan = BenchPlan(weights, tps, total_tx)
 
         with self._lock:
             # send the load_profile to the cluster
             extra_vars = {'load_profile_local_file': fs.abspath(load_profile)}
 
-            sh.Command("ansible-playbook")(
-                "-f", self._app.ansible_config['forks'],
-                "-u", "root",
-                "-i", self._app.terraform_inventory_run_command,
-                "--extra-vars", self._ansible_extra_vars(extra_vars),
-                "--private-key={}".format(self._app.cloud_settings.provider_vars['pvt_key']),
-                "-t", "send_load_profile",
-                fs.join(self._roles_path, AnsibleBinding.BLOCKCHAIN_ROLE_NAME, 'tank', 'send_load_profile.yml'),
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr, _cwd=self._tf_plan_dir)
+            with self._parallelism('bench', 'forks', self._tuner.forks()) as record:
+                run_command("ansible-playbook",
+                            "-f", record['parallelism'],
+                            "-u", "root",
+                            *self._inventory_args(),
+                            "--extra-vars", self._ansible_extra_vars(extra_vars),
+                            "--private-key={}".format(self._app.cloud_settings.provider_vars['pvt_key']),
+                            "-t", "send_load_profile",
+                            fs.join(self._roles_path, AnsibleBinding.BLOCKCHAIN_ROLE_NAME, 'tank',
+                                    'send_load_profile.yml'),
+                            _env=self._ansible_env(), _cwd=self._tf_plan_dir)
+
+            results = BenchResults(self._dir, BenchResults.new_id())
+            fs.ensure_dir_exists(results.path)
+            json_dump_atomic(results.plan_file, plan.to_dict())
+
+            # every host gets its own share of the load
+            commands = dict((host, '{} {}'.format(bench_command, plan.host_args(host))) for host in plan.hosts)
+            executor = make_executor(self._app.bench_config['executor'],
+                                     self._app.cloud_settings.provider_vars['pvt_key'],
+                                     on_line=self._bench_output_writer())
 
             # run the bench
-            sh.Command("ansible")(
-                '-f', '150', '-B', '3600', '-P', '10', '-u', 'root',
-                '-i', self._app.terraform_inventory_run_command,
-                '--private-key={}'.format(self._app.cloud_settings.provider_vars['pvt_key']),
-                host_patterns,
-                '-a', bench_command,
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr, _cwd=self._tf_plan_dir)
+            host_results = dict()
+            try:
+                host_results = executor.run(commands)
+            finally:
+                # failed nodes have results too
+                for host_result in host_results.values():
+                    results.save_node_output(host_result.host, host_result.output)
+                results.aggregate(load_profile=fs.abspath(load_profile), tps=tps, total_tx=total_tx,
+                                  weighted=weighted, start_skew=start_skew(host_results))
+
+            failed = sorted(host for host, host_result in host_results.items() if not host_result.ok)
+            if failed:
+                raise TankError('Bench failed on hosts: {}'.format(', '.join(failed)))
+
+        return results
+
+    @staticmethod
+    def _bench_output_writer():
+        writers = dict()
+
+        def write(host: str, line: str):
+            if host not in writers:
+                prefix = current_prefix()
+                writers[host] = PrefixedWriter(host if prefix is None else '{}/{}'.format(prefix, host), sys.stdout)
+            writers[host](line)
+
+        return write
+
+    def bench_sweep(self, load_profile: str, sweep: BenchSweep, weighted: bool = False,
+                    on_level: Callable[[int], None] = None) -> Dict:
+        """
+        Benches the cluster at growing load levels until the knee of the curve, every level is a separate bench.
+
+        The curve and the saturation point are saved into <run dir>/sweep/<sweep id>.json.
+        :param on_level: called with the tps of a level before the level is benched
+        """
+        sweep_id = BenchResults.new_id()
+        sweep_file = fs.join(self._dir, 'sweep', '{}.json'.format(sweep_id))
+        fs.ensure_dir_exists(os.path.dirname(sweep_file))
+
+        def save() -> Dict:
+            data = sweep.to_dict()
+            data.update(sweep_id=sweep_id, load_profile=fs.abspath(load_profile), weighted=weighted)
+            json_dump_atomic(sweep_file, data)
+            return data
+
+        try:
+            for tps in sweep.levels():
+                if on_level is not None:
+                    on_level(tps)
+                results = self.bench(load_profile, tps, sweep.total_tx(tps), weighted=weighted)
+                point = sweep.add(tps, results.summary())
+                if point['saturated'] is not None:
+                    # the saturation point is reported with the curve
+                    break
+        finally:
+            # the curve measured so far is kept anyway
+            data = save()
+
+        return data
+
+    def bench_results(self, bench_id: str = None) -> BenchResults:
+        """
+        Results of the bench with the specified id, the latest bench by default.
+        """
+        if bench_id is None:
+            return BenchResults.latest(self._dir)
+
+        if bench_id not in BenchResults.list_ids(self._dir):
+            raise TankError('Bench {} is not found in run {}'.format(bench_id, self.run_id))
+
+        return BenchResults(self._dir, bench_id)
 
     def destroy(self):
         with self._lock:
-            sh.Command(self._app.terraform_run_command)(
-                "destroy", "-auto-approve", "-parallelism=100",
-                self._tf_plan_dir,
-                _env=self._make_env(), _out=sys.stdout, _err=sys.stderr)
+            self._destroy()
 
             # atomic move before cleanup
             temp_dir = fs.join(self.__class__._runs_dir(self._app), '_{}'.format(self.run_id))
             os.rename(self._dir, temp_dir)
+            self.catalog(self._app).remove(self.run_id)
 
         # cleanup with the lock released
         rmtree(temp_dir)
@@ -220,6 +404,22 @@ class Run:
     def created_at(self) -> datetime:
         return datetime.fromtimestamp(self.meta['created'])
 
+    @property
+    def provisioning_strategy(self) -> str:
+        """
+        Strategy of the provisioning plays: specified by the testcase or the user config.
+        """
+        return self._testcase.provisioning_strategy or self._app.ansible_config['provisioning_strategy']
+
+    @property
+    def cluster_cache(self) -> bool:
+        """
+        Whether the nodes download packages and docker images via the cache on the monitoring node.
+        """
+        if self._testcase.cluster_cache is not None:
+            return self._testcase.cluster_cache
+        return bool(self._app.ansible_config['cluster_cache'])
+
     @property
     def testcase_copy(self) -> TestCase:
         """
@@ -233,12 +433,356 @@ class Run:
         return fs.join(app.user_dir, 'run')
 
     @classmethod
-    def _save_meta(cls, run_dir: str, testcase: TestCase):
-        yaml_dump(fs.join(run_dir, 'meta.yml'), {
+    def _run_ids(cls, app):
+        fs.ensure_dir_exists(cls._runs_dir(app))
+        return sorted(grep_dir(cls._runs_dir(app), '^[a-zA-Z0-9][a-zA-Z_0-9]*$', isdir=True))
+
+    @classmethod
+    def _catalog_record(cls, app, run_id: str) -> Dict:
+        run_dir = fs.join(cls._runs_dir(app), run_id)
+        meta = yaml_load(fs.join(run_dir, 'meta.yml'))
+        testcase = TestCase(fs.join(run_dir, 'testcase.yml'), app,
+                            compiled_cache=fs.join(run_dir, 'testcase.compiled.json'))
+
+        record = {
+            'run_id': run_id,
+            'created': meta['created'],
+            'testcase_filename': meta['testcase_filename'],
+            'setup_id': meta['setup_id'],
+            'binding': testcase.binding,
+            'total_instances': testcase.total_instances,
+            'stage': None,
+            'stages': dict(),
+        }
+
+        cluster_report_file = fs.join(run_dir, 'cluster_ansible_report.json')
+        if os.path.exists(cluster_report_file):
+            record['hosts'] = json_load(cluster_report_file)
+            record['stage'] = 'provision'
+            record['stages']['provision'] = {'status': 'done', 'started': None, 'finished': None}
+
+        return record
+
+    @classmethod
+    def _save_meta(cls, run_dir: str, testcase: TestCase, image: Optional[Dict]):
+        meta = {
             'testcase_filename': fs.abspath(testcase.filename),
             'created': int(time()),
             'setup_id': sha256(uuid4().bytes)[:12],
-        })
+        }
+        if image is not None:
+            # the image is pinned, instances aren't replaced when a new image is baked
+            meta.update(image=image['id'], image_content_hash=image['content_hash'])
+
+        yaml_dump(fs.join(run_dir, 'meta.yml'), meta)
+
+    @_stage('init')
+    def _init(self):
+        changed = self._generate_tf_plan()
+
+        init_args = ["-input=false", "-backend-config", "path={}".format(self._tf_state_file),
+                     *PluginCache(self._app).init_args()]
+        if not changed and os.path.isdir(self._tf_data_dir) \
+                and PlanGenerator.is_initialized(self._tf_plan_dir, init_args):
+            logger.info('Terraform plan of run %s is not changed, skipping terraform init', self.run_id)
+            return
+
+        with self._budget.take(cpu=1):
+            run_command(self._app.terraform_run_command,
+                        "init", *init_args, self._tf_plan_dir,
+                        _env=self._make_env())
+        PlanGenerator.mark_initialized(self._tf_plan_dir, init_args)
+
+    @_stage('create')
+    def _create(self, targets: List[str] = ()):
+        """
+        :param targets: resources to apply, all the resources by default
+        """
+        instances_before = TerraformState(self._tf_state_file).instances()
+        try:
+            self._terraform('create', 'apply', *['-target={}'.format(target) for target in targets])
+        finally:
+            # cached facts never expire, new instances (e.g. recreated ones or reused addresses) are asked again
+            for host in new_hosts(instances_before, TerraformState(self._tf_state_file).instances()):
+                facts_file = fs.join(self._ansible_facts_dir, host)
+                if os.path.exists(facts_file):
+                    os.remove(facts_file)
+
+    @_stage('dependency')
+    def _dependency(self):
+        ansible_deps = yaml_load(resource_path('ansible', 'ansible-requirements.yml'))
+
+        ansible_deps.extend(AnsibleBinding(self._app, self._testcase.binding).get_dependencies())
+
+        requirements_file = fs.join(self._dir, 'ansible-requirements.yml')
+        yaml_dump(requirements_file, ansible_deps)
+
+        with self._budget.take(cpu=1):
+            RoleCache(self._app, ttl=self._app.ansible_config.get('role_cache_ttl', 0)).install(
+                ansible_deps, self._roles_path, self._make_env())
+
+    @_stage('provision')
+    def _provision(self, limit: List[str] = None, force: bool = False) -> List[str]:
+        """
+        :param limit: hosts to provision, the hosts which haven't converged yet by default
+        :param force: provision all the hosts
+        :returns: the provisioned hosts
+        """
+        extra_vars = {
+            # including blockchain-specific part of the playbook
+            'blockchain_ansible_playbook':
+                fs.join(self._roles_path, AnsibleBinding.BLOCKCHAIN_ROLE_NAME, 'tank', 'playbook.yml'),
+            # saving a report of the important cluster facts
+            '_cluster_ansible_report': self._cluster_report_file,
+            # grafana monitoring login/password
+            'monitoring_user_login': self._app.cloud_settings.monitoring_vars['admin_user'],
+            'monitoring_user_password': self._app.cloud_settings.monitoring_vars['admin_password'],
+            # facts are gathered only for the hosts missing in the fact cache
+            'tank_gather_subset': self._app.ansible_config['gather_subset'],
+            # apt proxy and docker registry mirror on the monitoring node
+            'tank_cluster_cache': self.cluster_cache,
+            # the hosts which have got through all the plays are marked here
+            'tank_converged_dir': fs.join(self._dir, 'converged'),
+        }
+        extra_vars = self._ansible_extra_vars(extra_vars)
+
+        inputs_hash = self._provision_inputs_hash(extra_vars)
+        provision_state = ProvisionState(fs.join(self._dir, 'provision_state.json'), fs.join(self._dir, 'converged'))
+        hosts = self._inventory.hosts()
+
+        if limit is None and not force and hosts:
+            pending = provision_state.pending(hosts, inputs_hash)
+            if not pending:
+                logger.info('All the hosts of run %s have been provisioned already', self.run_id)
+                return []
+            if len(pending) < len(hosts):
+                logger.info('Provisioning only the hosts of run %s which haven\'t converged: %s',
+                            self.run_id, ', '.join(pending))
+                limit = pending + ['localhost']
+
+        with self._parallelism('provision', 'forks', self._tuner.forks()) as record:
+            limit_args = []
+            if limit is not None:
+                # plays use facts of all the hosts, the facts of the hosts which aren't provisioned come from the cache,
+                # the provisioned hosts are asked by the playbook if needed
+                uncached = [host for host in hosts
+                            if host not in limit and not os.path.exists(fs.join(self._ansible_facts_dir, host))]
+                if uncached:
+                    run_command("ansible", "all",
+                                "-f", record['parallelism'],
+                                "-u", "root",
+                                *self._inventory_args(),
+                                "--private-key={}".format(self._app.cloud_settings.provider_vars['pvt_key']),
+                                "--limit", ','.join(uncached),
+                                "-m", "setup",
+                                "-a", "gather_subset={}".format(self._app.ansible_config['gather_subset']),
+                                _env=self._ansible_env(), _cwd=self._tf_plan_dir)
+                limit_args = ["--limit", ','.join(limit)]
+
+            provisioned = hosts if limit is None else [host for host in limit if host in hosts]
+            provision_state.prepare()
+            try:
+                with self._progress():
+                    run_command("ansible-playbook",
+                                "-f", record['parallelism'],
+                                "-u", "root",
+                                *self._inventory_args(),
+                                "--extra-vars", extra_vars,
+                                "--private-key={}".format(self._app.cloud_settings.provider_vars['pvt_key']),
+                                *limit_args,
+                                resource_path('ansible', 'core.yml'),
+                                _env=self._ansible_env(), _cwd=self._tf_plan_dir)
+            except Exception:
+                # only the hosts which got through all the plays have converged,
+                # the playbook stops early if all the hosts of a play fail
+                provision_state.record(provisioned, inputs_hash, provision_state.converged_hosts())
+                raise
+
+        provision_state.record(provisioned, inputs_hash)
+        self.catalog(self._app).update(self.run_id, hosts=self._cluster_report())
+        return provisioned
+
+    def _provision_inputs_hash(self, extra_vars: str) -> str:
+        """
+        Hash of everything the provisioning of a host depends on: variables, playbooks and versions of roles.
+        """
+        if not os.path.isdir(self._roles_path):
+            raise TankError('Ansible roles of run {} are not installed, the dependency stage has not finished'
+                            .format(self.run_id))
+
+        # roles are links to the role cache entries, which are specific to role versions
+        roles = ['{} {}'.format(name, os.path.realpath(fs.join(self._roles_path, name)))
+                 for name in sorted(os.listdir(self._roles_path))]
+        with open(resource_path('ansible', 'core.yml'), 'rb') as fh:
+            playbook = fh.read()
+
+        return sha256('\n'.join([extra_vars] + roles).encode() + b'\0' + playbook)
+
+    @_stage('destroy')
+    def _destroy(self):
+        self._terraform('destroy', 'destroy')
+
+    def _terraform(self, stage: str, action: str, *args):
+        """
+        Runs terraform apply or destroy, which is resumed with a lower parallelism if the provider throttles requests.
+        """
+        wanted = self._tuner.terraform(action)
+        retries = int(self._app.terraform_config['rate_limit_retries'])
+
+        for attempt in range(1, retries + 2):
+            watch = RateLimitWatch()
+            with self._parallelism(stage, 'api', wanted, attempt) as record:
+                try:
+                    run_command(self._app.terraform_run_command,
+                                action, "-auto-approve", "-parallelism={}".format(record['parallelism']),
+                                *args, self._tf_plan_dir,
+                                _env=self._make_env(), on_output=watch)
+                    return
+                except StageCancelled:
+                    raise
+                except Exception:
+                    if not watch.detected or attempt > retries:
+                        raise
+                    record['outcome'] = 'rate_limited'
+
+            # resources created or destroyed so far are in the state, terraform proceeds with the rest
+            wanted = ParallelismTuner.backoff(record['parallelism'])
+            delay = ParallelismTuner.backoff_delay(attempt)
+            logger.warning('The provider limits the rate of requests, resuming terraform %s with parallelism %s in %ss',
+                           action, wanted, delay)
+            sleep(delay)
+
+    @contextmanager
+    def _parallelism(self, stage: str, resource: str, wanted: int, attempt: int = 1):
+        """
+        Takes the parallelism from the budget, the parallelism and the outcome are recorded into parallelism.json.
+        :returns: the record, 'parallelism' is the granted value, the outcome may be set by the caller
+        """
+        started = time()
+        with self._budget.take(**{resource: wanted, 'cpu': 1}) as granted:
+            record = {
+                'stage': stage,
+                'resource': resource,
+                'wanted': wanted,
+                'parallelism': granted[resource],
+                'attempt': attempt,
+                'instances': self._tuner.instances,
+                'cpus': self._tuner.cpus,
+                'started': int(started),
+            }
+            try:
+                yield record
+            except StageCancelled:
+                record.setdefault('outcome', 'cancelled')
+                raise
+            except BaseException:
+                record.setdefault('outcome', 'failed')
+                raise
+            else:
+                record.setdefault('outcome', 'done')
+            finally:
+                record['duration'] = round(time() - started, 3)
+                ParallelismLog(fs.join(self._dir, 'parallelism.json')).record(**record)
+
+    @property
+    def _tuner(self) -> ParallelismTuner:
+        # the monitoring instance as well
+        return ParallelismTuner(self._testcase.total_instances + 1, int(self._app.ansible_config['forks']))
+
+    @contextmanager
+    def _stage_transition(self, stage: str):
+        catalog = self.catalog(self._app)
+        catalog.stage_transition(self.run_id, stage, 'running')
+        try:
+            yield
+        except StageCancelled:
+            catalog.stage_transition(self.run_id, stage, 'cancelled')
+            raise
+        except BaseException:
+            catalog.stage_transition(self.run_id, stage, 'failed')
+            raise
+
+        catalog.stage_transition(self.run_id, stage, 'done')
+
+    @contextmanager
+    def _capture_logs(self, stage: str):
+        """
+        Terraform and Ansible logs of the stage are captured into <run dir>/log/<stage>.<tool>.log.gz.
+
+        Stages run in their own threads, so the log paths are stored per thread.
+        """
+        os.makedirs(self._log_dir, exist_ok=True)
+
+        max_bytes = int(self._app.logs_config['max_size']) * 1024 * 1024
+        backups = int(self._app.logs_config['backups'])
+        with LogCapture(self.log_path(stage, 'terraform'), max_bytes, backups) as tf_log, \
+                LogCapture(self.log_path(stage, 'ansible'), max_bytes, backups) as ansible_log:
+            self._log_env.paths = {
+                'TF_LOG_PATH': tf_log,
+                'ANSIBLE_LOG_PATH': ansible_log,
+                'TANK_ANSIBLE_EVENTS': self._events_path(stage),
+            }
+            try:
+                yield
+            finally:
+                self._log_env.paths = None
+
+    @contextmanager
+    def _progress(self):
+        """
+        Reports progress of the Ansible playbook running in the context.
+        """
+        interval = int(self._app.ansible_config['progress_interval'])
+        if not interval:
+            yield
+            return
+
+        out, _ = stage_streams()
+        write = out if callable(out) else functools.partial(print, file=out, flush=True)
+        with ProgressMonitor(self._log_env.paths['TANK_ANSIBLE_EVENTS'], write, interval):
+            yield
+
+    @contextmanager
+    def _measure(self, stage: str):
+        def count_hosts() -> int:
+            return len(self._inventory.hosts()) if os.path.exists(self._tf_state_file) else 0
+
+        with self._timings.measure(stage, count_hosts):
+            yield
+
+    def profile(self, limit: int = 10) -> Dict:
+        """
+        Time spent in the stages of the run, the slowest Ansible tasks and hosts.
+        """
+        def events():
+            names = sorted(os.listdir(self._log_dir)) if os.path.isdir(self._log_dir) else []
+            return read_events(fs.join(self._log_dir, name) for name in names if name.endswith('.ansible.events.jsonl'))
+
+        return {
+            'stages': self._timings.records(),
+            'slowest_tasks': slowest_tasks(events(), limit),
+            'slowest_hosts': slowest_hosts(events(), limit),
+        }
+
+    def _events_path(self, stage: str) -> str:
+        return fs.join(self._log_dir, '{}.ansible.events.jsonl'.format(stage))
+
+    def log_path(self, stage: str, tool: str) -> str:
+        """
+        Captured log of the tool in the stage (without the .gz extension).
+        """
+        return fs.join(self._log_dir, '{}.{}.log'.format(stage, tool))
+
+    def failed_resources_traces(self, stage: str = None) -> Dict[str, List[str]]:
+        """
+        Traces of the failed resources found in the Terraform logs of the stage (of all the stages by default).
+        """
+        stages = [stage] if stage is not None else ['init', 'create', 'destroy', 'plan']
+        traces = dict()
+        for name in stages:
+            traces.update(TerraformTrace(read_log(self.log_path(name, 'terraform'))).failed_traces())
+
+        return traces
 
     def _ansible_extra_vars(self, extra: Dict = None) -> str:
         a_vars = dict(('bc_{}'.format(k), str(v)) for k, v in self._app.cloud_settings.ansible_vars.items())
@@ -250,12 +794,18 @@ class Run:
         return json.dumps(a_vars, sort_keys=True)
 
     def _make_env(self) -> Dict:
-        fs.ensure_dir_exists(self._tf_data_dir)
-        fs.ensure_dir_exists(self._log_dir)
+        # stages may run concurrently
+        os.makedirs(self._tf_data_dir, exist_ok=True)
+        os.makedirs(self._log_dir, exist_ok=True)
 
         env = self._app.app_env
 
-        env["TF_LOG_PATH"] = fs.join(self._log_dir, 'terraform.log')
+        log_paths = getattr(self._log_env, 'paths', None)
+        if log_paths is not None:
+            env.update(log_paths)
+        else:
+            # logs are captured only within stages
+            env.pop("TF_LOG", None)
         env["TF_DATA_DIR"] = self._tf_data_dir
         env["TF_VAR_state_path"] = self._tf_state_file
         env["TF_VAR_blockchain_name"] = self._testcase.binding.replace('_', '-')[:10]
@@ -266,16 +816,37 @@ class Run:
             env["TF_VAR_{}".format(k)] = v
 
         env["ANSIBLE_ROLES_PATH"] = self._roles_path
+        # facts of the hosts are available to the plays limited to some of the hosts
+        env["ANSIBLE_CACHE_PLUGIN"] = "jsonfile"
+        env["ANSIBLE_CACHE_PLUGIN_CONNECTION"] = self._ansible_facts_dir
+        env["ANSIBLE_CACHE_PLUGIN_TIMEOUT"] = "0"
         env["ANSIBLE_CONFIG"] = resource_path('ansible', 'ansible.cfg')
-        env["ANSIBLE_LOG_PATH"] = fs.join(self._log_dir, 'ansible.log')
+        # per-task timings, see <run dir>/log/<stage>.ansible.events.jsonl
+        env["ANSIBLE_CALLBACK_PLUGINS"] = resource_path('ansible', 'callback_plugins')
+        env["ANSIBLE_CALLBACK_WHITELIST"] = "tank_events"
+
+        return env
 
+    def _ansible_env(self) -> Dict:
+        """
+        Environment of the Ansible commands: the bundled config with the provisioning strategy of the run.
+        The config is generated here, so terraform commands don't depend on the strategy (e.g. on mitogen).
+        """
+        env = self._make_env()
+        write_ansible_config(self._ansible_config_file, resource_path('ansible', 'ansible.cfg'),
+                             self.provisioning_strategy)
+        env["ANSIBLE_CONFIG"] = self._ansible_config_file
         return env
 
-    def _generate_tf_plan(self):
+    def _inventory_args(self) -> List[str]:
+        return ["-i", self._inventory.path]
+
+    def _generate_tf_plan(self) -> bool:
         """
         Generation of Terraform manifests specific for this run and user preferences.
+        :returns: whether the manifests have been changed
         """
-        PlanGenerator(self._app, self._testcase).generate(self._tf_plan_dir)
+        return PlanGenerator(self._app, self._testcase, self._image).generate(self._tf_plan_dir)
 
     def _cluster_report(self):
         return json_load(self._cluster_report_file)
@@ -298,7 +869,9 @@ class Run:
         return fs.join(self.__class__._runs_dir(self._app), self.run_id)
 
     @property
-    def _lock(self) -> FileLock:
+    def _lock(self):
+        from filelock import FileLock
+
         return FileLock(fs.join(self._dir, '.lock'))
 
     @property
@@ -309,10 +882,44 @@ class Run:
     def _tf_plan_dir(self) -> str:
         return fs.join(self._dir, 'tf_plan')
 
+    @property
+    def _ansible_config_file(self) -> str:
+        return fs.join(self._dir, 'ansible.cfg')
+
+    @property
+    def _ansible_facts_dir(self) -> str:
+        return fs.join(self._dir, 'ansible_facts')
+
     @property
     def _tf_state_file(self) -> str:
         return fs.join(self._dir, "blockchain.tfstate")
 
+    @property
+    def _inventory(self) -> StateInventory:
+        return StateInventory(self._tf_state_file, fs.join(self._dir, 'inventory.json'), self._testcase.instances,
+                              self._baked_image)
+
+    @property
+    def _image(self) -> Optional[str]:
+        """
+        Golden image the instances of the run boot from, if any.
+        """
+        return self._meta.get('image')
+
+    @property
+    def _baked_image(self) -> Optional[str]:
+        """
+        The image of the run if its base layer is up to date, hosts booted from it skip the base playbook.
+        """
+        if self._image is None \
+                or self._meta['image_content_hash'] != image_content_hash(self._app, self._testcase.binding):
+            return None
+        return self._image
+
+    @property
+    def _timings(self) -> StageTimings:
+        return StageTimings(fs.join(self._dir, 'timings.jsonl'))
+
     @property
     def _log_dir(self) -> str:
         return fs.join(self._dir, 'log')
@@ -0,0 +1,286 @@
+#
+#   module tank.core.stages
+#
+# Concurrent execution of Run stages according to their dependency graph.
+#
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import time, sleep as _sleep
+from typing import Callable, Dict, Iterable, List, Optional
+
+from tank.core.exc import TankError
+
+
+class StageCancelled(TankError):
+    """
+    Raised inside a stage which was cancelled because of a failure of a sibling stage.
+    """
+    pass
+
+
+class PrefixedWriter:
+    """
+    Line-oriented output sink which prepends a prefix to every line.
+
+    Writers share a single lock, so lines of concurrently running stages are interleaved, but never mixed.
+    """
+
+    _output_lock = threading.Lock()
+
+    def __init__(self, prefix: str, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def __call__(self, line):
+        if isinstance(line, bytes):
+            line = line.decode(errors='replace')
+
+        with self.__class__._output_lock:
+            self._stream.write('[{}] {}'.format(self._prefix, line if line.endswith('\n') else line + '\n'))
+            self._stream.flush()
+
+
+class _StageContext:
+    """
+    Per-thread state of a running stage: its output sinks and processes started by it.
+    """
+
+    def __init__(self, prefix: Optional[str], cancelled: threading.Event):
+        self.prefix = prefix
+        self.cancelled = cancelled
+        self.processes = []
+        self._lock = threading.Lock()
+
+    def register(self, process):
+        with self._lock:
+            if self.cancelled.is_set():
+                process.terminate()
+            self.processes.append(process)
+
+    def unregister(self, process):
+        with self._lock:
+            self.processes.remove(process)
+
+    def terminate(self):
+        with self._lock:
+            for process in self.processes:
+                try:
+                    process.terminate()
+                except OSError:
+                    # already exited
+                    pass
+
+
+_local = threading.local()
+
+
+def _current_context() -> Optional[_StageContext]:
+    return getattr(_local, 'context', None)
+
+
+def current_prefix() -> Optional[str]:
+    """
+    Output prefix of the current thread, None outside of any stage.
+    """
+    context = _current_context()
+    return None if context is None else context.prefix
+
+
+def check_cancelled():
+    """
+    Raises StageCancelled if the stage of the current thread has been cancelled.
+    """
+    context = _current_context()
+    if context is not None and context.cancelled.is_set():
+        raise StageCancelled('Stage {} is cancelled'.format(context.prefix))
+
+
+def sleep(seconds: float):
+    """
+    Sleeps, but raises StageCancelled as soon as the stage of the current thread is cancelled.
+    """
+    deadline = time() + seconds
+    while time() < deadline:
+        check_cancelled()
+        _sleep(min(0.5, max(0, deadline - time())))
+    check_cancelled()
+
+
+@contextmanager
+def stage_context(prefix: str, cancelled: threading.Event):
+    """
+    Runs the code of the current thread as a stage: the output is prefixed, the processes are terminated on cancel.
+    :returns: the context, its terminate() terminates the processes of the stage
+    """
+    parent_prefix = current_prefix()
+    context = _StageContext(prefix if parent_prefix is None else '{}/{}'.format(parent_prefix, prefix), cancelled)
+    previous, _local.context = _current_context(), context
+    try:
+        yield context
+    finally:
+        _local.context = previous
+
+
+def stage_streams():
+    """
+    Provides stdout and stderr sinks suitable for the current thread.
+    """
+    prefix = current_prefix()
+    if prefix is None:
+        return sys.stdout, sys.stderr
+
+    return PrefixedWriter(prefix, sys.stdout), PrefixedWriter(prefix, sys.stderr)
+
+
+def _tee(sink, on_output: Callable):
+    def write(line):
+        on_output(line)
+        if callable(sink):
+            sink(line)
+        else:
+            sink.write(line if isinstance(line, str) else line.decode(errors='replace'))
+            sink.flush()
+
+    return write
+
+
+def run_command(command: str, *args, on_output: Callable = None, **kwargs):
+    """
+    Runs an external command with the output routed to the current stage.
+
+    The process can be terminated if the stage gets cancelled.
+    :param on_output: also gets every line of the output
+    """
+    import sh
+
+    check_cancelled()
+
+    context = _current_context()
+    out, err = stage_streams()
+    if on_output is not None:
+        out, err = _tee(out, on_output), _tee(err, on_output)
+    process = sh.Command(command)(*args, _out=out, _err=err, _bg=True, _bg_exc=False, **kwargs)
+
+    if context is None:
+        return process.wait()
+
+    context.register(process)
+    try:
+        return process.wait()
+    except (sh.ErrorReturnCode, sh.SignalException):
+        if context.cancelled.is_set():
+            raise StageCancelled('Stage {} is cancelled'.format(context.prefix))
+        raise
+    finally:
+        context.unregister(process)
+
+
+class Stage:
+    """
+    Named unit of work with dependencies on other stages.
+    """
+
+    def __init__(self, name: str, func: Callable, requires: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+
+class StageScheduler:
+    """
+    Runs stages concurrently as soon as all of their requirements are satisfied.
+
+    If a stage fails, the stages running at the moment are cancelled (their processes are terminated),
+    the stages not started yet are skipped and the first error is raised.
+    """
+
+    _POLL_INTERVAL = 0.5
+
+    def __init__(self):
+        self._stages: Dict[str, Stage] = OrderedDict()
+
+    def add(self, name: str, func: Callable, requires: Iterable[str] = ()):
+        """
+        Declares a stage. Requirements must be declared beforehand, which makes cycles impossible.
+        """
+        if name in self._stages:
+            raise TankError('Stage {} is already declared'.format(name))
+
+        stage = Stage(name, func, requires)
+        for requirement in stage.requires:
+            if requirement not in self._stages:
+                raise TankError('Stage {} requires unknown stage {}'.format(name, requirement))
+
+        self._stages[name] = stage
+        return self
+
+    def run(self):
+        done = set()
+        errors: List[BaseException] = []
+        running: Dict[str, threading.Thread] = OrderedDict()
+        contexts: Dict[str, _StageContext] = dict()
+        cancelled = threading.Event()
+        finished = threading.Condition()
+        parent = _current_context()
+        parent_prefix = current_prefix()
+
+        def worker(stage: Stage, context: _StageContext):
+            _local.context = context
+            try:
+                stage.func()
+            except StageCancelled:
+                pass
+            except BaseException as e:
+                with finished:
+                    errors.append(e)
+                self._cancel(cancelled, contexts)
+            finally:
+                _local.context = None
+                with finished:
+                    if not cancelled.is_set():
+                        done.add(stage.name)
+                    running.pop(stage.name)
+                    finished.notify_all()
+
+        def start_ready():
+            for stage in self._stages.values():
+                if stage.name in done or stage.name in running:
+                    continue
+                if not all(r in done for r in stage.requires):
+                    continue
+
+                prefix = stage.name if parent_prefix is None else '{}/{}'.format(parent_prefix, stage.name)
+                contexts[stage.name] = _StageContext(prefix, cancelled)
+                thread = threading.Thread(target=worker, args=(stage, contexts[stage.name]),
+                                          name='stage-{}'.format(stage.name), daemon=True)
+                running[stage.name] = thread
+                thread.start()
+
+        try:
+            with finished:
+                start_ready()
+                while running:
+                    finished.wait(self._POLL_INTERVAL)
+                    if parent is not None and parent.cancelled.is_set() and not cancelled.is_set():
+                        # the scheduler itself runs in a cancelled stage
+                        self._cancel(cancelled, contexts)
+                    if not cancelled.is_set():
+                        start_ready()
+        except BaseException:
+            # e.g. KeyboardInterrupt or cement's CaughtSignal in the main thread
+            self._cancel(cancelled, contexts)
+            for thread in list(running.values()):
+                thread.join()
+            raise
+
+        if errors:
+            raise errors[0]
+        check_cancelled()
+
+    @staticmethod
+    def _cancel(cancelled: threading.Event, contexts: Dict[str, _StageContext]):
+        cancelled.set()
+        for context in list(contexts.values()):
+            context.terminate()
@@ -0,0 +1,116 @@
+#
+#   module tank.core.sweep
+#
+# Series of benches with growing load and detection of the saturation point.
+#
+from typing import Dict, List, Optional
+
+from tank.core.exc import TankError
+
+
+class BenchSweep:
+    """
+    Load levels of a sweep and the curve of the achieved throughput and latency.
+
+    The knee is the first level where the cluster stops keeping up with the load:
+    the achieved TPS falls below min_efficiency of the offered TPS, p95 latency grows more than
+    max_latency_growth times compared to the first level, or the error rate exceeds max_error_rate.
+    The saturation point is the last level before the knee.
+    """
+
+    def __init__(self, tps_from: int, tps_to: int, step: int, hold: int,
+                 min_efficiency: float = 0.9, max_latency_growth: float = 3.0, max_error_rate: float = 0.05):
+        """
+        Ctor.
+        :param hold: how long every level lasts, s
+        """
+        if tps_from < 1 or tps_to < tps_from or step < 1:
+            raise TankError('Invalid load levels: from {} to {} with step {}'.format(tps_from, tps_to, step))
+        if hold < 1:
+            raise TankError('Hold time must be positive')
+
+        self.tps_from = tps_from
+        self.tps_to = tps_to
+        self.step = step
+        self.hold = hold
+        self.min_efficiency = min_efficiency
+        self.max_latency_growth = max_latency_growth
+        self.max_error_rate = max_error_rate
+        self.points = []
+
+    def levels(self) -> List[int]:
+        return list(range(self.tps_from, self.tps_to + 1, self.step))
+
+    def total_tx(self, tps: int) -> int:
+        """
+        Transactions sent at a level, the bench stops once they are processed.
+        """
+        return tps * self.hold
+
+    def add(self, tps: int, summary: Dict) -> Dict:
+        """
+        Adds a point of the curve from a bench summary.
+        """
+        point = {
+            'offered_tps': tps,
+            'achieved_tps': summary['tps_mean'],
+            'efficiency': summary['tps_mean'] / tps if summary['tps_mean'] is not None else None,
+            'latency_p50': summary['latency_p50'],
+            'latency_p95': summary['latency_p95'],
+            'latency_p99': summary['latency_p99'],
+            'error_rate': summary['error_rate'],
+            'bench_id': summary['bench_id'],
+        }
+        point['saturated'] = self._saturation_reason(point)
+        self.points.append(point)
+        return point
+
+    @property
+    def knee(self) -> Optional[Dict]:
+        for point in self.points:
+            if point['saturated'] is not None:
+                return point
+        return None
+
+    @property
+    def saturation_point(self) -> Optional[Dict]:
+        """
+        The last level the cluster keeps up with, None if the knee is at the first level or isn't found.
+        """
+        knee = self.knee
+        if knee is None:
+            return None
+
+        index = self.points.index(knee)
+        return self.points[index - 1] if index > 0 else None
+
+    def to_dict(self) -> Dict:
+        knee = self.knee
+        saturation = self.saturation_point
+        return {
+            'levels': {'from': self.tps_from, 'to': self.tps_to, 'step': self.step, 'hold': self.hold},
+            'thresholds': {
+                'min_efficiency': self.min_efficiency,
+                'max_latency_growth': self.max_latency_growth,
+                'max_error_rate': self.max_error_rate,
+            },
+            'curve': self.points,
+            'knee_tps': None if knee is None else knee['offered_tps'],
+            'knee_reason': None if knee is None else knee['saturated'],
+            'saturation_tps': None if saturation is None else saturation['offered_tps'],
+            'saturation_achieved_tps': None if saturation is None else saturation['achieved_tps'],
+        }
+
+    def _saturation_reason(self, point: Dict) -> Optional[str]:
+        if point['achieved_tps'] is None or point['efficiency'] < self.min_efficiency:
+            return 'throughput'
+
+        if point['error_rate'] > self.max_error_rate:
+            return 'errors'
+
+        baseline = next((p['latency_p95'] for p in self.points if p['latency_p95'] is not None), None)
+        if baseline is not None and point['latency_p95'] is not None \
+                and point['latency_p95'] > baseline * self.max_latency_growth:
+            return 'latency'
+
+        return None
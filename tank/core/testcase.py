@@ -1,15 +1,18 @@
 #
 #   module tank.core.testcase
 #
+import os
 import copy
-from typing import List
+import functools
+from typing import Dict, List, Optional
 
-from jsonschema import Draft4Validator, ValidationError
+import yaml
 
 from tank.core import resource_path
 from tank.core.exc import TankTestCaseError
 from tank.core.regions import RegionsConfig
-from tank.core.utils import yaml_load, yaml_dump, ratio_from_percent, split_evenly
+from tank.core.utils import yaml_load, yaml_dump, json_load, json_dump_atomic, ratio_from_percent, split_evenly, \
+    sha256, freeze
 
 
 class InstancesCanonizer(object):
@@ -202,10 +205,20 @@ class TestCaseValidator(object):
         self._check_reserved_names()
         self._check_counts_equality()
 
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def schema_validator(cls):
+        """Validator is built once per process."""
+        from jsonschema import Draft4Validator
+
+        return Draft4Validator(yaml_load(cls.SCHEMA_FILE))
+
     def _validate_schema(self):
         """Validate via JSON schema."""
+        from jsonschema import ValidationError
+
         try:
-            Draft4Validator(yaml_load(self.SCHEMA_FILE)).validate(self._content)
+            self.schema_validator().validate(self._content)
         except ValidationError as e:
             raise TankTestCaseError('Failed to validate testcase {}'.format(self._filename), e)
 
@@ -237,17 +250,45 @@ class TestCaseValidator(object):
 
 
 class TestCase(object):
-    """Entity describing single test performed by Tank."""
+    """Entity describing single test performed by Tank.
+
+    Content is immutable once loaded. Parsed, validated and converted content can be cached in a file,
+    the cache is keyed by a hash of the testcase, the schema, the regions config and the provider.
+    """
 
-    def __init__(self, filename, app):
+    def __init__(self, filename, app, compiled_cache: str = None):
         """Load content."""
         self._app = app
         self._filename = filename
-        self._original_content = yaml_load(filename)
 
-        self._content = copy.deepcopy(self._original_content)
-        TestCaseValidator(self._content, filename).validate()
-        self._content = self._prepare_content()
+        with open(filename, 'rb') as fh:
+            raw_content = fh.read()
+
+        compiled = None
+        if compiled_cache is not None:
+            key = self._compiled_key(raw_content)
+            compiled = self._load_compiled(compiled_cache, key)
+
+        if compiled is None:
+            self._original_content = yaml.safe_load(raw_content)
+
+            content = copy.deepcopy(self._original_content)
+            TestCaseValidator(content, filename).validate()
+            self._content = self._prepare_content(content)
+
+            if compiled_cache is not None:
+                json_dump_atomic(compiled_cache, {
+                    'key': key,
+                    'original_content': self._original_content,
+                    'content': self._content,
+                })
+        else:
+            self._original_content = compiled['original_content']
+            self._content = compiled['content']
+
+        self._frozen_content = freeze(self._content)
+        self._total_instances = sum(item['count'] for config in self._content['instances'].values()
+                                    for item in config)
 
     @property
     def filename(self) -> str:
@@ -259,42 +300,122 @@ class TestCase(object):
         return self._content['binding']
 
     @property
-    def instances(self) -> dict:
-        """Return copy of instances."""
-        return copy.deepcopy(self._content['instances'])
+    def instances(self):
+        """Return read-only view of instances."""
+        return self._frozen_content['instances']
 
     @property
     def total_instances(self) -> int:
-        """Calculate amount of all instances.
+        """Amount of all instances, calculated after instances config canonization and converting."""
+        return self._total_instances
 
-        It works only after instances config canonization and converting.
-        """
-        instances_amount = 0
-        for config in self._content['instances'].values():
-            for item in config:
-                instances_amount += item['count']
+    @property
+    def ansible(self):
+        """Return read-only view of ansible config."""
+        return self._frozen_content['ansible']
 
-        return instances_amount
+    @property
+    def provisioning_strategy(self) -> Optional[str]:
+        """Strategy of the provisioning plays, None if the testcase doesn't specify it."""
+        return self._content.get('provisioning_strategy')
 
     @property
-    def ansible(self) -> dict:
-        """Return copy of ansible config."""
-        return copy.deepcopy(self._content['ansible'])
+    def cluster_cache(self) -> Optional[bool]:
+        """Whether the cluster caches packages and images on the monitoring node, None if not specified."""
+        return self._content.get('cluster_cache')
 
     @property
-    def content(self) -> dict:
-        """Return copy of all content."""
-        return copy.deepcopy(self._content)
+    def content(self):
+        """Return read-only view of all content, see utils.thaw for a mutable copy."""
+        return self._frozen_content
 
     def save(self, filename):
         """Save original content to file."""
         yaml_dump(filename, self._original_content)
 
-    def _prepare_content(self):
+    def scaled_content(self, counts: Dict[str, int]) -> dict:
+        """Return copy of original content with new total counts of the roles.
+
+        Counts of regions are changed proportionally, regions never shrink when a role grows and vice versa.
+        """
+        content = copy.deepcopy(self._original_content)
+        instances = content['instances']
+
+        for role, count in counts.items():
+            if role in InstancesCanonizer._GENERAL_OPTIONS or role not in instances:
+                raise TankTestCaseError('There is no instance role {} in the testcase'.format(role))
+
+            config = instances[role]
+            if isinstance(config, int):
+                instances[role] = count
+            elif 'regions' in config:
+                regions = list(config['regions'])
+                region_counts = [config['regions'][r] if isinstance(config['regions'][r], int)
+                                 else config['regions'][r]['count'] for r in regions]
+
+                for region, region_count in zip(regions, _rescale(region_counts, count)):
+                    if isinstance(config['regions'][region], int):
+                        config['regions'][region] = region_count
+                    else:
+                        config['regions'][region]['count'] = region_count
+
+                if 'count' in config:
+                    config['count'] = count
+            else:
+                config['count'] = count
+
+        return content
+
+    def _prepare_content(self, content: dict):
         """Convert to canonized config."""
         result = dict()
-        canonized_instances = InstancesCanonizer(self._content['instances']).canonize()
+        canonized_instances = InstancesCanonizer(content['instances']).canonize()
         result['instances'] = RegionsConverter(self._app).convert(canonized_instances)
-        result['binding'] = self._content['binding']
-        result['ansible'] = self._content.get('ansible', dict())
+        result['binding'] = content['binding']
+        result['ansible'] = content.get('ansible', dict())
+        result['provisioning_strategy'] = content.get('provisioning_strategy')
+        result['cluster_cache'] = content.get('cluster_cache')
         return result
+
+    def _compiled_key(self, raw_content: bytes) -> str:
+        return sha256(b'\0'.join([
+            raw_content,
+            _file_content(TestCaseValidator.SCHEMA_FILE),
+            _file_content(RegionsConfig.config_file(self._app)),
+            str(self._app.provider).encode(),
+        ]))
+
+    @staticmethod
+    def _load_compiled(compiled_cache: str, key: str):
+        if not os.path.exists(compiled_cache):
+            return None
+
+        try:
+            compiled = json_load(compiled_cache)
+        except ValueError:
+            return None
+
+        return compiled if compiled.get('key') == key else None
+
+
+def _rescale(counts: List[int], total: int) -> List[int]:
+    """Change counts proportionally so that they sum up to total, the remainder goes to the first counts."""
+    delta = total - sum(counts)
+    if not delta:
+        return list(counts)
+
+    weights = counts if sum(counts) else [1] * len(counts)
+    quotas = [abs(delta) * weight / sum(weights) for weight in weights]
+    shares = [int(quota) for quota in quotas]
+
+    by_fraction = sorted(range(len(counts)), key=lambda i: (-(quotas[i] - shares[i]), i))
+    for i in by_fraction[:abs(delta) - sum(shares)]:
+        shares[i] += 1
+
+    sign = 1 if delta > 0 else -1
+    return [count + sign * share for count, share in zip(counts, shares)]
+
+
+def _file_content(filename: str) -> bytes:
+    with open(filename, 'rb') as fh:
+        return fh.read()
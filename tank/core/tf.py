@@ -4,13 +4,25 @@
 # Terraform-related code.
 #
 
+import os
+import re
+import json
+import platform
 from os.path import dirname, isdir
+from typing import Dict, List
 
 from cement.utils import fs
 
 from tank.core import resource_path
 from tank.core.exc import TankError, TankTestCaseError
 from tank.core.testcase import TestCase
+from tank.core.utils import sha256, json_load, json_dump_atomic
+from tank.version import VERSION
+
+
+def _file_sha256(filename: str) -> str:
+    with open(filename, 'rb') as fh:
+        return sha256(fh.read())
 
 
 class PlanGenerator:
@@ -18,16 +30,93 @@ class PlanGenerator:
     Generates a Terraform plan for the run based on the testcase and the user settings.
     """
 
-    def __init__(self, app, testcase: TestCase):
+    def __init__(self, app, testcase: TestCase, image: str = None):
+        """
+        Ctor.
+        :param image: id of the golden image the instances boot from, the provider base image by default
+        """
         self._app = app
         self.testcase = testcase
+        self.image = image
 
         if not isdir(self._provider_templates):
             raise TankError('Failed to find Terraform templates for cloud provider {} at {}'.format(
                 self._app.cloud_settings.provider.value, self._provider_templates
             ))
 
-    def generate(self, plan_dir: str):
+    MANIFEST_FILE = '.tank-plan.json'
+
+    def generate(self, plan_dir: str) -> bool:
+        """
+        Renders the plan and writes only the files which differ from the ones in plan_dir,
+        so the files are touched only if their content changes.
+        :returns: whether the plan has been changed
+        """
+        fs.ensure_dir_exists(plan_dir)
+
+        manifest = self._load_manifest(plan_dir)
+        rendered = self._render(self._data())
+
+        changed = False
+        for filename, content in rendered.items():
+            path = fs.join(plan_dir, filename)
+            if os.path.isfile(path) and _file_sha256(path) == sha256(content.encode()):
+                continue
+
+            with open(path, 'w') as fh:
+                fh.write(content)
+            changed = True
+
+        # files of the previous generation which are not generated anymore
+        for filename in manifest.get('files', ()):
+            if filename not in rendered and os.path.exists(fs.join(plan_dir, filename)):
+                os.remove(fs.join(plan_dir, filename))
+                changed = True
+
+        inputs = self.inputs()
+        if changed or manifest.get('inputs') != inputs:
+            manifest = {'inputs': inputs, 'files': sorted(rendered), 'init_args': None}
+            json_dump_atomic(fs.join(plan_dir, self.MANIFEST_FILE), manifest)
+
+        return changed
+
+    def inputs(self) -> dict:
+        """
+        Everything the plan is generated from: the testcase, the provider, the templates and Tank version.
+        """
+        templates = sha256('\n'.join(
+            '{} {}'.format(filename, _file_sha256(fs.join(self._provider_templates, filename)))
+            for filename in self._template_files()).encode())
+
+        return {
+            'testcase': sha256(json.dumps(self._data(), sort_keys=True, default=dict).encode()),
+            'provider': self._app.cloud_settings.provider.value,
+            'templates': templates,
+            'version': '.'.join(str(part) for part in VERSION),
+        }
+
+    @classmethod
+    def is_initialized(cls, plan_dir: str, init_args: List[str]) -> bool:
+        """
+        Whether `terraform init` succeeded with the same arguments since the plan had been changed.
+        """
+        return cls._load_manifest(plan_dir).get('init_args') == list(init_args)
+
+    @classmethod
+    def mark_initialized(cls, plan_dir: str, init_args: List[str]):
+        manifest = cls._load_manifest(plan_dir)
+        manifest['init_args'] = list(init_args)
+        json_dump_atomic(fs.join(plan_dir, cls.MANIFEST_FILE), manifest)
+
+    @classmethod
+    def _load_manifest(cls, plan_dir: str) -> dict:
+        manifest_file = fs.join(plan_dir, cls.MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            return dict()
+
+        return json_load(manifest_file)
+
+    def _data(self) -> dict:
         if self.testcase.total_instances <= 10:
             monitoring_machine_type = 'small'
         elif self.testcase.total_instances < 50:
@@ -35,12 +124,151 @@ class PlanGenerator:
         else:
             monitoring_machine_type = 'large'
 
-        self._app.template.copy(self._provider_templates, plan_dir, {
+        return {
             'instances': self.testcase.instances,
             'monitoring_machine_type': monitoring_machine_type,
-        })
+            'image': self.image,
+        }
+
+    def _template_files(self) -> List[str]:
+        return [filename for filename in sorted(os.listdir(self._provider_templates))
+                if os.path.isfile(fs.join(self._provider_templates, filename))]
+
+    def _render(self, data: dict) -> dict:
+        """
+        Renders provider templates, jinja2 is loaded only when needed.
+        """
+        import jinja2
 
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(self._provider_templates),
+                                 keep_trailing_newline=True)
+
+        return dict((filename, env.get_template(filename).render(**data)) for filename in self._template_files())
+
+    @staticmethod
+    def templates_dir(app) -> str:
+        return resource_path('providers', app.cloud_settings.provider.value)
 
     @property
     def _provider_templates(self) -> str:
-        return resource_path('providers', self._app.cloud_settings.provider.value)
+        return self.templates_dir(self._app)
+
+
+class PluginCache:
+    """
+    Terraform provider plugins shared by all runs.
+
+    Terraform itself maintains the store (see TF_PLUGIN_CACHE_DIR): a plugin is downloaded only once per
+    name, version and platform, runs get symlinks to the store instead of copies.
+    The store can also be populated offline by placing plugin binaries under the platform subdirectory.
+    """
+
+    def __init__(self, app):
+        self._app = app
+        self.path = app.terraform_plugin_cache_dir
+
+    @staticmethod
+    def platform() -> str:
+        """
+        Platform key in Terraform notation, e.g. linux_amd64.
+        """
+        arch = {'x86_64': 'amd64', 'i386': '386', 'i686': '386', 'aarch64': 'arm64'}.get(
+            platform.machine().lower(), platform.machine().lower())
+        return '{}_{}'.format(platform.system().lower(), arch)
+
+    def init_args(self) -> List[str]:
+        """
+        Additional `terraform init` arguments.
+
+        If offline plugin directories are configured, plugins are looked up there and never downloaded.
+        """
+        args = []
+        for plugin_dir in self._app.terraform_config.get('plugin_dirs') or []:
+            plugin_dir = fs.abspath(plugin_dir)
+            args.extend(['-plugin-dir', plugin_dir, '-plugin-dir', fs.join(plugin_dir, self.platform())])
+
+        return args
+
+
+class TerraformState:
+    """
+    Read-only view of the Terraform state of a run (state format of Terraform 0.11).
+    """
+
+    # resource type -> (public ip attribute, private ip attribute)
+    _IP_ATTRIBUTES = {
+        'digitalocean_droplet': ('ipv4_address', 'ipv4_address_private'),
+        'google_compute_instance': ('network_interface.0.access_config.0.nat_ip', 'network_interface.0.network_ip'),
+    }
+
+    # hosts of the same private network reach each other by the private addresses:
+    # DigitalOcean private networks are per datacenter, the GCE network spans all the regions
+    _PRIVATE_NETWORK_ATTRIBUTES = {
+        'digitalocean_droplet': 'region',
+        'google_compute_instance': 'network_interface.0.network',
+    }
+
+    _KEY_RE = re.compile(r'^(?P<resource>[^.]+\.[^.]+)(?:\.(?P<index>\d+))?$')
+
+    def __init__(self, state_file: str):
+        self._state_file = state_file
+
+    def instances(self) -> Dict[str, dict]:
+        """
+        Machines known to the state: address (e.g. digitalocean_droplet.tank-boot-1[0]) -> instance info.
+        """
+        result = dict()
+        for key, resource in self._root_module().get('resources', dict()).items():
+            match = self._KEY_RE.match(key)
+            if match is None or resource.get('type') not in self._IP_ATTRIBUTES:
+                continue
+
+            attributes = resource.get('primary', dict()).get('attributes', dict())
+            public_ip, private_ip = self._IP_ATTRIBUTES[resource['type']]
+            index = int(match.group('index') or 0)
+
+            result['{}[{}]'.format(match.group('resource'), index)] = {
+                'resource': match.group('resource'),
+                'index': index,
+                'name': attributes.get('name'),
+                'public_ip': attributes.get(public_ip),
+                'private_ip': attributes.get(private_ip),
+                'private_network': '{}/{}'.format(
+                    resource['type'], attributes.get(self._PRIVATE_NETWORK_ATTRIBUTES[resource['type']], 'default')),
+                'attributes': attributes,
+            }
+
+        return result
+
+    def outputs(self) -> Dict[str, object]:
+        """
+        Values of the outputs, the same as `terraform output -json` reports.
+        """
+        return dict((name, output.get('value'))
+                    for name, output in self._root_module().get('outputs', dict()).items())
+
+    def _root_module(self) -> Dict:
+        if not os.path.exists(self._state_file):
+            return dict()
+
+        for module in json_load(self._state_file).get('modules', ()):
+            if module.get('path') == ['root']:
+                return module
+
+        return dict()
+
+
+def plan_resources(plan_dir: str) -> Dict[str, str]:
+    """
+    Resources declared in a generated plan: name -> type.
+    """
+    resource_re = re.compile(r'^\s*resource\s+"([^"]+)"\s+"([^"]+)"', re.MULTILINE)
+
+    result = dict()
+    for filename in sorted(os.listdir(plan_dir)):
+        if filename.endswith('.tf'):
+            with open(fs.join(plan_dir, filename)) as fh:
+                for resource_type, name in resource_re.findall(fh.read()):
+                    result[name] = resource_type
+
+    return result
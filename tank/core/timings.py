@@ -0,0 +1,138 @@
+#
+#   module tank.core.timings
+#
+# Timings of Run stages and Ansible tasks.
+#
+import os
+import sys
+import json
+import resource
+import threading
+from contextlib import contextmanager
+from time import time, monotonic
+from typing import Dict, Iterable, Iterator, List
+
+from tank.core.stages import StageCancelled
+
+
+class StageTimings:
+    """
+    Log of stage executions of a run, a json object per line.
+
+    Every record holds wall time, exit status, the number of hosts and resource usage of the tool processes
+    (Terraform, Ansible) finished during the stage. The usage is taken from the usage of all the children
+    of Tank, so stages running concurrently (e.g. create and dependency) share it. The peak memory isn't
+    per stage: it's the largest child of Tank up to the end of the stage.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    @contextmanager
+    def measure(self, stage: str, count_hosts=None):
+        """
+        :param count_hosts: returns the number of hosts of the run at the end of the stage
+        """
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        started, started_monotonic = time(), monotonic()
+        record = {'stage': stage, 'started': round(started, 3)}
+        try:
+            yield record
+        except StageCancelled:
+            record['status'] = 'cancelled'
+            raise
+        except BaseException as e:
+            record['status'] = 'failed'
+            record['error'] = e.__class__.__name__
+            raise
+        else:
+            record['status'] = 'done'
+        finally:
+            usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            record.update({
+                'wall_time': round(monotonic() - started_monotonic, 3),
+                'children_cpu_user': round(usage_after.ru_utime - usage_before.ru_utime, 3),
+                'children_cpu_system': round(usage_after.ru_stime - usage_before.ru_stime, 3),
+                # the largest child so far, not of this stage only
+                'children_peak_rss_mb': _max_rss_mb(usage_after),
+            })
+            if count_hosts is not None:
+                try:
+                    record['hosts'] = count_hosts()
+                except Exception:
+                    record['hosts'] = None
+            self._append(record)
+
+    def records(self) -> List[Dict]:
+        if not os.path.exists(self.filename):
+            return []
+
+        with open(self.filename) as fh:
+            return [json.loads(line) for line in fh if line.strip()]
+
+    def _append(self, record: Dict):
+        with self.__class__._lock:
+            with open(self.filename, 'a') as fh:
+                fh.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def _max_rss_mb(usage) -> float:
+    # bytes on macOS, kilobytes on Linux
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss * scale / 2 ** 20, 1)
+
+
+def read_events(filenames: Iterable[str]) -> Iterator[Dict]:
+    """
+    Events written by the tank_events Ansible callback plugin.
+    """
+    for filename in filenames:
+        if not os.path.exists(filename):
+            continue
+
+        with open(filename) as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # a line being written at the moment
+                    continue
+
+
+def slowest_tasks(events: Iterable[Dict], limit: int = 10) -> List[Dict]:
+    """
+    Tasks by the total time spent on all the hosts.
+    """
+    tasks = dict()
+    for event in events:
+        if event.get('event') != 'task_result':
+            continue
+
+        key = (event['play'], event['task'])
+        task = tasks.setdefault(key, {'play': event['play'], 'task': event['task'], 'hosts': 0,
+                                      'total': 0.0, 'max': 0.0, 'slowest_host': None})
+        task['hosts'] += 1
+        task['total'] += event['duration']
+        if event['duration'] >= task['max']:
+            task['max'], task['slowest_host'] = event['duration'], event['host']
+
+    return sorted(tasks.values(), key=lambda task: -task['total'])[:limit]
+
+
+def slowest_hosts(events: Iterable[Dict], limit: int = 10) -> List[Dict]:
+    """
+    Hosts by the total time of their tasks.
+    """
+    hosts = dict()
+    for event in events:
+        if event.get('event') != 'task_result':
+            continue
+
+        host = hosts.setdefault(event['host'], {'host': event['host'], 'tasks': 0, 'total': 0.0, 'failed': 0})
+        host['tasks'] += 1
+        host['total'] += event['duration']
+        host['failed'] += 1 if event['failed'] else 0
+
+    return sorted(hosts.values(), key=lambda host: -host['total'])[:limit]
@@ -7,6 +7,8 @@ import os
 import re
 import json
 import hashlib
+import tempfile
+from types import MappingProxyType
 from typing import List
 
 import yaml
@@ -27,6 +29,46 @@ def json_load(filename: str):
         return json.load(fh)
 
 
+def write_atomic(filename: str, content: str):
+    """
+    Writes text to a temporary file and moves it over the destination.
+    """
+    fd, temp_file = tempfile.mkstemp(prefix='.{}'.format(os.path.basename(filename)), dir=os.path.dirname(filename))
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(content)
+
+    os.replace(temp_file, filename)
+
+
+def json_dump_atomic(filename: str, data):
+    """
+    Writes json to a temporary file and moves it over the destination.
+    """
+    write_atomic(filename, json.dumps(data, indent=2, sort_keys=True))
+
+
+def freeze(data):
+    """
+    Makes a read-only view of a json-like structure: dicts become mappingproxies, lists become tuples.
+    """
+    if isinstance(data, dict):
+        return MappingProxyType(dict((k, freeze(v)) for k, v in data.items()))
+    if isinstance(data, (list, tuple)):
+        return tuple(freeze(i) for i in data)
+    return data
+
+
+def thaw(data):
+    """
+    Mutable deep copy of a structure made by freeze, e.g. for json serialization.
+    """
+    if isinstance(data, (dict, MappingProxyType)):
+        return dict((k, thaw(v)) for k, v in data.items())
+    if isinstance(data, (list, tuple)):
+        return [thaw(i) for i in data]
+    return data
+
+
 def sha256(bin_data) -> str:
     return hashlib.sha256(bin_data).hexdigest()
 
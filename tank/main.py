@@ -7,10 +7,11 @@ from cement import App, TestApp, init_defaults
 from cement.core.exc import CaughtSignal
 from cement.utils import fs
 
-from tank.core.cloud_settings import CloudUserSettings
 from tank.core.exc import TankError
 from tank.controllers.base import Base
+from tank.controllers.batch import NestedBatch
 from tank.controllers.cluster import NestedCluster, EmbeddedCluster
+from tank.controllers.image import NestedImage
 from tank.logging_conf import build_logging_conf
 
 
@@ -22,7 +23,45 @@ def _default_config() -> Dict:
 
     config['tank'] = {
         'ansible': {
+            # upper limit, forks are tuned to the number of hosts and local CPUs
             'forks': 50,
+            # how long (in seconds) a resolved commit of a moving role version (e.g. master) is trusted
+            'role_cache_ttl': 0,
+            # facts gathered from the hosts, see the gather_subset option of the setup module
+            'gather_subset': 'all',
+            # how often (in seconds) progress of provisioning is reported, 0 disables the reports
+            'progress_interval': 30,
+            # strategy of the provisioning plays unless a testcase specifies it:
+            # linear, free, mitogen_linear or mitogen_free
+            'provisioning_strategy': 'linear',
+            # apt proxy and docker registry mirror on the monitoring node unless a testcase specifies it
+            'cluster_cache': False,
+        },
+        'terraform': {
+            # directories with pre-populated provider plugins, Terraform won't download plugins if specified
+            'plugin_dirs': [],
+            # TF_LOG: TRACE, DEBUG, INFO, WARN or ERROR, empty value disables the log
+            'log_level': 'TRACE',
+            # how many times apply/destroy are resumed with a lower parallelism if the provider throttles requests
+            'rate_limit_retries': 3,
+        },
+        'logs': {
+            # max uncompressed size of a log file (in MB) and the number of rotated files kept per stage
+            'max_size': 100,
+            'backups': 3,
+        },
+        'bench': {
+            # how bench commands are started on the hosts: ssh or local (for testing without cloud hosts)
+            'executor': 'ssh',
+        },
+        'batch': {
+            # runs processed at the same time
+            'workers': 4,
+            # limits shared by the runs: cloud API calls in flight (Terraform parallelism), Ansible forks
+            # and Terraform/Ansible processes (the number of CPUs by default)
+            'api_calls': 100,
+            'forks': 200,
+            'processes': None,
         },
     }
 
@@ -48,10 +87,10 @@ class MixbytesTank(App):
         close_on_exit = True
 
         # load additional framework extensions
+        # (templates are rendered by tank.core.tf on demand, no need to load jinja2 for every command)
         extensions = [
             'yaml',
             'colorlog',
-            'jinja2',
         ]
 
         # List of configuration directory
@@ -66,16 +105,13 @@ class MixbytesTank(App):
         # set the log handler
         log_handler = 'colorlog'
 
-        # set the output handler
-        output_handler = 'jinja2'
-
-        template_handler = 'jinja2'
-
         # register handlers
         handlers = [
             Base,
             EmbeddedCluster,
             NestedCluster,
+            NestedBatch,
+            NestedImage,
         ]
 
         # register hooks
@@ -85,15 +121,16 @@ class MixbytesTank(App):
     def __init__(self):
         super().__init__()
         self._cloud_settings = None
+        self._toolchain = None
 
     def setup(self):
         super(MixbytesTank, self).setup()
         fs.ensure_dir_exists(self.user_dir)
+        fs.ensure_dir_exists(self.terraform_plugin_cache_dir)
 
         additional_config_defaults = {
             'tank': {
                 'terraform_run_command': os.path.join(self.installation_dir, 'terraform'),
-                'terraform_inventory_run_command': os.path.join(self.installation_dir, 'terraform-inventory'),
             },
         }
 
@@ -105,13 +142,17 @@ class MixbytesTank(App):
     @property
     def app_env(self) -> Dict:
         env = os.environ.copy()
-        env["TF_LOG"] = "TRACE"
+        if self.terraform_config.get('log_level'):
+            env["TF_LOG"] = self.terraform_config['log_level']
         env["TF_IN_AUTOMATION"] = "true"
+        env["TF_PLUGIN_CACHE_DIR"] = self.terraform_plugin_cache_dir
         return env
 
     @property
-    def cloud_settings(self) -> CloudUserSettings:
+    def cloud_settings(self):
         if self._cloud_settings is None:
+            from tank.core.cloud_settings import CloudUserSettings
+
             self._cloud_settings = CloudUserSettings(self.config)
 
         return self._cloud_settings
@@ -121,12 +162,17 @@ class MixbytesTank(App):
         return self.cloud_settings.provider.value
 
     @property
-    def terraform_run_command(self) -> str:
-        return self.config.get(self.Meta.label, 'terraform_run_command')
+    def toolchain(self):
+        if self._toolchain is None:
+            from tank.terraform_installer import Toolchain
+
+            self._toolchain = Toolchain(self.installation_dir)
+
+        return self._toolchain
 
     @property
-    def terraform_inventory_run_command(self) -> str:
-        return self.config.get(self.Meta.label, 'terraform_inventory_run_command')
+    def terraform_run_command(self) -> str:
+        return self._tool_run_command('terraform_run_command')
 
     @property
     def user_dir(self) -> str:
@@ -136,11 +182,52 @@ class MixbytesTank(App):
     def installation_dir(self) -> str:
         return fs.abspath(fs.join(self.user_dir, 'bin'))
 
+    @property
+    def terraform_plugin_cache_dir(self) -> str:
+        """Provider plugins shared by all runs, laid out as <os>_<arch>/terraform-provider-<name>_v<version>_x<N>."""
+        return fs.abspath(fs.join(self.user_dir, 'tf_plugins'))
+
+    @property
+    def terraform_config(self) -> dict:
+        """Return dict with terraform parameters."""
+        return self.config.get(self.Meta.label, 'terraform')
+
     @property
     def ansible_config(self) -> dict:
         """Return dict with ansible parameters."""
         return self.config.get(self.Meta.label, 'ansible')
 
+    @property
+    def logs_config(self) -> dict:
+        """Return dict with log capture parameters."""
+        return self.config.get(self.Meta.label, 'logs')
+
+    @property
+    def bench_config(self) -> dict:
+        """Return dict with bench parameters."""
+        return self.config.get(self.Meta.label, 'bench')
+
+    @property
+    def batch_config(self) -> dict:
+        """Return dict with batch parameters."""
+        return self.config.get(self.Meta.label, 'batch')
+
+    def _tool_run_command(self, config_key: str) -> str:
+        """Tools managed by Tank are installed and verified only when they are about to be run."""
+        from tank.terraform_installer import TerraformInstaller
+
+        tools = {
+            'terraform_run_command': TerraformInstaller,
+        }
+        managed = [i for k, i in tools.items()
+                   if self.config.get(self.Meta.label, k) == os.path.join(self.installation_dir, i.file_name)]
+
+        if tools[config_key] not in managed:
+            return self.config.get(self.Meta.label, config_key)
+
+        # check all the managed tools at once, so that missing ones are downloaded concurrently
+        return self.toolchain.resolve_all(managed)[managed.index(tools[config_key])]
+
 
 class MixbytesTankTest(TestApp, MixbytesTank):
     """A sub-class of MixbytesTank that is better suited for testing."""
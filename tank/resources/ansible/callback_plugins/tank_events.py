@@ -0,0 +1,135 @@
+#
+#   Ansible callback plugin tank_events
+#
+# Writes events of a playbook run as newline-delimited json: playbook, play and task starts,
+# start and result of every task on every host, the final stats.
+# The plugin is loaded by Ansible itself, so it must not depend on Tank.
+#
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import json
+import threading
+from time import time
+
+from ansible.plugins.callback import CallbackBase
+
+
+DOCUMENTATION = '''
+    callback: tank_events
+    type: aggregate
+    short_description: Writes events of Tank runs as json lines
+    description:
+      - Every event is a json object on its own line, appended to the file specified by TANK_ANSIBLE_EVENTS.
+      - Events are playbook_start, play_start, task_start, host_start, task_result and playbook_end.
+      - The plugin does nothing if the variable is not set.
+    requirements:
+      - whitelisting in configuration
+'''
+
+
+def _count_tasks(blocks):
+    count = 0
+    for block in blocks:
+        for task in block.block:
+            if hasattr(task, 'block'):
+                count += _count_tasks([task])
+            elif task.action != 'meta':
+                count += 1
+    return count
+
+
+class CallbackModule(CallbackBase):
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'tank_events'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self._events_file = os.environ.get('TANK_ANSIBLE_EVENTS')
+        self._lock = threading.Lock()
+        self._play = None
+        self._task_started = dict()
+        # (host, task uuid) -> start time, hosts start a task at different moments with the free strategy
+        self._host_started = dict()
+
+    def _write(self, event, **fields):
+        if not self._events_file:
+            return
+
+        fields.update(event=event, time=round(time(), 3), pid=os.getpid())
+        line = json.dumps(fields, sort_keys=True) + '\n'
+        with self._lock:
+            with open(self._events_file, 'a') as fh:
+                fh.write(line)
+
+    def v2_playbook_on_start(self, playbook):
+        self._write('playbook_start', playbook=os.path.basename(playbook._file_name))
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name()
+
+        # both are estimations used to report progress, tasks of dynamic includes and handlers aren't counted
+        try:
+            hosts = [host.get_name() for host in play.get_variable_manager()._inventory.get_hosts(play.hosts)]
+        except Exception:
+            hosts = None
+        try:
+            tasks = _count_tasks(play.compile())
+        except Exception:
+            tasks = None
+
+        self._write('play_start', play=self._play, hosts=hosts, tasks=tasks)
+
+    def _task_start(self, task, handler):
+        self._task_started[task._uuid] = time()
+        self._write('task_start', play=self._play, task=task.get_name(), task_uuid=task._uuid,
+                    action=task.action, handler=handler)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_start(task, False)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._task_start(task, True)
+
+    def v2_runner_on_start(self, host, task):
+        self._host_started[(host.get_name(), task._uuid)] = time()
+        self._write('host_start', play=self._play, task=task.get_name(), task_uuid=task._uuid, host=host.get_name())
+
+    def _task_result(self, result, status):
+        host = result._host.get_name()
+        task = result._task
+        finished = time()
+        started = self._host_started.pop((host, task._uuid), self._task_started.get(task._uuid, finished))
+
+        self._write('task_result',
+                    play=self._play,
+                    task=task.get_name(),
+                    task_uuid=task._uuid,
+                    action=task.action,
+                    host=host,
+                    status=status,
+                    changed=bool(result._result.get('changed', False)),
+                    failed=status in ('failed', 'unreachable'),
+                    started=round(started, 3),
+                    finished=round(finished, 3),
+                    duration=round(finished - started, 3))
+
+    def v2_runner_on_ok(self, result):
+        self._task_result(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._task_result(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_unreachable(self, result):
+        self._task_result(result, 'unreachable')
+
+    def v2_runner_on_skipped(self, result):
+        self._task_result(result, 'skipped')
+
+    def v2_playbook_on_stats(self, stats):
+        hosts = dict((host, stats.summarize(host)) for host in sorted(stats.processed.keys()))
+        self._write('playbook_end', hosts=hosts)
@@ -0,0 +1,40 @@
+# Builder instance of a golden image, see `tank image bake`
+variable "token" {}
+variable "pvt_key" {}
+variable "ssh_fingerprint" {}
+variable "blockchain_name" {}
+variable "setup_id" {}
+
+provider "digitalocean" {
+  version = "~> 1.1"
+  token = "${var.token}"
+}
+
+resource "digitalocean_droplet" "tank-image-builder" {
+    image = "ubuntu-18-04-x64"
+    name = "tank-${var.blockchain_name}-${var.setup_id}-builder"
+    size = "2gb"
+    region = "fra1"
+    ssh_keys = [
+      "${var.ssh_fingerprint}"
+    ]
+    connection {
+      user = "root"
+      type = "ssh"
+      private_key = "${file(var.pvt_key)}"
+      timeout = "10m"
+  }
+  provisioner "remote-exec" {
+    inline = [
+      "export PATH=$PATH:/usr/bin",
+    ]
+  }
+}
+
+output "builder_ip" {
+    value = "${digitalocean_droplet.tank-image-builder.ipv4_address}"
+}
+
+output "builder_id" {
+    value = "${digitalocean_droplet.tank-image-builder.id}"
+}
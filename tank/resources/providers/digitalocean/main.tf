@@ -18,6 +18,10 @@ provider "digitalocean" {
 {% endraw %}
 
 
+{# a golden image of the binding, see `tank image bake` #}
+{% set base_image = image or 'ubuntu-18-04-x64' %}
+
+
 {% macro machine_type(type) -%}
   {% if type == 'micro' %}
   size = "512mb"
@@ -44,7 +48,7 @@ provider "digitalocean" {
 {% for cfg in instance_configs %}
 
 resource "digitalocean_droplet" "tank-{{ name }}-{{ loop.index }}" {
-    image = "ubuntu-18-04-x64"
+    image = "{{ base_image }}"
     name = "tank-${var.blockchain_name}-${var.setup_id}-{{ name }}-{{ loop.index }}-${count.index}"
     count = "{{ cfg.count }}"
     {{ machine_type(cfg.type) }}
@@ -81,9 +85,9 @@ resource "digitalocean_droplet" "tank-{{ name }}-{{ loop.index }}" {
 # End of dynamic resources
 
 
-{% raw %}
 resource "digitalocean_droplet" "tank-monitoring" {
-    image = "ubuntu-18-04-x64"
+    image = "{{ base_image }}"
+{% raw %}
     name = "tank-${var.blockchain_name}-${var.setup_id}-monitoring"
 {% endraw %}
   {{ machine_type(monitoring_machine_type) }}
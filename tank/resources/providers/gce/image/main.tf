@@ -0,0 +1,66 @@
+# Builder instance of a golden image, see `tank image bake`
+variable "pub_key" {}
+variable "pvt_key" {}
+variable "cred_path" {}
+variable "project" {}
+variable "blockchain_name" {}
+variable "setup_id" {}
+
+variable "region_zone" {
+  default = "europe-west4-a"
+}
+
+provider "google" {
+  version = "~> 2.5"
+  credentials = "${file("${var.cred_path}")}"
+  project     = "${var.project}"
+}
+
+resource "google_compute_instance" "tank-image-builder" {
+  name         = "tank-${var.blockchain_name}-${var.setup_id}-builder"
+  machine_type = "g1-small"
+  zone         = "${var.region_zone}"
+
+  boot_disk {
+    initialize_params {
+      image = "ubuntu-os-cloud/ubuntu-minimal-1804-lts"
+    }
+  }
+
+  network_interface {
+    network = "default"
+
+    access_config {
+      // Ephemeral IP
+    }
+  }
+
+  metadata {
+    ssh-keys = "root:${file("${var.pub_key}")}"
+  }
+
+  provisioner "remote-exec" {
+    connection {
+        user = "root"
+        type = "ssh"
+        private_key = "${file(var.pvt_key)}"
+        timeout = "10m"
+    }
+    inline = [
+      "export PATH=$PATH:/usr/bin",
+    ]
+  }
+}
+
+output "builder_ip" {
+    value = "${google_compute_instance.tank-image-builder.network_interface.0.access_config.0.nat_ip}"
+}
+
+# the boot disk is named after the instance
+output "builder_id" {
+    value = "${google_compute_instance.tank-image-builder.name}"
+}
+
+output "builder_zone" {
+    value = "${google_compute_instance.tank-image-builder.zone}"
+}
@@ -52,6 +52,10 @@ resource "google_compute_firewall" "default" {
 {% endraw %}
 
 
+{# a golden image of the binding, see `tank image bake` #}
+{% set base_image = image or 'ubuntu-os-cloud/ubuntu-minimal-1804-lts' %}
+
+
 {% macro machine_type(type) -%}
   {% if type == 'micro' %}
   machine_type = "f1-micro"
@@ -88,7 +92,9 @@ resource "google_compute_instance" "tank-{{ name }}-{{ loop.index }}" {
 
   boot_disk {
     initialize_params {
-      image = "ubuntu-os-cloud/ubuntu-minimal-1804-lts"
+{% endraw %}
+      image = "{{ base_image }}"
+{% raw %}
     }
   }
 
@@ -143,7 +149,9 @@ resource "google_compute_instance" "monitoring" {
 
   boot_disk {
     initialize_params {
-      image = "ubuntu-os-cloud/ubuntu-minimal-1804-lts"
+{% endraw %}
+      image = "{{ base_image }}"
+{% raw %}
     }
   }
 
@@ -1,31 +1,57 @@
 import logging
 import os
+import json
+import shutil
+import socket
 import stat
 import sys
+import hashlib
+import tempfile
+import threading
 import zipfile
-from urllib.request import urlopen
+from concurrent.futures import ThreadPoolExecutor
+from http.client import IncompleteRead
+from typing import List
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
 
-import sh
+from tank.core.exc import TankError
+from tank.core.utils import json_dump_atomic
 
 
 _logger = logging.getLogger(__name__)
 
 
+def _file_sha256(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
 class BaseInstaller(object):
-    """Base installer.
+    """Base installer, fetch() installs the tool regardless of the installed one.
 
-    1. Download ZIP archive.
-    2. Unzip it.
-    3. Remove ZIP file.
-    4. Move file to storage_path directory.
+    1. Download ZIP archive, resuming interrupted downloads.
+    2. Verify it against published checksums (if available).
+    3. Stream the file out of the archive into storage_path directory.
+    4. Remove ZIP file.
     5. Make file executable
-    6. Add variable to $PATH
+
+    Whether the tool needs to be fetched is decided by Toolchain, which tracks the installed tools in a manifest.
     """
 
     version: str
     url: str
     archive_name: str
     file_name: str  # name of file in archive
+    checksums_url: str = None  # file in the sha256sum format
+
+    download_attempts = 5
+    chunk_size = 1024 * 1024  # 1 MB
+    timeout = 60
 
     def __init__(self, storage_path: str):
         """Build archive full path."""
@@ -36,34 +62,87 @@ class BaseInstaller(object):
         self._archive_full_path = os.path.join(storage_path, self.archive_name)
         self._file_full_path = os.path.join(storage_path, self.file_name)
 
-    def _is_installed(self) -> bool:
-        """Returns True if tool is installed else False."""
-        try:
-            sh.Command(self._file_full_path)
-            return True
-        except sh.CommandNotFound:
-            return False
+    @property
+    def _partial_archive_full_path(self) -> str:
+        return self._archive_full_path + '.part'
 
     def _download_archive(self):
-        """Download archive from provided url."""
+        """Download archive from provided url, an interrupted download is resumed via HTTP Range requests."""
         _logger.debug('Downloading archive...')
-        response = urlopen(self.url)
-
-        with open(self._archive_full_path, 'wb') as archive_file:
-            chunk_size = 1024 * 1024  # 1 MB
-            chunk = response.read(chunk_size)
 
-            while chunk:
-                archive_file.write(chunk)
-                chunk = response.read(chunk_size)
+        for attempt in range(1, self.download_attempts + 1):
+            try:
+                self._download_chunks()
+                break
+            except (IncompleteRead, URLError, ConnectionError, socket.timeout) as e:
+                if attempt == self.download_attempts:
+                    raise TankError('Failed to download {}: {}'.format(self.url, e))
+                _logger.warning('Download of {name} is interrupted ({error}), resuming...'.format(
+                    name=self.archive_name, error=e))
 
+        os.replace(self._partial_archive_full_path, self._archive_full_path)
         _logger.debug('Archive {name} has been successfully downloaded.'.format(name=self.archive_name))
 
+    def _download_chunks(self):
+        offset = 0
+        if os.path.exists(self._partial_archive_full_path):
+            offset = os.path.getsize(self._partial_archive_full_path)
+
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+        try:
+            response = urlopen(Request(self.url, headers=headers), timeout=self.timeout)
+        except HTTPError as e:
+            if e.code == 416:
+                # Range Not Satisfiable - the file is complete
+                return
+            raise
+
+        with response:
+            # the server may ignore the Range header
+            mode = 'ab' if response.status == 206 else 'wb'
+
+            received = 0
+            with open(self._partial_archive_full_path, mode) as archive_file:
+                for chunk in iter(lambda: response.read(self.chunk_size), b''):
+                    archive_file.write(chunk)
+                    received += len(chunk)
+
+            expected = response.headers.get('Content-Length')
+            if expected is not None and received < int(expected):
+                # urllib silently stops reading of a dropped connection
+                raise IncompleteRead(b'', int(expected) - received)
+
+    def _expected_sha256(self) -> str:
+        """Fetch published checksum of the archive."""
+        with urlopen(self.checksums_url, timeout=self.timeout) as response:
+            for line in response.read().decode().splitlines():
+                checksum, _, filename = line.strip().partition(' ')
+                if filename.strip().lstrip('*') == self.archive_name:
+                    return checksum.lower()
+
+        raise TankError('Checksum of {} is not published at {}'.format(self.archive_name, self.checksums_url))
+
+    def _verify_archive(self):
+        """Verify archive against published checksums."""
+        if self.checksums_url is None:
+            _logger.debug('There are no published checksums for {name}.'.format(name=self.archive_name))
+            return
+
+        if _file_sha256(self._archive_full_path) != self._expected_sha256():
+            os.remove(self._archive_full_path)
+            raise TankError('Checksum verification of {} failed'.format(self.archive_name))
+
+        _logger.debug('Archive {name} has been verified.'.format(name=self.archive_name))
+
     def _unpack_archive(self):
-        """Unpack archive with provided name."""
+        """Stream the file out of the archive, the file is replaced atomically."""
         with zipfile.ZipFile(self._archive_full_path, 'r') as zip_ref:
-            zip_ref.extractall(self._storage_path)
+            with zip_ref.open(self.file_name) as source:
+                fd, temp_file = tempfile.mkstemp(prefix='.{}'.format(self.file_name), dir=self._storage_path)
+                with os.fdopen(fd, 'wb') as target:
+                    shutil.copyfileobj(source, target, self.chunk_size)
 
+        os.replace(temp_file, self._file_full_path)
         _logger.debug('Archive has been unpacked.')
 
     def _remove_archive(self):
@@ -76,31 +155,22 @@ class BaseInstaller(object):
         file_stat = os.stat(self._file_full_path)
         os.chmod(self._file_full_path, file_stat.st_mode | stat.S_IEXEC)
 
-    def _add_variables(self):
-        """Add variables to $PATH."""
-        path_variable = os.environ.get('PATH', '')
-        paths = path_variable.split(os.pathsep)
-
-        if self._storage_path not in paths:
-            if path_variable:
-                os.environ['PATH'] = os.pathsep.join([self._storage_path, path_variable])
-            else:
-                os.environ['PATH'] = self._storage_path
-
-        _logger.debug('Variable has been added to $PATH.')
+    @property
+    def file_full_path(self) -> str:
+        return self._file_full_path
 
-    def install(self):
-        """Installation logic is here."""
-        if not self._is_installed():
-            _logger.debug('Installing {name}...'.format(name=self.file_name))
-            self._download_archive()
-            self._unpack_archive()
-            self._remove_archive()
-            self._make_executable()
-        else:
-            _logger.debug('{name} is already installed.'.format(name=self.file_name))
+    def file_sha256(self) -> str:
+        """Calculates checksum of the installed file."""
+        return _file_sha256(self._file_full_path)
 
-        self._add_variables()
+    def fetch(self):
+        """Downloads and unpacks the tool regardless of the installed one."""
+        _logger.debug('Installing {name}...'.format(name=self.file_name))
+        self._download_archive()
+        self._verify_archive()
+        self._unpack_archive()
+        self._remove_archive()
+        self._make_executable()
 
 
 class TerraformInstaller(BaseInstaller):
@@ -110,20 +180,106 @@ class TerraformInstaller(BaseInstaller):
     file_name = 'terraform'
     archive_name = 'terraform_{v}_{platform}_amd64.zip'.format(v=version, platform=sys.platform.lower())
     url = 'https://releases.hashicorp.com/terraform/{v}/{filename}'.format(v=version, filename=archive_name)
+    checksums_url = 'https://releases.hashicorp.com/terraform/{v}/terraform_{v}_SHA256SUMS'.format(v=version)
+
+
+class Toolchain(object):
+    """Tools installed into storage_path and tracked by a manifest.
+
+    The manifest records version, sha256, size and mtime of every tool.
+    A tool is resolved only when it's actually needed:
+    the checksum is recalculated only if size or mtime of the file changed,
+    a tool is reinstalled if it's missing, modified or its version differs from the pinned one.
+    """
+
+    MANIFEST_FILE = 'toolchain.json'
+
+    def __init__(self, storage_path: str):
+        self._storage_path = storage_path
+        self._resolved = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self) -> dict:
+        manifest_file = os.path.join(self._storage_path, self.MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            return dict()
+
+        with open(manifest_file) as fh:
+            return json.load(fh)
+
+    def resolve(self, installer_class) -> str:
+        """Returns path to the tool, installs or reinstalls the tool if necessary."""
+        return self.resolve_all([installer_class])[0]
+
+    def resolve_all(self, installer_classes: List) -> List[str]:
+        """Returns paths to the tools, missing or stale tools are downloaded concurrently."""
+        with self._lock:
+            pending = [installer_class(storage_path=self._storage_path) for installer_class in installer_classes
+                       if installer_class.file_name not in self._resolved]
+
+            if pending:
+                from filelock import FileLock
+
+                with FileLock(os.path.join(self._storage_path, '.toolchain.lock')):
+                    manifest = self.manifest
+                    stale = [i for i in pending if not self._verify(i, manifest.get(i.file_name))]
+
+                    if stale:
+                        with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                            # re-raises the first download error
+                            list(pool.map(lambda installer: installer.fetch(), stale))
+
+                    for installer in pending:
+                        record = None if installer in stale else manifest.get(installer.file_name)
+                        manifest[installer.file_name] = self._make_record(installer, record)
+                    self._save_manifest(manifest)
+
+                for installer in pending:
+                    self._resolved[installer.file_name] = installer.file_full_path
+
+            return [self._resolved[installer_class.file_name] for installer_class in installer_classes]
+
+    @staticmethod
+    def _verify(installer: BaseInstaller, record: dict) -> bool:
+        """Checks the installed tool against the manifest record."""
+        if record is None:
+            _logger.debug('{name} is not registered in the toolchain manifest.'.format(name=installer.file_name))
+            return False
+
+        if record['version'] != installer.version:
+            _logger.warning('{name} {installed} is installed, but {pinned} is required, reinstalling.'.format(
+                name=installer.file_name, installed=record['version'], pinned=installer.version))
+            return False
+
+        if not os.path.isfile(installer.file_full_path):
+            return False
+
+        file_stat = os.stat(installer.file_full_path)
+        if file_stat.st_size == record['size'] and int(file_stat.st_mtime) == record['mtime']:
+            return True
+
+        if installer.file_sha256() != record['sha256']:
+            _logger.warning('{name} has been modified, reinstalling.'.format(name=installer.file_name))
+            return False
 
+        return True
 
-class TerraformInventoryInstaller(BaseInstaller):
-    """Terraform inventory installer."""
+    @staticmethod
+    def _make_record(installer: BaseInstaller, record: dict = None) -> dict:
+        file_stat = os.stat(installer.file_full_path)
+        return {
+            'version': installer.version,
+            'path': installer.file_full_path,
+            'sha256': installer.file_sha256() if record is None else record['sha256'],
+            'size': file_stat.st_size,
+            'mtime': int(file_stat.st_mtime),
+        }
 
-    version = 'v0.8'
-    file_name = 'terraform-inventory'
-    archive_name = 'terraform-inventory_{v}_{platform}_amd64.zip'.format(v=version, platform=sys.platform.lower())
-    url = (
-        'https://github.com/adammck/terraform-inventory/releases/download/{v}/{filename}'
-    ).format(v=version, filename=archive_name)
+    def _save_manifest(self, manifest: dict):
+        json_dump_atomic(os.path.join(self._storage_path, self.MANIFEST_FILE), manifest)
 
 
 if __name__ == '__main__':
     default_directory = os.path.join(os.path.expanduser('~'), '.tank', 'bin')
-    TerraformInstaller(default_directory).install()
-    TerraformInventoryInstaller(default_directory).install()
+    Toolchain(default_directory).resolve_all([TerraformInstaller])
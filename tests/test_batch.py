@@ -0,0 +1,65 @@
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+from tank.core.batch import BatchPool, failed_results
+from tank.core.exc import TankError
+from tank.core.executor import LocalExecutor
+from tank.core.stages import current_prefix
+
+
+def test_pool_isolates_failures():
+    def failing(result):
+        raise TankError('Terraform failed\n\nthe whole output')
+
+    def succeeding(result):
+        result.details['prefix'] = current_prefix()
+
+    results = BatchPool(2).run(OrderedDict([('a', failing), ('b', succeeding)]))
+
+    assert [(r.name, r.status) for r in results] == [('a', 'failed'), ('b', 'done')]
+    assert results[0].error == 'Terraform failed'
+    assert results[1].details['prefix'] == 'b'
+    assert results[1].duration is not None
+    assert failed_results(results) == '1 of 2 jobs did not succeed: a'
+    assert failed_results(results[1:]) is None
+
+
+def test_pool_limits_workers():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def job(result):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.1)
+        with lock:
+            running.pop()
+
+    results = BatchPool(2).run(OrderedDict(('job{}'.format(i), job) for i in range(6)))
+
+    assert all(result.ok for result in results)
+    assert max(peak) == 2
+
+
+def test_interrupt_stops_executor_commands(tmpdir):
+    pid_file = tmpdir.join('pid')
+
+    def bench(result):
+        LocalExecutor().run({'a': 'echo $$ > {}; sleep 30'.format(pid_file)})
+
+    threading.Timer(0.5, os.kill, (os.getpid(), signal.SIGINT)).start()
+    started = time.time()
+    with pytest.raises(KeyboardInterrupt):
+        BatchPool(1).run(OrderedDict([('bench', bench)]))
+
+    # the pool doesn't wait for the command to finish
+    assert time.time() - started < 10
+    with pytest.raises(OSError):
+        os.kill(int(pid_file.read()), 0)
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from tank.core.bench import LatencyHistogram, NodeStats, BenchResults, BenchPlan, aggregate, allocate_load, \
+    instance_type_weights
+from tank.core.exc import TankError
+
+
+def test_histogram_merge_is_exact():
+    first, second, union = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for value in range(1, 500):
+        (first if value % 3 else second).record(value)
+        union.record(value)
+
+    merged = LatencyHistogram().merge(first).merge(second)
+
+    assert merged.to_dict() == union.to_dict()
+    assert merged.count == 499
+    assert merged.mean == pytest.approx(250)
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+
+    assert histogram.percentile(50) == pytest.approx(500, rel=0.02)
+    assert histogram.percentile(99) == pytest.approx(990, rel=0.02)
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_node_output_parsing():
+    output = '\n'.join([
+        'Starting bench...',
+        json.dumps({'time': 100, 'sent': 10, 'processed': 8, 'tps': 8, 'latencies': [10, 20]}),
+        json.dumps({'time': 101, 'sent': 20, 'processed': 18, 'errors': 1, 'tps': 10, 'latencies': [30]}),
+        'Finished: sent: 25 processed: 24',
+    ])
+
+    stats = NodeStats.parse('10.0.0.1', output)
+
+    assert (stats.sent, stats.processed, stats.errors) == (25, 24, 1)
+    assert stats.tps == {100: 8.0, 101: 10.0}
+    assert stats.latency.count == 3
+    assert NodeStats.from_dict(stats.to_dict()).to_dict() == stats.to_dict()
+
+
+def test_aggregation():
+    first = NodeStats.parse('a', json.dumps({'time': 1, 'sent': 100, 'errors': 2, 'tps': 50, 'latencies': [10]}))
+    second = NodeStats.parse('b', json.dumps({'time': 1, 'sent': 100, 'tps': 40, 'latencies': [1000]}))
+
+    summary = aggregate([first, second])
+
+    assert summary['nodes'] == 2
+    assert summary['sent'] == 200
+    assert summary['error_rate'] == pytest.approx(0.01)
+    assert summary['tps_timeline'] == [[1, 90.0]]
+    assert summary['latency_p99'] == pytest.approx(1000, rel=0.02)
+
+
+def test_bench_results(tmpdir):
+    results = BenchResults(str(tmpdir), BenchResults.new_id())
+    results.save_node_output('10.0.0.1', 'sent: 5 processed: 5')
+    results.save_node_output('10.0.0.2', 'error: 1')
+    summary = results.aggregate(tps=10)
+
+    assert summary['nodes'] == 2
+    assert summary['processed'] == 5
+    assert summary['errors'] == 1
+    assert BenchResults.latest(str(tmpdir)).summary() == summary
+
+
+def test_allocate_load():
+    assert allocate_load(10, {'a': 1, 'b': 1, 'c': 1}) == {'a': 4, 'b': 3, 'c': 3}
+    assert allocate_load(3, {'a': 1, 'b': 1, 'c': 1}) == {'a': 1, 'b': 1, 'c': 1}
+    assert allocate_load(103, {'a': 1, 'b': 4}) == {'a': 21, 'b': 82}
+
+    with pytest.raises(TankError):
+        allocate_load(2, {'a': 1, 'b': 1, 'c': 1})
+
+
+def test_bench_plan():
+    instances = {'boot': ({'type': 'small', 'count': 1},), 'producer': ({'type': 'large', 'count': 2},)}
+    weights = instance_type_weights({
+        '10.0.0.1': 'tank-polkadot-ab12-boot-1-0',
+        '10.0.0.2': 'tank-polkadot-ab12-producer-1-0',
+        '10.0.0.3': 'tank-polkadot-ab12-producer-1-1',
+    }, instances)
+    assert weights == {'10.0.0.1': 1, '10.0.0.2': 4, '10.0.0.3': 4}
+
+    plan = BenchPlan(weights, tps=1000, total_tx=2)
+    # not enough transactions for every node, the most capable are used
+    assert plan.hosts == ['10.0.0.2', '10.0.0.3']
+    assert sum(plan.tps.values()) == 1000
+    assert plan.host_args('10.0.0.2') == '--common.tps 500 --common.stopOn.processedTransactions 1'
+
+    plan = BenchPlan(weights, tps=901)
+    assert plan.tps == {'10.0.0.1': 101, '10.0.0.2': 400, '10.0.0.3': 400}
+    assert plan.to_dict()['10.0.0.1']['total_tx'] is None
+
+    # the load is up to the bench util defaults
+    plan = BenchPlan(weights)
+    assert plan.hosts == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+    assert (plan.tps, plan.total_tx, plan.host_args('10.0.0.1')) == (None, None, '')
@@ -0,0 +1,50 @@
+import json
+
+from tank.core.catalog import RunCatalog
+
+
+def _record(run_id, created):
+    return {'run_id': run_id, 'created': created, 'testcase_filename': '/tmp/testcase.yml', 'setup_id': 'abc',
+            'binding': 'polkadot', 'total_instances': 3, 'stage': None, 'stages': {}}
+
+
+def test_catalog_lifecycle(tmpdir):
+    catalog = RunCatalog(str(tmpdir))
+    assert not catalog.exists
+    assert catalog.list() == []
+
+    catalog.add(_record('late_run', 200))
+    catalog.add(_record('early_run', 100))
+    assert [r['run_id'] for r in catalog.list()] == ['early_run', 'late_run']
+
+    catalog.stage_transition('early_run', 'create', 'running')
+    catalog.stage_transition('early_run', 'create', 'failed')
+    record = catalog.get('early_run')
+    assert record['stage'] == 'create'
+    assert record['stages']['create']['status'] == 'failed'
+
+    catalog.update('early_run', hosts={'1.2.3.4': {'hostname': 'tank-monitoring', 'bench_present': False}})
+    assert '1.2.3.4' in catalog.get('early_run')['hosts']
+
+    catalog.remove('late_run')
+    assert catalog.get('late_run') is None
+
+    # no temporary files are left behind
+    assert sorted(p.basename for p in tmpdir.listdir() if p.basename != '.catalog.lock') == [RunCatalog.FILE_NAME]
+
+    with open(str(tmpdir.join(RunCatalog.FILE_NAME))) as fh:
+        assert list(json.load(fh)) == ['early_run']
+
+
+def test_unknown_run_is_ignored(tmpdir):
+    catalog = RunCatalog(str(tmpdir))
+    catalog.update('nonexistent', stage='init')
+    catalog.stage_transition('nonexistent', 'init', 'running')
+    assert catalog.list() == []
+
+
+def test_replace_all(tmpdir):
+    catalog = RunCatalog(str(tmpdir))
+    catalog.add(_record('stale', 1))
+    catalog.replace_all([_record('fresh', 2)])
+    assert [r['run_id'] for r in catalog.list()] == ['fresh']
@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+from tank.core.executor import LocalExecutor, SSHExecutor, start_skew
+
+
+def test_local_executor_streams_output():
+    lines = []
+    executor = LocalExecutor(on_line=lambda host, line: lines.append((host, line)))
+
+    results = executor.run({
+        'a': 'echo one; echo two',
+        'b': 'echo $TANK_HOST; exit 3',
+    })
+
+    assert results['a'].ok and results['a'].output == 'one\ntwo'
+    assert results['b'].exit_code == 3 and results['b'].output == 'b'
+    assert sorted(lines) == [('a', 'one'), ('a', 'two'), ('b', 'b')]
+
+
+def test_commands_start_together():
+    commands = dict(('host{}'.format(i), 'true') for i in range(50))
+
+    results = LocalExecutor().run(commands)
+
+    assert all(result.ok for result in results.values())
+    assert start_skew(results) < 1
+
+
+def test_completion_is_not_polled():
+    started = time.time()
+    LocalExecutor().run({'a': 'sleep 0.1', 'b': 'true'})
+    assert time.time() - started < 2
+
+
+def test_interrupt_terminates_commands(tmpdir):
+    pid_file = tmpdir.join('pid')
+
+    def on_line(host, line):
+        if host == 'b':
+            raise KeyboardInterrupt()
+
+    executor = LocalExecutor(on_line=on_line)
+    with pytest.raises(KeyboardInterrupt):
+        executor.run({
+            'a': 'echo $$ > {}; sleep 30'.format(pid_file),
+            'b': 'sleep 0.5; echo stop',
+        })
+
+    pid = int(pid_file.read())
+    with pytest.raises(OSError):
+        os.kill(pid, 0)
+
+
+def test_ssh_commands_get_terminal():
+    executor = SSHExecutor('/tmp/key')
+    executor._control_dir = '/tmp/control'
+
+    args = executor._command_args('1.1.1.1', 'bench')
+    # the remote command is hung up when the local ssh is terminated
+    assert '-tt' in args and args[-3:] == ['1.1.1.1', '--', 'bench']
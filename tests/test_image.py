@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import yaml
+
+from tank.core import resource_path
+from tank.core.image import ImageCatalog, image_content_hash
+from tank.core.inventory import build_inventory, BAKED_GROUP
+from tank.core.tf import PlanGenerator
+
+
+# a stand-in for the app: the provider and the user directory are all the images need
+def _app(tmpdir, provider='digitalocean'):
+    return SimpleNamespace(cloud_settings=SimpleNamespace(provider=SimpleNamespace(value=provider)),
+                           user_dir=str(tmpdir))
+
+
+def _testcase():
+    instances = {'boot': [{'region': 'FRA1', 'count': 1, 'type': 'small', 'packetloss': 0}]}
+    return SimpleNamespace(instances=instances, total_instances=1)
+
+
+def test_image_catalog(tmpdir):
+    catalog = ImageCatalog(str(tmpdir.join('images.yml')))
+    assert catalog.get('digitalocean', 'polkadot') is None
+
+    catalog.record('digitalocean', 'polkadot', '1001', 'tank-polkadot-1', 'hash1')
+    assert catalog.get('digitalocean', 'polkadot')['name'] == 'tank-polkadot-1'
+    assert catalog.current('digitalocean', 'polkadot', 'hash1') == '1001'
+    # the base layer has changed since
+    assert catalog.current('digitalocean', 'polkadot', 'hash2') is None
+    assert catalog.images('gce') == dict()
+
+
+def test_content_hash(tmpdir):
+    app = _app(tmpdir)
+    initial = image_content_hash(app, 'polkadot')
+    assert image_content_hash(app, 'polkadot') == initial
+    assert image_content_hash(_app(tmpdir, 'gce'), 'polkadot') != initial
+
+    bindings_file = tmpdir.join('bindings.yml')
+    bindings = yaml.safe_load(bindings_file.read())
+    bindings['polkadot']['images'] = ['parity/polkadot:v0.7.0']
+    bindings_file.write(yaml.safe_dump(bindings))
+    assert image_content_hash(app, 'polkadot') != initial
+
+
+def test_templates_boot_from_image(tmpdir):
+    for provider, base_image in [('digitalocean', 'ubuntu-18-04-x64'),
+                                 ('gce', 'ubuntu-os-cloud/ubuntu-minimal-1804-lts')]:
+        plan_dir = tmpdir.mkdir(provider)
+        PlanGenerator(_app(tmpdir, provider), _testcase()).generate(str(plan_dir))
+        assert plan_dir.join('main.tf').read().count('image = "{}"'.format(base_image)) == 2
+
+        PlanGenerator(_app(tmpdir, provider), _testcase(), image='tank-polkadot-1').generate(str(plan_dir))
+        main_tf = plan_dir.join('main.tf').read()
+        assert main_tf.count('image = "tank-polkadot-1"') == 2
+        assert base_image not in main_tf
+
+
+def test_baked_hosts_skip_base_plays():
+    def instance(resource, ip, attributes):
+        return {'resource': resource, 'index': 0, 'name': None, 'public_ip': ip, 'private_ip': None,
+                'attributes': attributes}
+
+    instances = {
+        'digitalocean_droplet.tank-boot-1[0]':
+            instance('digitalocean_droplet.tank-boot-1', '1.1.1.1', {'image': '1001'}),
+        # created before the image was baked
+        'digitalocean_droplet.tank-boot-1[1]':
+            instance('digitalocean_droplet.tank-boot-1', '1.1.1.2', {'image': 'ubuntu-18-04-x64'}),
+        'google_compute_instance.monitoring':
+            instance('google_compute_instance.monitoring', '1.1.1.3', {
+                'boot_disk.0.initialize_params.0.image':
+                    'https://www.googleapis.com/compute/v1/projects/bench/global/images/1001'}),
+    }
+    testcase_instances = {'boot': [{'region': 'fra1', 'type': 'large', 'count': 2, 'packetloss': 0}]}
+
+    groups = build_inventory(instances, testcase_instances, image='1001')['all']['children']
+    assert sorted(groups[BAKED_GROUP]['hosts']) == ['1.1.1.1', '1.1.1.3']
+    assert build_inventory(instances, testcase_instances)['all']['children'][BAKED_GROUP]['hosts'] == dict()
+
+    with open(resource_path('ansible', 'base.yml')) as fh:
+        plays = yaml.safe_load(fh)
+    assert all(play['hosts'] == 'all:!{}'.format(BAKED_GROUP) for play in plays)
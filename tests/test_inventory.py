@@ -0,0 +1,174 @@
+import os
+import json
+import shutil
+
+import pytest
+import yaml
+
+import tank.core.inventory as inventory_module
+from tank.core import resource_path
+from tank.core.exc import TankError
+from tank.core.inventory import StateInventory, build_inventory, new_hosts
+
+
+TESTCASE_INSTANCES = {
+    'boot': [{'region': 'fra1', 'type': 'large', 'count': 1, 'packetloss': 0}],
+    'producer': [{'region': 'fra1', 'type': 'small', 'count': 2, 'packetloss': 0},
+                 {'region': 'sgp1', 'type': 'standard', 'count': 1, 'packetloss': 0}],
+    'full': [{'region': 'nyc1', 'type': 'micro', 'count': 1, 'packetloss': 0}],
+}
+
+
+def _instance(resource, public_ip):
+    return {'resource': resource, 'index': 0, 'name': None, 'public_ip': public_ip, 'private_ip': None}
+
+
+def test_inventory():
+    instances = {
+        'digitalocean_droplet.tank-boot-1[0]': _instance('digitalocean_droplet.tank-boot-1', '1.1.1.1'),
+        'digitalocean_droplet.tank-producer-1[0]': _instance('digitalocean_droplet.tank-producer-1', '1.1.1.2'),
+        'digitalocean_droplet.tank-producer-2[0]': _instance('digitalocean_droplet.tank-producer-2', '1.1.1.3'),
+        'digitalocean_droplet.tank-full-1[0]': _instance('digitalocean_droplet.tank-full-1', '1.1.1.4'),
+        'digitalocean_droplet.tank-monitoring[0]': _instance('digitalocean_droplet.tank-monitoring', '1.1.1.5'),
+        # not created yet
+        'digitalocean_droplet.tank-producer-1[1]': _instance('digitalocean_droplet.tank-producer-1', None),
+    }
+
+    inventory = build_inventory(instances, TESTCASE_INSTANCES)['all']
+    groups = dict((group, sorted(value['hosts'])) for group, value in inventory['children'].items()
+                  if not group.startswith('tank-'))
+
+    assert groups == {
+        'bcboot': ['1.1.1.1'],
+        'bcpeers': ['1.1.1.1', '1.1.1.2', '1.1.1.3'],
+        'allnodes': ['1.1.1.1', '1.1.1.2', '1.1.1.3', '1.1.1.4'],
+        'monitoring_peer': ['1.1.1.5'],
+        'baked': [],
+    }
+    assert inventory['hosts']['1.1.1.3'] == {'tank_role': 'producer', 'tank_region': 'sgp1', 'tank_type': 'standard'}
+    assert inventory['hosts']['1.1.1.5'] == {'tank_role': 'monitoring'}
+    assert sorted(inventory['children']['tank-producer-1']['hosts']) == ['1.1.1.2']
+    assert len(inventory['hosts']) == 5
+
+
+def test_inventory_empty_groups():
+    inventory = build_inventory(dict(), TESTCASE_INSTANCES)['all']
+
+    assert inventory['hosts'] == {}
+    assert all(value['hosts'] == {} for value in inventory['children'].values())
+    assert inventory['vars'] == {'terraform_outputs': {}}
+
+
+def test_inventory_unknown_resource():
+    instances = {'google_compute_instance.tank-validator-1[0]':
+                 _instance('google_compute_instance.tank-validator-1', '1.1.1.1')}
+
+    with pytest.raises(TankError):
+        build_inventory(instances, TESTCASE_INSTANCES)
+
+
+def _fixture(name):
+    return os.path.join(os.path.dirname(__file__), 'fixtures', name)
+
+
+DO_TESTCASE_INSTANCES = {
+    'boot': [{'region': 'fra1', 'type': 'large', 'count': 1, 'packetloss': 0}],
+    'producer': [{'region': 'fra1', 'type': 'small', 'count': 2, 'packetloss': 0}],
+}
+
+
+def test_state_inventory_digitalocean(tmpdir):
+    state_file = tmpdir.join('blockchain.tfstate')
+    shutil.copy(_fixture('digitalocean.tfstate'), str(state_file))
+
+    inventory = StateInventory(str(state_file), str(tmpdir.join('inventory.json')), DO_TESTCASE_INSTANCES)
+
+    assert inventory.hosts() == ['142.93.10.1', '142.93.10.2', '142.93.10.3', '142.93.10.4']
+    assert inventory.hosts('bcpeers') == ['142.93.10.1', '142.93.10.2', '142.93.10.3']
+    assert inventory.hosts('monitoring_peer') == ['142.93.10.4']
+    assert inventory.hosts('tank-producer-1') == ['142.93.10.2', '142.93.10.3']
+
+    data = inventory.data()['all']
+    assert data['hosts']['142.93.10.2']['ipv4_address_private'] == '10.135.0.2'
+    assert data['hosts']['142.93.10.2']['tank_type'] == 'small'
+    assert data['hosts']['142.93.10.2']['tank_private_ip'] == '10.135.0.2'
+    assert data['hosts']['142.93.10.2']['tank_private_network'] == 'digitalocean_droplet/{}'.format(
+        data['hosts']['142.93.10.2']['region'])
+    assert data['vars']['terraform_outputs']['producer-1 node IP addresses'] == ['142.93.10.2', '142.93.10.3']
+
+    # a file Ansible can read
+    with open(inventory.path) as fh:
+        assert json.load(fh) == inventory.data()
+
+
+def test_state_inventory_gce(tmpdir):
+    inventory = StateInventory(_fixture('gce.tfstate'), str(tmpdir.join('inventory.json')),
+                               {'boot': [{'region': 'europe-west3', 'type': 'standard', 'count': 1, 'packetloss': 0}]})
+
+    assert inventory.hosts('bcboot') == ['35.198.1.1']
+    assert inventory.hosts('monitoring_peer') == ['35.198.1.9']
+    assert inventory.data()['all']['hosts']['35.198.1.1']['tank_region'] == 'europe-west3'
+    # the network spans the regions
+    assert inventory.data()['all']['hosts']['35.198.1.1']['tank_private_network'] == \
+        inventory.data()['all']['hosts']['35.198.1.9']['tank_private_network']
+
+
+def test_state_inventory_cache(tmpdir, monkeypatch):
+    state_file = tmpdir.join('blockchain.tfstate')
+    shutil.copy(_fixture('digitalocean.tfstate'), str(state_file))
+    inventory_file = str(tmpdir.join('inventory.json'))
+
+    builds = []
+    original_build = inventory_module.build_inventory
+    monkeypatch.setattr(inventory_module, 'build_inventory', lambda *args: builds.append(1) or original_build(*args))
+
+    StateInventory(str(state_file), inventory_file, DO_TESTCASE_INSTANCES).hosts()
+    StateInventory(str(state_file), inventory_file, DO_TESTCASE_INSTANCES).hosts()
+    assert len(builds) == 1
+
+    # touched, but the same
+    os.utime(str(state_file), ns=(0, 0))
+    StateInventory(str(state_file), inventory_file, DO_TESTCASE_INSTANCES).hosts()
+    assert len(builds) == 1
+
+    state = json.loads(state_file.read())
+    del state['modules'][0]['resources']['digitalocean_droplet.tank-producer-1.1']
+    state_file.write(json.dumps(state))
+
+    inventory = StateInventory(str(state_file), inventory_file, DO_TESTCASE_INSTANCES)
+    assert inventory.hosts('bcpeers') == ['142.93.10.1', '142.93.10.2']
+    assert len(builds) == 2
+
+
+def test_state_inventory_no_state(tmpdir):
+    inventory = StateInventory(str(tmpdir.join('blockchain.tfstate')), str(tmpdir.join('inventory.json')),
+                               DO_TESTCASE_INSTANCES)
+
+    assert inventory.hosts() == []
+    assert inventory.hosts('bcboot') == []
+
+
+def test_cluster_cache_is_optional():
+    with open(resource_path('ansible', 'core.yml')) as fh:
+        plays = yaml.safe_load(fh)
+    cache = [play for play in plays if play.get('import_playbook') == 'cache.yml']
+    assert len(cache) == 1 and 'tank_cluster_cache' in cache[0]['when']
+
+
+def test_new_hosts():
+    def instance(public_ip, instance_id):
+        return dict(_instance('digitalocean_droplet.tank-boot-1', public_ip), attributes={'id': instance_id})
+
+    before = {'a[0]': instance('1.1.1.1', '10'), 'a[1]': instance('1.1.1.2', '11'), 'a[2]': instance('1.1.1.3', '12')}
+    after = {
+        'a[0]': instance('1.1.1.1', '10'),
+        # recreated droplet with the same address
+        'a[1]': instance('1.1.1.2', '21'),
+        # address of a destroyed droplet reused by a new one
+        'b[0]': instance('1.1.1.3', '22'),
+        'b[1]': instance('1.1.1.4', '23'),
+        'b[2]': instance(None, None),
+    }
+
+    assert new_hosts(before, after) == ['1.1.1.2', '1.1.1.3', '1.1.1.4']
+    assert new_hosts(dict(), after) == ['1.1.1.1', '1.1.1.2', '1.1.1.3', '1.1.1.4']
@@ -0,0 +1,80 @@
+import gzip
+import os
+import subprocess
+
+import pytest
+
+from tank.core.exc import TankError
+from tank.core.logs import LogCapture, TerraformTrace, log_files, read_log
+
+
+def test_capture_is_compressed_and_rotated(tmpdir):
+    path = str(tmpdir.join('create.terraform.log'))
+
+    with LogCapture(path, max_bytes=1000, backups=2) as fifo:
+        # the writer opens the pipe like TF_LOG_PATH, several processes write one after another
+        for i in range(10):
+            subprocess.check_call(['sh', '-c', 'for i in $(seq 1 100); do echo "line {} $i"; done >> "$0"'.format(i),
+                                   fifo])
+
+    files = log_files(path)
+    # 10 writers by ~1000 bytes each, only the current file and 2 backups are kept
+    assert len(files) == 3
+    assert files[-1] == path + '.gz'
+    with gzip.open(files[-1], 'rt') as fh:
+        assert fh.read().endswith('line 9 100\n')
+
+    lines = list(read_log(path))
+    assert lines[-1] == 'line 9 100'
+    assert 'line 0 1' not in lines
+
+
+def test_capture_without_writers(tmpdir):
+    path = str(tmpdir.join('plan.ansible.log'))
+
+    with LogCapture(path, max_bytes=1000, backups=2):
+        pass
+
+    assert log_files(path) == []
+    assert not os.listdir(str(tmpdir))
+
+
+def test_failed_capture_does_not_block_writers(tmpdir, monkeypatch):
+    path = str(tmpdir.join('create.terraform.log'))
+
+    class FullDisk:
+        def write(self, data):
+            raise OSError(28, 'No space left on device')
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(gzip, 'open', lambda *args, **kwargs: FullDisk())
+    with pytest.raises(TankError):
+        with LogCapture(path, max_bytes=1000, backups=2) as fifo:
+            for i in range(3):
+                subprocess.check_call(['sh', '-c', 'head -c 1000000 /dev/zero >> "$0"', fifo], timeout=10)
+
+
+TF_LOG = '''\
+2019/10/01 12:00:00 [TRACE] dag/walk: walking "digitalocean_droplet.tank-boot-1"
+2019/10/01 12:00:01 [DEBUG] apply: digitalocean_droplet.tank-boot-1[0]: executing Apply
+2019/10/01 12:00:01 [DEBUG] apply: digitalocean_droplet.tank-boot-10[0]: executing Apply
+2019/10/01 12:00:02 [DEBUG] plugin.terraform-provider-digitalocean: POST /v2/droplets
+response: 422 Unprocessable Entity
+2019/10/01 12:00:03 [ERROR] root: eval: *terraform.EvalApplyPost, err: 1 error(s) occurred:
+
+* digitalocean_droplet.tank-boot-1[0]: Error creating droplet: size is unavailable
+2019/10/01 12:00:04 [TRACE] dag/walk: walking "digitalocean_droplet.tank-monitoring"
+'''
+
+
+def test_failed_resource_trace():
+    trace = TerraformTrace(TF_LOG.splitlines())
+
+    assert trace.failed_resources() == ['digitalocean_droplet.tank-boot-1']
+
+    lines = trace.trace('digitalocean_droplet.tank-boot-1')
+    assert lines[0].endswith('walking "digitalocean_droplet.tank-boot-1"')
+    assert any('size is unavailable' in line for line in lines)
+    assert not any('tank-boot-10' in line or 'tank-monitoring' in line for line in lines)
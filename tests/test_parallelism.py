@@ -0,0 +1,77 @@
+import threading
+import time
+
+from tank.core.parallelism import ParallelismBudget, ParallelismTuner, ParallelismLog, RateLimitWatch
+
+
+def test_unlimited_budget():
+    with ParallelismBudget().take(api=51, cpu=1) as granted:
+        assert granted == {'api': 51, 'cpu': 1}
+
+
+def test_budget_grants_free_amount():
+    budget = ParallelismBudget({'api': 100, 'cpu': 0}, consumers=4)
+
+    with budget.take(api=70, cpu=3) as first:
+        assert first == {'api': 70, 'cpu': 3}
+        # the fair share (25) is free, the rest of the limit is granted
+        with budget.take(api=51) as second:
+            assert second == {'api': 30}
+
+
+def test_budget_waits_for_fair_share():
+    budget = ParallelismBudget({'forks': 100}, consumers=2)
+    granted = []
+
+    def consumer():
+        with budget.take(forks=60) as forks:
+            granted.append(forks['forks'])
+
+    with budget.take(forks=90):
+        thread = threading.Thread(target=consumer)
+        thread.start()
+        time.sleep(0.2)
+        # only 10 forks are free, the fair share is 50
+        assert granted == []
+
+    thread.join(5)
+    assert granted == [60]
+
+
+def test_tuner():
+    small = ParallelismTuner(instances=4, max_forks=50, cpus=8)
+    assert small.terraform('apply') == 6
+    assert small.forks() == 4
+
+    large = ParallelismTuner(instances=300, max_forks=50, cpus=2)
+    assert large.terraform('plan') == 10
+    assert large.terraform('apply') == 51
+    assert large.terraform('destroy') == 100
+    assert large.forks() == 32
+
+    assert ParallelismTuner.backoff(51) == 25
+    assert ParallelismTuner.backoff(1) == 1
+    assert ParallelismTuner.backoff_delay(3) == 4 * ParallelismTuner.backoff_delay(1)
+
+
+def test_rate_limit_watch():
+    watch = RateLimitWatch()
+    watch('digitalocean_droplet.tank-boot-1: Still creating... (10s elapsed)')
+    assert not watch.detected
+
+    watch(b'* digitalocean_droplet.tank-producer-1[3]: Error creating droplet: POST '
+          b'https://api.digitalocean.com/v2/droplets: 429 Too many requests')
+    assert watch.detected
+
+    gce_watch = RateLimitWatch()
+    gce_watch('googleapi: Error 403: Rate Limit Exceeded, rateLimitExceeded')
+    assert gce_watch.detected
+
+
+def test_parallelism_log(tmpdir):
+    log = ParallelismLog(str(tmpdir.join('parallelism.json')))
+    assert log.records() == []
+
+    log.record(stage='create', parallelism=51, outcome='rate_limited')
+    log.record(stage='create', parallelism=25, outcome='done')
+    assert [r['parallelism'] for r in log.records()] == [51, 25]
@@ -0,0 +1,85 @@
+import json
+import time
+
+from tank.core.progress import PlaybookProgress, ProgressMonitor, format_play_status
+
+
+def _events():
+    hosts = ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4']
+    yield {'event': 'playbook_start', 'playbook': 'core.yml', 'time': 0}
+    yield {'event': 'play_start', 'play': 'Prepare', 'hosts': hosts, 'tasks': 1, 'time': 0}
+    for host in hosts:
+        yield {'event': 'task_result', 'play': 'Prepare', 'task_uuid': 'a', 'host': host, 'failed': False, 'time': 5}
+    yield {'event': 'play_start', 'play': 'Install', 'hosts': hosts, 'tasks': 2, 'time': 10}
+    for host in hosts:
+        yield {'event': 'host_start', 'play': 'Install', 'task_uuid': 'b', 'host': host, 'time': 10}
+    yield {'event': 'task_result', 'play': 'Install', 'task_uuid': 'b', 'host': '10.0.0.1', 'failed': False,
+           'time': 20}
+    yield {'event': 'task_result', 'play': 'Install', 'task_uuid': 'b', 'host': '10.0.0.2', 'failed': True,
+           'time': 20}
+    yield {'event': 'task_result', 'play': 'Install', 'task_uuid': 'c', 'host': '10.0.0.1', 'failed': False,
+           'time': 30}
+
+
+def test_playbook_progress():
+    progress = PlaybookProgress()
+    for event in _events():
+        progress.feed(event)
+
+    prepare, install = progress.plays(now=30)
+    assert prepare['finished']
+    assert (prepare['hosts_done'], prepare['hosts_total'], prepare['elapsed']) == (4, 4, 10)
+
+    assert not install['finished']
+    # 10.0.0.1 got through all the tasks, 10.0.0.2 has failed
+    assert (install['hosts_done'], install['hosts_failed']) == (2, 1)
+    # 4 of 8 host tasks are done in 20 seconds
+    assert install['eta'] == 20
+    assert format_play_status(install) == 'play "Install": 2/4 hosts done, 1 failed, ETA 20s'
+
+    progress.feed({'event': 'playbook_end', 'hosts': {}, 'time': 100})
+    install = progress.plays()[-1]
+    assert install['finished'] and install['hosts_done'] == 4
+    assert format_play_status(install) == 'play "Install": 4/4 hosts done, 1 failed in 1m30s'
+
+
+def test_progress_without_play_hosts():
+    progress = PlaybookProgress()
+    progress.feed({'event': 'play_start', 'play': 'Install', 'hosts': None, 'tasks': None, 'time': 0})
+    progress.feed({'event': 'host_start', 'play': 'Install', 'task_uuid': 'a', 'host': '10.0.0.1', 'time': 0})
+    progress.feed({'event': 'host_start', 'play': 'Install', 'task_uuid': 'a', 'host': '10.0.0.2', 'time': 0})
+
+    status = progress.plays(now=1)[0]
+    assert (status['hosts_done'], status['hosts_total'], status['eta']) == (0, 2, None)
+
+
+def test_progress_monitor(tmpdir):
+    events_file = tmpdir.join('provision.ansible.events.jsonl')
+    # events of a previous playbook run are ignored
+    events_file.write(json.dumps({'event': 'play_start', 'play': 'Old', 'hosts': [], 'tasks': 1, 'time': 0}) + '\n')
+
+    lines = []
+    monitor = ProgressMonitor(str(events_file), lines.append, interval=0)
+    monitor._POLL_INTERVAL = 0.05
+    with monitor:
+        with open(str(events_file), 'a') as fh:
+            for event in _events():
+                fh.write(json.dumps(event) + '\n')
+        time.sleep(0.3)
+
+    assert lines[0] == 'play "Prepare": 4/4 hosts done in 10s'
+    assert all(line.startswith('play "Install"') for line in lines[1:])
+
+
+def test_progress_monitor_skips_malformed_lines(tmpdir):
+    events_file = tmpdir.join('provision.ansible.events.jsonl')
+    events_file.write('')
+
+    monitor = ProgressMonitor(str(events_file), lambda line: None, interval=0)
+    events_file.write('{"event": "play_start", "pla\n' + json.dumps(next(_events())) + '\n', mode='a')
+    monitor._read()
+
+    prepare = list(_events())[1]
+    events_file.write(json.dumps(prepare) + '\n', mode='a')
+    monitor._read()
+    assert [status['play'] for status in monitor._progress.plays()] == ['Prepare']
@@ -0,0 +1,69 @@
+import configparser
+
+import pytest
+
+from tank.core.exc import TankConfigError
+from tank.core.provisioning import ProvisionState, ansible_config, write_ansible_config
+
+
+def _state(tmpdir):
+    return ProvisionState(str(tmpdir.join('provision_state.json')), str(tmpdir.join('converged')))
+
+
+def test_converged_hosts_are_skipped(tmpdir):
+    state = _state(tmpdir)
+    hosts = ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+    assert state.pending(hosts, 'v1') == hosts
+
+    state.prepare()
+    tmpdir.join('converged', '10.0.0.1').write('')
+    tmpdir.join('converged', '10.0.0.3').write('')
+    assert state.converged_hosts() == ['10.0.0.1', '10.0.0.3']
+    state.record(hosts, 'v1', state.converged_hosts())
+
+    assert state.pending(hosts, 'v1') == ['10.0.0.2']
+    # changed playbooks or variables
+    assert state.pending(hosts, 'v2') == hosts
+
+    state.record(['10.0.0.2'], 'v1')
+    assert state.pending(hosts, 'v1') == []
+
+
+def test_stopped_playbook(tmpdir):
+    state = _state(tmpdir)
+    hosts = ['10.0.0.1', '10.0.0.2']
+    state.record(hosts, 'v1')
+
+    # e.g. the only host of a play failed and the playbook stopped: nobody got through the last play
+    state.prepare()
+    state.record(hosts, 'v2', state.converged_hosts())
+
+    assert state.pending(hosts, 'v1') == hosts
+    assert state.pending(hosts, 'v2') == hosts
+
+
+def test_previous_marks_are_cleared(tmpdir):
+    state = _state(tmpdir)
+    state.prepare()
+    tmpdir.join('converged', '10.0.0.1').write('')
+
+    state.prepare()
+
+    assert state.converged_hosts() == []
+
+
+def test_ansible_config(tmpdir):
+    template = tmpdir.join('template.cfg')
+    template.write('[defaults]\nforks = 5\n\n[ssh_connection]\nssh_args = -C -o ControlPath=/tmp/%%h\n')
+    config_file = str(tmpdir.join('ansible.cfg'))
+
+    write_ansible_config(config_file, str(template), 'free')
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(config_file)
+    assert config.get('defaults', 'strategy') == 'free'
+    assert config.get('defaults', 'forks') == '5'
+    assert config.get('ssh_connection', 'ssh_args') == '-C -o ControlPath=/tmp/%%h'
+
+    with pytest.raises(TankConfigError):
+        ansible_config(str(template), 'fastest')
@@ -0,0 +1,62 @@
+import os
+from types import SimpleNamespace
+from time import time
+
+from tank.core.exc import TankError
+from tank.core.roles import RoleCache
+
+
+def test_immutable_versions():
+    assert RoleCache.is_immutable('3c1f0e6a9c4b2d7e8f9a0b1c2d3e4f5a6b7c8d9e')
+    assert RoleCache.is_immutable('v1.0.2')
+    assert RoleCache.is_immutable('1.2')
+    assert not RoleCache.is_immutable('master')
+    assert not RoleCache.is_immutable('feature/1.0')
+    assert not RoleCache.is_immutable(None)
+
+
+def test_resolution(tmpdir):
+    cache = RoleCache(SimpleNamespace(user_dir=str(tmpdir)), ttl=3600)
+
+    pinned = cache._resolve({}, {'src': 'https://example.com/role', 'version': 'v1.0', 'name': 'role'})
+    assert pinned['commit'] == 'v1.0'
+
+    # a fresh resolution of a moving ref is reused without network access
+    os.mkdir(os.path.join(cache.path, 'abc'))
+    index = {'abc': {'key': 'abc', 'src': 'https://example.com/role', 'version': 'master',
+                     'commit': 'f' * 40, 'resolved': int(time())}}
+    moving = cache._resolve(index, {'src': 'https://example.com/role', 'version': 'master', 'name': 'role'})
+    assert moving['commit'] == 'f' * 40
+    assert moving['key'] != pinned['key']
+    # the use doesn't extend the ttl
+    assert moving['resolved'] == index['abc']['resolved']
+
+
+def test_stale_resolution_offline(tmpdir, monkeypatch):
+    cache = RoleCache(SimpleNamespace(user_dir=str(tmpdir)), ttl=3600)
+    stale = int(time()) - 7200
+    os.mkdir(os.path.join(cache.path, 'abc'))
+    index = {'abc': {'key': 'abc', 'src': 'https://example.com/role', 'version': 'master',
+                     'commit': 'f' * 40, 'resolved': stale}}
+
+    def unreachable(src, version):
+        raise TankError('unreachable')
+
+    monkeypatch.setattr(cache, '_ls_remote', unreachable)
+    entry = cache._resolve(index, {'src': 'https://example.com/role', 'version': 'master', 'name': 'role'})
+
+    # the stale resolution is used, but the ref is checked again next time
+    assert entry['commit'] == 'f' * 40 and entry['resolved'] == stale
+
+    monkeypatch.setattr(cache, '_ls_remote', lambda src, version: 'e' * 40)
+    assert cache._resolve(index, {'src': 'https://example.com/role', 'version': 'master'})['commit'] == 'e' * 40
+
+
+def test_link_replaces_previous_install(tmpdir):
+    entry = tmpdir.mkdir('entry')
+    roles = tmpdir.mkdir('roles')
+    roles.mkdir('tank.docker').join('meta.yml').write('')
+
+    RoleCache._link(str(entry), str(roles.join('tank.docker')))
+
+    assert os.path.realpath(str(roles.join('tank.docker'))) == str(entry)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from tank.core.exc import TankError
+from tank.core.stages import StageScheduler, current_prefix, run_command
+
+
+def test_independent_stages_run_concurrently():
+    started = threading.Barrier(2, timeout=5)
+    order = []
+
+    def independent(name):
+        def stage():
+            started.wait()
+            order.append(name)
+        return stage
+
+    StageScheduler() \
+        .add('a', independent('a')) \
+        .add('b', independent('b')) \
+        .add('c', lambda: order.append('c'), requires=['a', 'b']) \
+        .run()
+
+    assert sorted(order[:2]) == ['a', 'b']
+    assert order[2] == 'c'
+
+
+def test_stage_prefix():
+    prefixes = []
+    StageScheduler().add('init', lambda: prefixes.append(current_prefix())).run()
+    assert prefixes == ['init']
+    assert current_prefix() is None
+
+
+def test_unknown_requirement():
+    with pytest.raises(TankError):
+        StageScheduler().add('provision', lambda: None, requires=['create'])
+
+
+def test_failure_cancels_siblings():
+    skipped = []
+
+    def failing():
+        time.sleep(0.2)
+        raise TankError('boom')
+
+    start = time.time()
+    with pytest.raises(TankError, match='boom'):
+        StageScheduler() \
+            .add('slow', lambda: run_command('sleep', '30')) \
+            .add('failing', failing) \
+            .add('next', lambda: skipped.append(True), requires=['failing']) \
+            .run()
+
+    assert time.time() - start < 10
+    assert not skipped
+
+
+def test_run_command_output_consumer():
+    lines = []
+    StageScheduler().add('init', lambda: run_command('sh', '-c', 'echo out; echo err >&2',
+                                                     on_output=lines.append)).run()
+    assert sorted(line.strip() for line in lines) == ['err', 'out']
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+# modules which must not be imported by `tank --version` or `tank cluster info`
+HEAVY_MODULES = ('sh', 'jsonschema', 'tabulate', 'namesgenerator', 'filelock', 'jinja2')
+
+# wall time budget of `import tank.main`, seconds
+IMPORT_TIME_BUDGET = 0.5
+
+
+def _run_python(code: str, env: dict = None) -> str:
+    return subprocess.check_output([sys.executable, '-c', code], universal_newlines=True, env=env).strip()
+
+
+def test_heavy_imports_are_deferred():
+    loaded = _run_python(
+        'import sys, tank.main; '
+        'print(",".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES))
+    assert loaded == ''
+
+
+@pytest.mark.parametrize('argv', [['--help'], ['--version']])
+def test_light_commands_skip_heavy_imports(argv, tmpdir):
+    # dispatch the command through the whole app, not just the import of tank.main
+    env = dict(os.environ, HOME=str(tmpdir))
+    output = _run_python(
+        'import sys\n'
+        'sys.argv = ["tank"] + {!r}\n'
+        'from tank.main import main\n'
+        'try:\n'
+        '    main()\n'
+        'except SystemExit as e:\n'
+        '    assert not e.code, e.code\n'
+        'print("\\nloaded:" + ",".join(m for m in {!r} if m in sys.modules))'.format(argv, HEAVY_MODULES),
+        env=env)
+    assert output.splitlines()[-1] == 'loaded:'
+
+
+def test_import_time_budget():
+    # the best of several attempts to reduce noise
+    elapsed = min(float(_run_python(
+        'import time; start = time.perf_counter(); import tank.main; print(time.perf_counter() - start)'))
+        for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET
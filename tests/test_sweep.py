@@ -0,0 +1,45 @@
+import pytest
+
+from tank.core.exc import TankError
+from tank.core.sweep import BenchSweep
+
+
+def _summary(tps_mean, latency_p95=100, error_rate=0.0):
+    return {'tps_mean': tps_mean, 'latency_p50': latency_p95 / 2, 'latency_p95': latency_p95,
+            'latency_p99': latency_p95 * 2, 'error_rate': error_rate, 'bench_id': 'b{}'.format(tps_mean)}
+
+
+def test_sweep_levels():
+    sweep = BenchSweep(100, 500, 200, 30)
+    assert sweep.levels() == [100, 300, 500]
+    assert sweep.total_tx(300) == 9000
+
+    with pytest.raises(TankError):
+        BenchSweep(500, 100, 100, 30)
+
+
+def test_throughput_knee():
+    sweep = BenchSweep(100, 500, 100, 30)
+    sweep.add(100, _summary(99))
+    sweep.add(200, _summary(197))
+    assert sweep.knee is None
+
+    sweep.add(300, _summary(240))
+
+    data = sweep.to_dict()
+    assert data['knee_tps'] == 300
+    assert data['knee_reason'] == 'throughput'
+    assert data['saturation_tps'] == 200
+    assert data['saturation_achieved_tps'] == 197
+    assert [point['saturated'] for point in data['curve']] == [None, None, 'throughput']
+
+
+def test_latency_and_errors_knee():
+    sweep = BenchSweep(100, 500, 100, 30)
+    sweep.add(100, _summary(100, latency_p95=100))
+    sweep.add(200, _summary(200, latency_p95=250))
+    assert sweep.add(300, _summary(300, latency_p95=400))['saturated'] == 'latency'
+
+    errors = BenchSweep(100, 500, 100, 30)
+    assert errors.add(100, _summary(100, error_rate=0.2))['saturated'] == 'errors'
+    assert errors.saturation_point is None
@@ -0,0 +1,178 @@
+import hashlib
+import http.server
+import io
+import os
+import threading
+import zipfile
+
+import pytest
+
+from tank.core.exc import TankError
+from tank.terraform_installer import BaseInstaller, Toolchain
+
+
+class FakeInstaller(BaseInstaller):
+    version = '1.0'
+    file_name = 'fake-tool'
+    archive_name = 'fake-tool.zip'
+    url = 'http://localhost/fake-tool.zip'
+
+    fetched = 0
+
+    def fetch(self):
+        FakeInstaller.fetched += 1
+        with open(self.file_full_path, 'w') as fh:
+            fh.write('#!/bin/sh\necho {}\n'.format(self.version))
+
+
+def test_toolchain_manifest(tmpdir):
+    FakeInstaller.fetched = 0
+    FakeInstaller.version = '1.0'
+
+    path = Toolchain(str(tmpdir)).resolve(FakeInstaller)
+    assert path == str(tmpdir.join('fake-tool'))
+    assert FakeInstaller.fetched == 1
+
+    record = Toolchain(str(tmpdir)).manifest['fake-tool']
+    assert record['version'] == '1.0'
+    assert record['path'] == path
+
+    # verified by the manifest, no reinstallation
+    toolchain = Toolchain(str(tmpdir))
+    toolchain.resolve(FakeInstaller)
+    toolchain.resolve(FakeInstaller)
+    assert FakeInstaller.fetched == 1
+
+
+def test_toolchain_version_drift(tmpdir):
+    FakeInstaller.fetched = 0
+    FakeInstaller.version = '1.0'
+    Toolchain(str(tmpdir)).resolve(FakeInstaller)
+
+    FakeInstaller.version = '1.1'
+    Toolchain(str(tmpdir)).resolve(FakeInstaller)
+    assert FakeInstaller.fetched == 2
+    assert Toolchain(str(tmpdir)).manifest['fake-tool']['version'] == '1.1'
+
+
+def test_toolchain_modified_tool(tmpdir):
+    FakeInstaller.fetched = 0
+    FakeInstaller.version = '1.0'
+    path = Toolchain(str(tmpdir)).resolve(FakeInstaller)
+
+    with open(path, 'a') as fh:
+        fh.write('# tampered\n')
+    os.utime(path, (0, 0))
+
+    Toolchain(str(tmpdir)).resolve(FakeInstaller)
+    assert FakeInstaller.fetched == 2
+
+
+class _ArchiveServer(http.server.BaseHTTPRequestHandler):
+    """Local stand-in of a release server: honours Range requests and drops the first download halfway."""
+
+    archive = b''
+    checksums = b''
+    drops_left = 0
+    ranges = []
+
+    def do_GET(self):
+        cls = self.__class__
+        if self.path == '/SHA256SUMS':
+            self._reply(200, cls.checksums)
+            return
+
+        offset = 0
+        range_header = self.headers.get('Range')
+        cls.ranges.append(range_header)
+        if range_header is not None:
+            offset = int(range_header.split('=')[1].rstrip('-'))
+
+        body = cls.archive[offset:]
+        if cls.drops_left:
+            cls.drops_left -= 1
+            self.send_response(206 if offset else 200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self._reply(206 if offset else 200, body)
+
+    def _reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def archive_server():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('served-tool', os.urandom(256 * 1024))
+        archive.writestr('other-tool', os.urandom(1024))
+    _ArchiveServer.archive = buffer.getvalue()
+    checksum = hashlib.sha256(_ArchiveServer.archive).hexdigest()
+    _ArchiveServer.checksums = '{0}  served-tool.zip\n{0}  other-tool.zip\n'.format(checksum).encode()
+    _ArchiveServer.drops_left = 1
+    _ArchiveServer.ranges = []
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _ArchiveServer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+
+
+def _served_installer(base_url, checksums_path='/SHA256SUMS'):
+    class ServedInstaller(BaseInstaller):
+        version = '1.0'
+        file_name = 'served-tool'
+        archive_name = 'served-tool.zip'
+        url = base_url + '/served-tool.zip'
+        checksums_url = base_url + checksums_path
+
+    return ServedInstaller
+
+
+def test_resumed_download(tmpdir, archive_server):
+    installer = _served_installer(archive_server)(str(tmpdir))
+    installer.fetch()
+
+    with zipfile.ZipFile(io.BytesIO(_ArchiveServer.archive)) as archive:
+        assert tmpdir.join('served-tool').read_binary() == archive.read('served-tool')
+
+    assert _ArchiveServer.ranges[0] is None
+    assert _ArchiveServer.ranges[1].startswith('bytes=')
+    assert os.access(installer.file_full_path, os.X_OK)
+    assert not tmpdir.join('served-tool.zip').exists()
+    assert not tmpdir.join('served-tool.zip.part').exists()
+
+
+def test_checksum_mismatch(tmpdir, archive_server):
+    _ArchiveServer.checksums = '{}  served-tool.zip\n'.format('0' * 64).encode()
+
+    with pytest.raises(TankError):
+        _served_installer(archive_server)(str(tmpdir)).fetch()
+    assert not tmpdir.join('served-tool').exists()
+
+
+def test_concurrent_resolution(tmpdir, archive_server):
+    _ArchiveServer.drops_left = 0
+    first = _served_installer(archive_server)
+
+    class Second(first):
+        file_name = 'other-tool'
+        archive_name = 'other-tool.zip'
+        url = archive_server + '/other-tool.zip'
+
+    paths = Toolchain(str(tmpdir)).resolve_all([first, Second])
+
+    assert paths == [str(tmpdir.join('served-tool')), str(tmpdir.join('other-tool'))]
+    assert sorted(Toolchain(str(tmpdir)).manifest) == ['other-tool', 'served-tool']
@@ -1,12 +1,14 @@
 import copy
+import json
 import tempfile
+from types import SimpleNamespace
 
 import pytest
 
 from tank.core.exc import TankTestCaseError
 from tank.core import testcase as tc
 from tank.core.regions import RegionsConfig
-from tank.core.utils import yaml_dump
+from tank.core.utils import yaml_dump, thaw
 from tank.main import MixbytesTank
 
 
@@ -107,6 +109,20 @@ class TestTestcaseValidation:
         self._content['instances']['name']['regions']['a'] = 1
         self._test(raises=TankTestCaseError)
 
+    def test_invalid_provisioning_strategy(self):
+        self._content['provisioning_strategy'] = 'mitogen_free'
+        self._test()
+
+        self._content['provisioning_strategy'] = 'host_pinned'
+        self._test(raises=TankTestCaseError)
+
+    def test_invalid_cluster_cache(self):
+        self._content['cluster_cache'] = True
+        self._test()
+
+        self._content['cluster_cache'] = 'yes'
+        self._test(raises=TankTestCaseError)
+
     def test_valid_testcase(self):
         self._test()
 
@@ -323,3 +339,84 @@ class TestTestcaseClass:
 
     def test_binding(self):
         assert self._testcase.binding == content['binding']
+
+
+class TestCompiledTestcase:
+    """Tests class for the compiled testcase cache."""
+
+    def _app(self, tmpdir):
+        return SimpleNamespace(user_dir=str(tmpdir), provider='digitalocean')
+
+    def test_compiled_cache(self, tmpdir):
+        testcase_file = str(tmpdir.join('testcase.yml'))
+        compiled_cache = str(tmpdir.join('testcase.compiled.json'))
+        yaml_dump(testcase_file, data=content)
+
+        compiled = tc.TestCase(testcase_file, self._app(tmpdir), compiled_cache=compiled_cache)
+        assert compiled.total_instances == 9
+
+        with open(compiled_cache) as fh:
+            key = json.load(fh)['key']
+
+        cached = tc.TestCase(testcase_file, self._app(tmpdir), compiled_cache=compiled_cache)
+        assert cached.content == compiled.content
+        assert cached.total_instances == 9
+
+        # changes of the regions config invalidate the cache
+        with open(str(tmpdir.join(RegionsConfig.FILE_NAME)), 'a') as fh:
+            fh.write('\n# modified\n')
+        tc.TestCase(testcase_file, self._app(tmpdir), compiled_cache=compiled_cache)
+
+        with open(compiled_cache) as fh:
+            assert json.load(fh)['key'] != key
+
+    def test_read_only_views(self, tmpdir):
+        testcase_file = str(tmpdir.join('testcase.yml'))
+        yaml_dump(testcase_file, data=content)
+
+        testcase = tc.TestCase(testcase_file, self._app(tmpdir))
+        with pytest.raises(TypeError):
+            testcase.instances['boot'] = []
+        assert testcase.ansible['forks'] == 50
+
+        # handed out without copying
+        assert testcase.content is testcase.content
+        with pytest.raises(TypeError):
+            testcase.content['binding'] = 'other'
+        assert thaw(testcase.content) == testcase._content
+
+
+class TestScaling:
+    """Tests for scaling of the testcase instances."""
+
+    def test_scaled_content(self, tmpdir):
+        testcase_file = str(tmpdir.join('testcase.yml'))
+        yaml_dump(testcase_file, data=content)
+        app = SimpleNamespace(user_dir=str(tmpdir), provider='digitalocean')
+
+        scaled = tc.TestCase(testcase_file, app).scaled_content({'producer': 5, 'boot': 2, 'name': 12})
+
+        assert scaled['instances']['producer'] == 5
+        assert scaled['instances']['boot']['count'] == 2
+        name = scaled['instances']['name']
+        assert name['count'] == 12
+        assert [name['regions']['Europe']['count'], name['regions']['Asia']['count'],
+                name['regions']['NorthAmerica'], name['regions']['random']['count']] == [2, 2, 2, 6]
+        # the original content is intact
+        assert content['instances']['producer'] == 1
+
+        yaml_dump(testcase_file, data=scaled)
+        assert tc.TestCase(testcase_file, app).total_instances == 20
+
+    def test_unknown_role(self, tmpdir):
+        testcase_file = str(tmpdir.join('testcase.yml'))
+        yaml_dump(testcase_file, data=content)
+        app = SimpleNamespace(user_dir=str(tmpdir), provider='digitalocean')
+
+        with pytest.raises(TankTestCaseError):
+            tc.TestCase(testcase_file, app).scaled_content({'validator': 3})
+
+    def test_rescale(self):
+        assert tc._rescale([1, 2, 3], 12) == [2, 4, 6]
+        assert tc._rescale([2, 4, 6], 9) == [1, 3, 5]
+        assert tc._rescale([1, 1], 3) == [2, 1]
@@ -0,0 +1,99 @@
+import os
+import json
+from types import SimpleNamespace
+
+from tank.core.tf import PlanGenerator, PluginCache, TerraformState, plan_resources
+
+
+def _app(tmpdir, plugin_dirs=()):
+    return SimpleNamespace(terraform_plugin_cache_dir=str(tmpdir),
+                           terraform_config={'plugin_dirs': list(plugin_dirs)})
+
+
+def test_offline_plugin_dirs(tmpdir):
+    assert PluginCache(_app(tmpdir)).init_args() == []
+
+    args = PluginCache(_app(tmpdir, ['/opt/tf-plugins'])).init_args()
+    assert args == ['-plugin-dir', '/opt/tf-plugins',
+                    '-plugin-dir', os.path.join('/opt/tf-plugins', PluginCache.platform())]
+
+
+def _plan_app(provider='digitalocean'):
+    return SimpleNamespace(cloud_settings=SimpleNamespace(provider=SimpleNamespace(value=provider)))
+
+
+def _testcase():
+    instances = {'boot': [{'region': 'FRA1', 'count': 1, 'type': 'small', 'packetloss': 0}],
+                 'producer': [{'region': 'FRA1', 'count': 2, 'type': 'large', 'packetloss': 0.1},
+                              {'region': 'SGP1', 'count': 1, 'type': 'large', 'packetloss': 0}]}
+    return SimpleNamespace(instances=instances, total_instances=4)
+
+
+def test_plan_generation(tmpdir):
+    PlanGenerator(_plan_app(), _testcase()).generate(str(tmpdir))
+
+    assert sorted(p.basename for p in tmpdir.listdir()) == [PlanGenerator.MANIFEST_FILE, 'backend.tf', 'main.tf']
+    main_tf = tmpdir.join('main.tf').read()
+    assert 'resource "digitalocean_droplet" "tank-producer-2"' in main_tf
+    assert 'size = "8gb"' in main_tf
+    assert '{%' not in main_tf
+
+
+def test_incremental_plan_generation(tmpdir):
+    generator = PlanGenerator(_plan_app(), _testcase())
+    init_args = ['-input=false']
+
+    assert generator.generate(str(tmpdir))
+    main_tf = tmpdir.join('main.tf')
+    mtime = main_tf.mtime()
+    assert not PlanGenerator.is_initialized(str(tmpdir), init_args)
+    PlanGenerator.mark_initialized(str(tmpdir), init_args)
+
+    # unchanged inputs: nothing is written
+    os.utime(str(main_tf), (mtime - 100, mtime - 100))
+    assert not generator.generate(str(tmpdir))
+    assert main_tf.mtime() == mtime - 100
+    assert PlanGenerator.is_initialized(str(tmpdir), init_args)
+    assert not PlanGenerator.is_initialized(str(tmpdir), init_args + ['-plugin-dir', '/opt'])
+
+    # a local modification is overwritten
+    main_tf.write('modified')
+    assert generator.generate(str(tmpdir))
+    assert 'tank-producer-2' in main_tf.read()
+
+    # changed testcase
+    testcase = _testcase()
+    testcase.instances['producer'][0]['count'] = 5
+    testcase.total_instances = 7
+    assert PlanGenerator(_plan_app(), testcase).generate(str(tmpdir))
+    assert not PlanGenerator.is_initialized(str(tmpdir), init_args)
+
+
+def test_terraform_state(tmpdir):
+    state_file = tmpdir.join('blockchain.tfstate')
+    assert TerraformState(str(state_file)).instances() == {}
+
+    state_file.write(json.dumps({'version': 3, 'modules': [{'path': ['root'], 'resources': {
+        'digitalocean_droplet.tank-producer-1.0': {
+            'type': 'digitalocean_droplet',
+            'primary': {'attributes': {'name': 'tank-polkadot-ab12-producer-1-0', 'ipv4_address': '1.1.1.1',
+                                       'ipv4_address_private': '10.0.0.1'}}},
+        'digitalocean_droplet.monitoring': {
+            'type': 'digitalocean_droplet',
+            'primary': {'attributes': {'name': 'tank-polkadot-ab12-monitoring', 'ipv4_address': '1.1.1.2'}}},
+        'digitalocean_ssh_key.default': {'type': 'digitalocean_ssh_key', 'primary': {'attributes': {}}},
+    }}]}))
+
+    instances = TerraformState(str(state_file)).instances()
+
+    assert sorted(instances) == ['digitalocean_droplet.monitoring[0]', 'digitalocean_droplet.tank-producer-1[0]']
+    assert instances['digitalocean_droplet.tank-producer-1[0]']['private_ip'] == '10.0.0.1'
+    assert instances['digitalocean_droplet.monitoring[0]']['public_ip'] == '1.1.1.2'
+
+
+def test_plan_resources(tmpdir):
+    PlanGenerator(_plan_app(), _testcase()).generate(str(tmpdir))
+
+    resources = plan_resources(str(tmpdir))
+    assert resources['tank-producer-2'] == 'digitalocean_droplet'
+    assert resources['tank-monitoring'] == 'digitalocean_droplet'
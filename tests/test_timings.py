@@ -0,0 +1,62 @@
+import json
+import subprocess
+
+import pytest
+
+from tank.core.stages import StageCancelled
+from tank.core.timings import StageTimings, read_events, slowest_tasks, slowest_hosts
+
+
+def test_stage_timings(tmpdir):
+    timings = StageTimings(str(tmpdir.join('timings.jsonl')))
+    assert timings.records() == []
+
+    with timings.measure('provision', lambda: 3):
+        subprocess.check_call(['sh', '-c', 'i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done'])
+
+    with pytest.raises(StageCancelled):
+        with timings.measure('bench'):
+            raise StageCancelled()
+
+    with pytest.raises(RuntimeError):
+        with timings.measure('destroy'):
+            raise RuntimeError()
+
+    provision, bench, destroy = timings.records()
+    assert provision['status'] == 'done'
+    assert provision['hosts'] == 3
+    assert provision['wall_time'] > 0
+    assert provision['children_cpu_user'] + provision['children_cpu_system'] > 0
+    assert provision['children_peak_rss_mb'] > 0
+    assert bench['status'] == 'cancelled'
+    assert 'hosts' not in bench
+    assert (destroy['status'], destroy['error']) == ('failed', 'RuntimeError')
+
+
+def _task_result(play, task, host, duration, failed=False):
+    return {'event': 'task_result', 'play': play, 'task': task, 'host': host, 'duration': duration,
+            'failed': failed, 'status': 'failed' if failed else 'ok'}
+
+
+def test_slowest_tasks_and_hosts(tmpdir):
+    events_file = tmpdir.join('provision.ansible.events.jsonl')
+    events = [
+        _task_result('core', 'Install packages', '10.0.0.1', 40.0),
+        _task_result('core', 'Install packages', '10.0.0.2', 90.0),
+        _task_result('core', 'Gather facts', '10.0.0.1', 2.0),
+        _task_result('core', 'Gather facts', '10.0.0.2', 3.0, failed=True),
+        {'event': 'playbook_start', 'playbook': 'core.yml'},
+    ]
+    # the last line may be incomplete while Ansible is running
+    events_file.write('\n'.join(json.dumps(e) for e in events) + '\n{"event": "task_res')
+
+    events = list(read_events([str(events_file), str(tmpdir.join('missing.jsonl'))]))
+    assert len(events) == 5
+
+    tasks = slowest_tasks(events)
+    assert [t['task'] for t in tasks] == ['Install packages', 'Gather facts']
+    assert (tasks[0]['hosts'], tasks[0]['total'], tasks[0]['max'], tasks[0]['slowest_host']) == \
+        (2, 130.0, 90.0, '10.0.0.2')
+
+    hosts = slowest_hosts(events, limit=1)
+    assert hosts == [{'host': '10.0.0.2', 'tasks': 2, 'total': 93.0, 'failed': 1}]